@@ -0,0 +1,196 @@
+"""
+Benchmark the calculators in ``bicyclator.main`` and their batch paths
+on synthetic fleets of bicycles and catalogs of wheels.
+
+Each benchmark is timed (best of several repeats) and run once more
+under ``tracemalloc`` to record its peak memory.
+Results can be saved as a baseline and later compared against it,
+in which case any benchmark slower than the baseline by more than the
+threshold is reported as a regression and the exit status is 1.
+
+Usage::
+
+    python benchmarks/bench.py --sizes 10 1000 100000 --save baseline.json
+    python benchmarks/bench.py --sizes 10 1000 100000 --compare baseline.json
+
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import bicyclator.main as bm
+from bicyclator import batch
+from bicyclator.table import BicycleTable, WheelTable
+
+
+def make_wheels(n, seed=0):
+    """
+    Return a list of ``n`` random but realistic Wheel objects.
+    """
+    rng = random.Random(seed)
+    wheels = []
+    for i in range(n):
+        bsd = rng.choice([559, 584, 622])
+        tire_width = rng.choice([23, 25, 28, 32, 40, 50])
+        wheels.append(bm.Wheel(name='wheel {!s}'.format(i), bsd=bsd,
+          erd=bsd - rng.uniform(10, 30), tire_width=tire_width,
+          diameter=bsd + 2*tire_width,
+          center_to_flange={'left': rng.uniform(30, 40),
+            'right': rng.uniform(15, 40)},
+          flange_diameter={'left': rng.uniform(38, 60),
+            'right': rng.uniform(38, 60)},
+          num_spokes=rng.choice([24, 28, 32, 36]),
+          num_crosses=rng.randint(0, 4), offset=rng.choice([0, 0, 2, 3])))
+    return wheels
+
+def make_fleet(n, seed=0):
+    """
+    Return a list of ``n`` random but realistic Bicycle objects.
+    """
+    rng = random.Random(seed)
+    wheels = make_wheels(n, seed)
+    bicycles = []
+    for i in range(n):
+        num_front = rng.choice([1, 2, 3])
+        num_rear = rng.randint(7, 13)
+        bicycles.append(bm.Bicycle(name='bicycle {!s}'.format(i),
+          head_tube_angle=rng.uniform(68, 74), fork_rake=rng.uniform(40, 60),
+          crank_length=rng.choice([165, 170, 172.5, 175]),
+          front_cogs=rng.sample(range(24, 54), num_front),
+          rear_cogs=rng.sample(range(10, 52), num_rear),
+          front_wheel=wheels[i], rear_wheel=wheels[i]))
+    return bicycles
+
+def benchmarks(n, scalar_limit):
+    """
+    Return a dictionary of the form benchmark name -> function of no
+    arguments, for a fleet and wheel catalog of size ``n``.
+    Per-object benchmarks are omitted if ``n`` exceeds ``scalar_limit``.
+    """
+    fleet = make_fleet(n)
+    wheels = [b.rear_wheel for b in fleet]
+    table = BicycleTable.from_bicycles(fleet)
+    wheel_table = WheelTable.from_wheels(wheels)
+
+    result = {}
+    if n <= scalar_limit:
+        for name in ['derailer_capacity', 'num_skid_patches', 'gear_ratios',
+          'gain_ratios', 'trail']:
+            f = getattr(bm, name)
+            result['main.' + name] = lambda f=f: [f(b) for b in fleet]
+        result['main.cadence_to_speeds'] = lambda: [
+          bm.cadence_to_speeds(b, 1.5) for b in fleet]
+        result['main.speed_to_cadences'] = lambda: [
+          bm.speed_to_cadences(b, 30) for b in fleet]
+        result['main.spoke_length'] = lambda: [
+          bm.spoke_length(w) for w in wheels]
+        result['main.approx_diameter'] = lambda: [
+          bm.approx_diameter(w) for w in wheels]
+
+    for name in ['derailer_capacity', 'num_skid_patches', 'gear_ratios',
+      'gain_ratios', 'trail']:
+        f = getattr(batch, name)
+        result['batch.' + name] = lambda f=f: f(fleet)
+        result['batch.' + name + '[table]'] = lambda f=f: f(table)
+    result['batch.cadence_to_speeds[table]'] = lambda: \
+      batch.cadence_to_speeds(table, 1.5)
+    result['batch.speed_to_cadences[table]'] = lambda: \
+      batch.speed_to_cadences(table, 30)
+    result['batch.spoke_length'] = lambda: batch.spoke_length(wheels)
+    result['batch.spoke_length[table]'] = lambda: \
+      batch.spoke_length(wheel_table)
+    result['batch.approx_diameter[table]'] = lambda: \
+      batch.approx_diameter(wheel_table)
+    return result
+
+def measure(f, repeats):
+    """
+    Return the dictionary ``{'seconds': best time of the given number of
+    calls of f, 'peak_bytes': peak memory allocated during one call}``.
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    f()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': min(times), 'peak_bytes': peak}
+
+def run(sizes, repeats=3, scalar_limit=100000, pattern=None, out=sys.stdout):
+    """
+    Run the benchmarks for each of the given sizes and return a
+    dictionary of the form ``'name[size]'`` -> measurement,
+    printing each result as it goes.
+    Only benchmarks whose names contain ``pattern`` are run, if given.
+    """
+    results = {}
+    for n in sizes:
+        for (name, f) in benchmarks(n, scalar_limit).items():
+            if pattern is not None and pattern not in name:
+                continue
+            key = '{!s}[{!s}]'.format(name, n)
+            results[key] = m = measure(f, repeats)
+            out.write('{:<45s} {:>12.6f} s {:>12.1f} KiB\n'.format(key,
+              m['seconds'], m['peak_bytes']/1024))
+            out.flush()
+    return results
+
+def compare(results, baseline, threshold=0.2):
+    """
+    Return a list of tuples (key, baseline seconds, seconds) for the
+    results slower than the baseline by more than the given fraction.
+    """
+    regressions = []
+    for (key, m) in results.items():
+        if key not in baseline:
+            continue
+        old = baseline[key]['seconds']
+        if m['seconds'] > old*(1 + threshold):
+            regressions.append((key, old, m['seconds']))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+      default=[10, 1000, 100000])
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--scalar-limit', type=int, default=100000,
+      help='largest size at which to benchmark per-object calls')
+    parser.add_argument('--filter', dest='pattern',
+      help='only run benchmarks whose names contain this string')
+    parser.add_argument('--save', help='save results as a JSON baseline')
+    parser.add_argument('--compare', help='compare against a JSON baseline')
+    parser.add_argument('--threshold', type=float, default=0.2,
+      help='slowdown fraction reported as a regression')
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.repeats, args.scalar_limit, args.pattern)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for (key, old, new) in regressions:
+            print('REGRESSION {!s}: {:.6f} s -> {:.6f} s ({:+.0%})'.format(
+              key, old, new, new/old - 1))
+        if regressions:
+            return 1
+        print('No regressions against {!s}'.format(args.compare))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1 +1,2 @@
-from .main import *
\ No newline at end of file
+from .main import *
+from ._version import __version__
@@ -0,0 +1,164 @@
+"""
+Gear spacing and overlap analysis.
+
+The gear ratios of a drivetrain are sorted once, and everything else
+comes from one linear sweep over the neighbouring ratios:
+
+- steps: the relative jumps between neighbouring gears, e.g. 0.12 for
+  a 12% jump
+- duplicate clusters: the runs of gears whose neighbouring steps are all
+  at most a tolerance, e.g. 0.02 for 2%
+- the number of unique gears, counting each duplicate cluster once
+- coverage: the fraction of the gear range, on a logarithmic scale,
+  lying within the tolerance of some gear
+
+Steps, clusters and coverage are scale free, so they are the same for
+gear ratios, gain ratios and speeds at a fixed cadence.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from .main import gear_ratios
+from .batch import bicycle_arrays, gear_ratio_array
+
+
+#: The result of :func:`gear_spacing`:
+#:
+#: - gears: list of gears (front cog, rear cog) in increasing order of
+#:   gear ratio
+#: - steps: list of the relative jumps between neighbouring gears
+#: - clusters: list of duplicate clusters of two or more gears
+#: - num_unique: number of gears, counting each duplicate cluster once
+#: - coverage: fraction of the gear range within the tolerance of a gear
+#: - gear_range: largest gear ratio divided by the smallest
+GearSpacing = namedtuple('GearSpacing', ['gears', 'steps', 'clusters',
+  'num_unique', 'coverage', 'gear_range'])
+
+def spacing_arrays(ratios, tolerance=0.02):
+    """
+    Given an array of gear ratios of shape ``(n, ...)``, padded with NaN,
+    analyze the ratios of each of the n drivetrains, and return a
+    dictionary of arrays with the keys
+
+    - ``'steps'``: the steps of each drivetrain, in gear order,
+      of shape ``(n, m - 1)`` where m is the number of ratios per
+      drivetrain, padded with NaN
+    - ``'num_gears'``, ``'num_unique'``, ``'coverage'``,
+      ``'gear_range'``, ``'min_step'`` and ``'max_step'``:
+      one entry per drivetrain, with NaN steps for drivetrains with
+      one gear
+
+    EXAMPLES::
+
+        >>> a = spacing_arrays(np.array([[1, 1.01, 1.2, np.nan]]))
+        >>> a['steps'].round(3)
+        array([[0.01 , 0.188,   nan]])
+        >>> a['num_unique'], a['coverage'].round(3)
+        (array([2]), array([0.272]))
+
+    """
+    r = np.asarray(ratios, dtype=float)
+    r = np.sort(r.reshape(r.shape[0], -1), axis=-1)
+    steps = r[:, 1:]/r[:, :-1] - 1
+    missing = np.isnan(steps)
+
+    num_gears = np.sum(~np.isnan(r), axis=-1)
+    num_unique = num_gears - np.sum(steps <= tolerance, axis=-1)
+    logs = np.where(missing, 0, np.log1p(np.where(missing, 0, steps)))
+    total = logs.sum(axis=-1)
+    covered = np.minimum(logs, 2*np.log1p(tolerance)).sum(axis=-1)
+    coverage = np.ones_like(total)
+    np.divide(covered, total, out=coverage, where=total > 0)
+
+    max_step = np.max(np.where(missing, -np.inf, steps), axis=-1,
+      initial=-np.inf)
+    min_step = np.min(np.where(missing, np.inf, steps), axis=-1,
+      initial=np.inf)
+    single = num_gears < 2
+    return {
+        'steps': steps,
+        'num_gears': num_gears,
+        'num_unique': num_unique,
+        'coverage': coverage,
+        'gear_range': np.exp(total),
+        'min_step': np.where(single, np.nan, min_step),
+        'max_step': np.where(single, np.nan, max_step),
+    }
+
+def gear_spacing(bicycle, tolerance=0.02):
+    """
+    Return the GearSpacing of the given Bicycle object's gears,
+    with duplicate clusters of gears at most ``tolerance`` apart
+    (e.g. 0.02 for 2%).
+
+    Assume the following bicycle attributes are non-null and non-empty:
+
+    - front_cogs
+    - rear_cogs
+
+    Raise a ``ValueError``, if that is not the case.
+
+    EXAMPLES::
+
+        >>> from bicyclator.main import Bicycle
+        >>> b = Bicycle(front_cogs=[34, 50], rear_cogs=[11, 16, 24])
+        >>> s = gear_spacing(b, tolerance=0.05)
+        >>> s.gears
+        [(34, 24), (50, 24), (34, 16), (34, 11), (50, 16), (50, 11)]
+        >>> [round(x, 3) for x in s.steps]
+        [0.471, 0.02, 0.455, 0.011, 0.455]
+        >>> s.clusters
+        [[(50, 24), (34, 16)], [(34, 11), (50, 16)]]
+        >>> s.num_unique, round(s.coverage, 3), round(s.gear_range, 2)
+        (4, 0.277, 3.21)
+
+    """
+    ratios = gear_ratios(bicycle)
+    gears = sorted(ratios, key=lambda g: ratios[g])
+    a = spacing_arrays(np.array([[ratios[g] for g in gears]]), tolerance)
+    steps = a['steps'][0].tolist()
+
+    clusters = []
+    cluster = gears[:1]
+    for (g, step) in zip(gears[1:], steps):
+        if step <= tolerance:
+            cluster.append(g)
+        else:
+            if len(cluster) > 1:
+                clusters.append(cluster)
+            cluster = [g]
+    if len(cluster) > 1:
+        clusters.append(cluster)
+
+    return GearSpacing(gears, steps, clusters, int(a['num_unique'][0]),
+      float(a['coverage'][0]), float(a['gear_range'][0]))
+
+def gear_spacings(bicycles, tolerance=0.02):
+    """
+    Analyze the gears of the given Bicycle objects, or BicycleTable,
+    all at once, and return the dictionary of arrays of
+    :func:`spacing_arrays`.
+    Duplicate clusters are not listed, but are counted in
+    ``'num_unique'``.
+
+    Assume the following bicycle attributes are non-null and non-empty:
+
+    - front_cogs
+    - rear_cogs
+
+    Raise a ``ValueError``, if that is not the case.
+
+    EXAMPLES::
+
+        >>> from bicyclator.main import Bicycle
+        >>> bs = [Bicycle(front_cogs=[34, 50], rear_cogs=[11, 16, 24]),
+        ...   Bicycle(front_cogs=[40], rear_cogs=[20])]
+        >>> a = gear_spacings(bs, tolerance=0.05)
+        >>> a['num_unique'], a['max_step'].round(3)
+        (array([4, 1]), array([0.471,   nan]))
+
+    """
+    a = bicycle_arrays(bicycles, ['front_cogs', 'rear_cogs'])
+    return spacing_arrays(gear_ratio_array(a['front_cogs'], a['rear_cogs']),
+      tolerance)
@@ -0,0 +1,598 @@
+"""
+Vectorized versions of the calculators in :mod:`bicyclator.main`
+that evaluate many bicycles in one NumPy-broadcast pass.
+
+Conventions:
+
+- Same units as :mod:`bicyclator.main`
+- Ragged cog lists are padded with NaN into float arrays of shape
+  ``(num_bicycles, max_num_cogs)``, so that per-gear results have shape
+  ``(num_bicycles, max_num_front_cogs, max_num_rear_cogs)`` and
+  nonexistent gears come out as NaN
+- The ``*_array`` functions take arrays and broadcast in the usual
+  NumPy way; the other functions take a list of Bicycle or Wheel
+  objects, or a :class:`bicyclator.table.BicycleTable` or
+  :class:`bicyclator.table.WheelTable`
+"""
+from math import pi
+
+import numpy as np
+
+
+def cog_array(cog_lists):
+    """
+    Given a list of cog lists, return a float array of shape
+    ``(len(cog_lists), max cog list length)`` containing the cogs,
+    padded with NaN.
+
+    EXAMPLES::
+
+        >>> cog_array([[28, 42], [34]])
+        array([[28., 42.],
+               [34., nan]])
+
+    """
+    n = len(cog_lists)
+    m = max([len(c) for c in cog_lists], default=0)
+    result = np.full((n, m), np.nan)
+    for i, cogs in enumerate(cog_lists):
+        result[i, :len(cogs)] = cogs
+    return result
+
+def bicycle_arrays(bicycles, attrs):
+    """
+    Return a dictionary of the form attribute -> NumPy array
+    holding the given attributes of the given Bicycle objects,
+    for use as arguments to the ``*_array`` functions.
+    Cog attributes become padded arrays as in :func:`cog_array`
+    and the attributes ``'front_wheel_diameter'`` and
+    ``'rear_wheel_diameter'`` are read from each bicycle's wheels.
+    The bicycles may also be given as a
+    :class:`bicyclator.table.BicycleTable`, in which case the
+    arrays are read straight from its columns.
+
+    Raise a ``ValueError`` if any of the attributes are null or empty.
+    """
+    from .main import check_attrs
+    from .table import BicycleTable
+
+    if isinstance(bicycles, BicycleTable):
+        return bicycles.arrays(attrs)
+
+    result = {}
+    for attr in attrs:
+        if attr.endswith('_wheel_diameter'):
+            wheel = attr[:-len('_diameter')]
+            for b in bicycles:
+                check_attrs(b, wheel)
+                check_attrs(getattr(b, wheel), 'diameter')
+            values = [getattr(b, wheel).diameter for b in bicycles]
+        else:
+            for b in bicycles:
+                check_attrs(b, attr)
+            values = [getattr(b, attr) for b in bicycles]
+
+        if attr in ['front_cogs', 'rear_cogs']:
+            result[attr] = cog_array(values)
+        else:
+            result[attr] = np.array(values, dtype=float)
+
+    return result
+
+def wheel_arrays(wheels, attrs):
+    """
+    Return a dictionary of the form attribute -> NumPy array
+    holding the given attributes of the given Wheel objects.
+    The dictionary attributes ``center_to_flange`` and
+    ``flange_diameter`` are split into the attributes
+    ``'center_to_flange_left'``, ``'center_to_flange_right'``, etc.
+    The wheels may also be given as a
+    :class:`bicyclator.table.WheelTable`, in which case the
+    arrays are read straight from its columns.
+
+    Raise a ``ValueError`` if any of the attributes are null or empty.
+    """
+    from .main import check_attrs
+    from .table import WheelTable
+
+    if isinstance(wheels, WheelTable):
+        return wheels.arrays(attrs)
+
+    result = {}
+    for attr in attrs:
+        if attr.endswith('_left') or attr.endswith('_right'):
+            name, side = attr.rsplit('_', 1)
+            for w in wheels:
+                check_attrs(w, name)
+                if getattr(w, name).get(side) is None:
+                    raise ValueError("Attribute '{!s}' must not be None "\
+                      "or empty in object \n{!s}".format(attr, w))
+            values = [getattr(w, name)[side] for w in wheels]
+        elif attr in ['offset', 'num_crosses']:
+            # Zero is a valid offset and a valid number of crosses
+            values = [getattr(w, attr) for w in wheels]
+            for (w, v) in zip(wheels, values):
+                if v is None:
+                    raise ValueError("Attribute '{!s}' "\
+                      "must not be None in object \n{!s}".format(attr, w))
+        else:
+            for w in wheels:
+                check_attrs(w, attr)
+            values = [getattr(w, attr) for w in wheels]
+        result[attr] = np.array(values, dtype=float)
+
+    return result
+
+def grid_dict(front_cogs, rear_cogs, values):
+    """
+    Given a list of front cogs, a list of rear cogs, and an array of
+    shape ``(len(front_cogs), len(rear_cogs))``, return the dictionary
+    of the form (front cog, rear cog) -> value used by the calculators
+    in :mod:`bicyclator.main`.
+    """
+    values = np.asarray(values).tolist()
+    result = {}
+    for i, f in enumerate(front_cogs):
+        for j, r in enumerate(rear_cogs):
+            result[(f, r)] = values[i][j]
+    return result
+
+def _round(a, digits):
+    if digits is not None:
+        a = np.round(a, digits)
+    return a
+
+def gear_ratio_array(front_cogs, rear_cogs):
+    """
+    Return the gear ratios for the given arrays of front cogs and
+    rear cogs as an array of shape
+    ``front_cogs.shape + rear_cogs.shape[-1:]``.
+    In particular, arrays of shape ``(n, F)`` and ``(n, R)``
+    give ratios of shape ``(n, F, R)``.
+
+    EXAMPLES::
+
+        >>> gear_ratio_array([40], [20, 30]).round(3)
+        array([[2.   , 1.333]])
+
+    """
+    f = np.asarray(front_cogs, dtype=float)
+    r = np.asarray(rear_cogs, dtype=float)
+    return f[..., :, None]/r[..., None, :]
+
+def gain_ratio_array(front_cogs, rear_cogs, crank_length,
+  rear_wheel_diameter):
+    """
+    Return the gain ratios for the given arrays of front cogs, rear cogs,
+    crank lengths and rear wheel diameters, the last two having one
+    entry per bicycle.
+    The result has the shape of :func:`gear_ratio_array`.
+
+    EXAMPLES::
+
+        >>> gain_ratio_array([[40]], [[20, 30]], [100], [600])
+        array([[[6., 4.]]])
+
+    """
+    f = np.asarray(front_cogs, dtype=float)
+    r = np.asarray(rear_cogs, dtype=float)
+    w = np.asarray(rear_wheel_diameter, dtype=float)/2/\
+      np.asarray(crank_length, dtype=float)
+    return w[..., None, None]*f[..., :, None]/r[..., None, :]
+
+def cadence_to_speed_array(front_cogs, rear_cogs, crank_length,
+  rear_wheel_diameter, cadence):
+    """
+    Return the speeds in kilometers per hour for the given arrays of
+    bicycle parameters (as in :func:`gain_ratio_array`) and
+    cadence in hertz.
+    The cadence is either a scalar or has one entry per bicycle.
+    """
+    c = np.asarray(crank_length, dtype=float)
+    g = gain_ratio_array(front_cogs, rear_cogs, c, rear_wheel_diameter)
+    cadence = np.asarray(cadence, dtype=float)
+    return 2*pi*c[..., None, None]*g*cadence[..., None, None]*(3600/1e6)
+
+def speed_to_cadence_array(front_cogs, rear_cogs, crank_length,
+  rear_wheel_diameter, speed):
+    """
+    Return the cadences in hertz for the given arrays of
+    bicycle parameters (as in :func:`gain_ratio_array`) and
+    speed in kilometers per hour.
+    The speed is either a scalar or has one entry per bicycle.
+    """
+    c = np.asarray(crank_length, dtype=float)
+    g = gain_ratio_array(front_cogs, rear_cogs, c, rear_wheel_diameter)
+    speed = np.asarray(speed, dtype=float)
+    return speed[..., None, None]/(2*pi*c[..., None, None]*g*(3600/1e6))
+
+def skid_patch_array(front_cogs, rear_cogs, ambidextrous=False):
+    """
+    Return the numbers of skid patches, as computed by
+    :func:`bicyclator.main.num_skid_patches`, for the given arrays of
+    front cogs and rear cogs as a float array shaped as in
+    :func:`gear_ratio_array`, with NaN for NaN cogs.
+
+    EXAMPLES::
+
+        >>> skid_patch_array([50], [25, 30, np.nan], ambidextrous=True)
+        array([[ 1.,  6., nan]])
+
+    """
+    f = np.asarray(front_cogs, dtype=float)[..., :, None]
+    r = np.asarray(rear_cogs, dtype=float)[..., None, :]
+    f, r = np.broadcast_arrays(f, r)
+    valid = ~(np.isnan(f) | np.isnan(r))
+    f = np.where(valid, f, 1).astype(np.int64)
+    r = np.where(valid, r, 1).astype(np.int64)
+    g = np.gcd(f, r)
+    result = r//g
+    if ambidextrous:
+        result = np.where((f//g) % 2, 2*result, result)
+    return np.where(valid, result, np.nan)
+
+def trail_array(head_tube_angle, fork_rake, front_wheel_diameter):
+    """
+    Return the tuple of arrays (trail, mechanical trail, wheel flop)
+    for the given broadcastable arrays of head tube angles, fork rakes
+    and front wheel diameters.
+
+    EXAMPLES::
+
+        >>> [x.round(1) for x in trail_array([72, 73], 64, 700)]
+        [array([46.4, 40.1]), array([44.2, 38.3]), array([13.6, 11.2])]
+
+    """
+    a = np.radians(np.asarray(head_tube_angle, dtype=float))
+    wheel_radius = np.asarray(front_wheel_diameter, dtype=float)/2
+    sin_a = np.sin(a)
+    cos_a = np.cos(a)
+    trail = (wheel_radius*cos_a - np.asarray(fork_rake, dtype=float))/sin_a
+    mechanical_trail = trail*sin_a
+    wheel_flop = mechanical_trail*cos_a
+    return trail, mechanical_trail, wheel_flop
+
+def spoke_cosines(num_spokes, num_crosses):
+    """
+    Return the array of cosines of the angles
+    ``2*pi*num_crosses/(num_spokes/2)`` between the hub and rim ends of
+    a spoke, for the given broadcastable arrays of spoke counts and
+    cross counts.
+
+    EXAMPLES::
+
+        >>> spoke_cosines([36, 36, 32], [3, 3, 0]).round(3)
+        array([0.5, 0.5, 1. ])
+
+    """
+    ns = np.asarray(num_spokes, dtype=float)
+    nc = np.asarray(num_crosses, dtype=float)
+    return np.cos(2*pi*nc/(ns/2))
+
+def spoke_length_array(center_to_flange_left, center_to_flange_right,
+  flange_diameter_left, flange_diameter_right, erd, spoke_hole_diameter,
+  offset, num_spokes, num_crosses):
+    """
+    Return the dictionary of the form side -> array of spoke lengths,
+    where side is ``'left'`` (nondrive side) or ``'right'``
+    (drive side), for the given broadcastable arrays of hub, rim and
+    lacing parameters.
+    The spoke angle cosines are computed with :func:`spoke_cosines`
+    and shared by both sides.
+
+    EXAMPLES::
+
+        >>> d = spoke_length_array(37.1, 20.9, 45, 45, 560, 2.6, 3, 36,
+        ...   [0, 1, 2, 3, 4])
+        >>> d['left'].round(1)
+        array([258.4, 259.9, 264.1, 270.3, 277.8])
+
+    """
+    c = spoke_cosines(num_spokes, num_crosses)
+    r2 = np.asarray(erd, dtype=float)/2
+    r3 = np.asarray(spoke_hole_diameter, dtype=float)/2
+    o = np.asarray(offset, dtype=float)
+    result = {}
+    for (k, ctf, fd, sign) in [
+      ('left', center_to_flange_left, flange_diameter_left, -1),
+      ('right', center_to_flange_right, flange_diameter_right, 1)]:
+        d = np.asarray(ctf, dtype=float) + sign*o
+        r1 = np.asarray(fd, dtype=float)/2
+        result[k] = np.sqrt(d**2 + r1**2 + r2**2 - 2*r1*r2*c) - r3
+    return result
+
+def spoke_length_grid(hubs, rims, num_spokes, num_crosses, digits=None):
+    """
+    Return the spoke lengths for every combination of the given hubs,
+    rims, spoke counts and cross counts, as a dictionary of the form
+    side -> array of shape
+    ``(len(hubs), len(rims), len(num_spokes), len(num_crosses))``.
+    Hubs are Wheel objects or a WheelTable providing
+    ``center_to_flange``, ``flange_diameter`` and
+    ``spoke_hole_diameter``; rims are Wheel objects or a WheelTable
+    providing ``erd`` and ``offset``.
+
+    EXAMPLES::
+
+        >>> from bicyclator.main import Wheel
+        >>> hub = Wheel(center_to_flange={'left': 37.1, 'right': 20.9},
+        ...   flange_diameter={'left': 45, 'right': 45})
+        >>> rims = [Wheel(erd=560, offset=3), Wheel(erd=600, offset=0)]
+        >>> d = spoke_length_grid([hub], rims, [32, 36], [2, 3], digits=1)
+        >>> d['right'].shape
+        (1, 2, 2, 2)
+        >>> float(d['right'][0, 0, 1, 1])
+        269.2
+
+    """
+    h = wheel_arrays(hubs, ['center_to_flange_left',
+      'center_to_flange_right', 'flange_diameter_left',
+      'flange_diameter_right', 'spoke_hole_diameter'])
+    h = {k: v[:, None, None, None] for k, v in h.items()}
+    r = wheel_arrays(rims, ['erd', 'offset'])
+    r = {k: v[None, :, None, None] for k, v in r.items()}
+    ns = np.asarray(num_spokes, dtype=float)[None, None, :, None]
+    nc = np.asarray(num_crosses, dtype=float)[None, None, None, :]
+    ns, nc = np.broadcast_arrays(ns, nc)
+    result = spoke_length_array(num_spokes=ns, num_crosses=nc, **h, **r)
+    return {k: _round(v, digits) for k, v in result.items()}
+
+def gear_ratios(bicycles, digits=None):
+    """
+    Return the gear ratios of the given Bicycle objects as an array
+    of shape ``(num_bicycles, max_num_front_cogs, max_num_rear_cogs)``.
+
+    Assume the following bicycle attributes are non-null and non-empty:
+
+    - front_cogs
+    - rear_cogs
+
+    Raise a ``ValueError``, if that is not the case.
+
+    EXAMPLES::
+
+        >>> from bicyclator.main import Bicycle
+        >>> bs = [Bicycle(front_cogs=[40], rear_cogs=[20, 30]),
+        ...   Bicycle(front_cogs=[30, 45], rear_cogs=[15])]
+        >>> gear_ratios(bs, digits=2)
+        array([[[2.  , 1.33],
+                [ nan,  nan]],
+        <BLANKLINE>
+               [[2.  ,  nan],
+                [3.  ,  nan]]])
+
+    """
+    a = bicycle_arrays(bicycles, ['front_cogs', 'rear_cogs'])
+    return _round(gear_ratio_array(**a), digits)
+
+def gain_ratios(bicycles, digits=None):
+    """
+    Return the gain ratios of the given Bicycle objects as an array
+    of shape ``(num_bicycles, max_num_front_cogs, max_num_rear_cogs)``.
+
+    Assume the following bicycle attributes are non-null and non-empty:
+
+    - front_cogs
+    - rear_cogs
+    - crank_length
+    - rear_wheel
+
+    Raise a ``ValueError``, if that is not the case.
+
+    EXAMPLES::
+
+        >>> from bicyclator.main import Bicycle, Wheel
+        >>> w = Wheel(diameter=600)
+        >>> bs = [Bicycle(front_cogs=[40], rear_cogs=[20, 30],
+        ...   crank_length=100, rear_wheel=w)]
+        >>> gain_ratios(bs, digits=1)
+        array([[[6., 4.]]])
+
+    """
+    a = bicycle_arrays(bicycles, ['front_cogs', 'rear_cogs',
+      'crank_length', 'rear_wheel_diameter'])
+    return _round(gain_ratio_array(**a), digits)
+
+def cadence_to_speeds(bicycles, cadence, digits=None):
+    """
+    Return speeds in kilometers per hour of the given Bicycle objects
+    as an array of shape
+    ``(num_bicycles, max_num_front_cogs, max_num_rear_cogs)``.
+    Cadence is measured in hertz and is either a scalar or has
+    one entry per bicycle.
+
+    Assume the following bicycle attributes are non-null and non-empty:
+
+    - front_cogs
+    - rear_cogs
+    - crank_length
+    - rear_wheel
+
+    Raise a ``ValueError``, if that is not the case.
+
+    EXAMPLES::
+
+        >>> from bicyclator.main import Bicycle, Wheel
+        >>> w = Wheel(diameter=600)
+        >>> bs = [Bicycle(front_cogs=[40], rear_cogs=[20, 30],
+        ...   crank_length=100, rear_wheel=w)]
+        >>> cadence_to_speeds(bs, 2, digits=1)
+        array([[[27.1, 18.1]]])
+
+    """
+    a = bicycle_arrays(bicycles, ['front_cogs', 'rear_cogs',
+      'crank_length', 'rear_wheel_diameter'])
+    return _round(cadence_to_speed_array(cadence=cadence, **a), digits)
+
+def speed_to_cadences(bicycles, speed, digits=None):
+    """
+    Return cadences in hertz of the given Bicycle objects
+    as an array of shape
+    ``(num_bicycles, max_num_front_cogs, max_num_rear_cogs)``.
+    Speed is measured in kilometers per hour and is either a scalar or
+    has one entry per bicycle.
+
+    Assume the following bicycle attributes are non-null and non-empty:
+
+    - front_cogs
+    - rear_cogs
+    - crank_length
+    - rear_wheel
+
+    Raise a ``ValueError``, if that is not the case.
+
+    EXAMPLES::
+
+        >>> from bicyclator.main import Bicycle, Wheel
+        >>> w = Wheel(diameter=600)
+        >>> bs = [Bicycle(front_cogs=[40], rear_cogs=[20, 30],
+        ...   crank_length=100, rear_wheel=w)]
+        >>> speed_to_cadences(bs, 18.1, digits=1)
+        array([[[1.3, 2. ]]])
+
+    """
+    a = bicycle_arrays(bicycles, ['front_cogs', 'rear_cogs',
+      'crank_length', 'rear_wheel_diameter'])
+    return _round(speed_to_cadence_array(speed=speed, **a), digits)
+
+def derailer_capacity(bicycles):
+    """
+    Return the derailer capacities needed to accommodate the cog sets
+    of the given Bicycle objects as an array with one entry per bicycle.
+
+    Assume the following bicycle attributes are non-null and non-empty:
+
+    - front_cogs
+    - rear_cogs
+
+    Raise a ``ValueError``, if that is not the case.
+
+    EXAMPLES::
+
+        >>> from bicyclator.main import Bicycle
+        >>> bs = [Bicycle(front_cogs=[26, 36], rear_cogs=[12, 18, 32]),
+        ...   Bicycle(front_cogs=[50], rear_cogs=[11, 28])]
+        >>> derailer_capacity(bs)
+        array([30., 17.])
+
+    """
+    a = bicycle_arrays(bicycles, ['front_cogs', 'rear_cogs'])
+    f = a['front_cogs']
+    r = a['rear_cogs']
+    return (np.nanmax(f, axis=-1) - np.nanmin(f, axis=-1)) +\
+      (np.nanmax(r, axis=-1) - np.nanmin(r, axis=-1))
+
+def num_skid_patches(bicycles, ambidextrous=False):
+    """
+    Return the numbers of skid patches of the given Bicycle objects,
+    as computed by :func:`bicyclator.main.num_skid_patches`, as an
+    array of shape ``(num_bicycles, max_num_front_cogs,
+    max_num_rear_cogs)``.
+
+    Assume the following bicycle attributes are non-null and non-empty:
+
+    - front_cogs
+    - rear_cogs
+
+    Raise a ``ValueError``, if that is not the case.
+
+    EXAMPLES::
+
+        >>> from bicyclator.main import Bicycle
+        >>> bs = [Bicycle(front_cogs=[50], rear_cogs=[25, 30]),
+        ...   Bicycle(front_cogs=[48], rear_cogs=[17])]
+        >>> num_skid_patches(bs)
+        array([[[ 1.,  3.]],
+        <BLANKLINE>
+               [[17., nan]]])
+
+    """
+    a = bicycle_arrays(bicycles, ['front_cogs', 'rear_cogs'])
+    return skid_patch_array(ambidextrous=ambidextrous, **a)
+
+def approx_diameter(wheels):
+    """
+    Return the approximate diameters of the given Wheel objects
+    as an array with one entry per wheel.
+
+    Assume the following wheel attributes are non-null and non-empty:
+
+    - bsd
+    - tire_width
+
+    Raise a ``ValueError``, if that is not the case.
+
+    EXAMPLES::
+
+        >>> from bicyclator.main import Wheel
+        >>> approx_diameter([Wheel(bsd=584, tire_width=42),
+        ...   Wheel(bsd=622, tire_width=25)])
+        array([668., 672.])
+
+    """
+    a = wheel_arrays(wheels, ['bsd', 'tire_width'])
+    return a['bsd'] + 2*a['tire_width']
+
+def trail(bicycles, digits=None):
+    """
+    Return the tuple of arrays (trail, mechanical trail, wheel flop)
+    of the given Bicycle objects, each with one entry per bicycle.
+
+    Assume the following bicycle attributes are non-null and non-empty:
+
+    - head_tube_angle
+    - fork_rake
+    - front_wheel
+
+    Raise a ``ValueError``, if that is not the case.
+
+    EXAMPLES::
+
+        >>> from bicyclator.main import Bicycle, Wheel
+        >>> w = Wheel(diameter=700)
+        >>> bs = [Bicycle(head_tube_angle=73, fork_rake=64, front_wheel=w)]
+        >>> trail(bs, digits=1)
+        (array([40.1]), array([38.3]), array([11.2]))
+
+    """
+    a = bicycle_arrays(bicycles, ['head_tube_angle', 'fork_rake',
+      'front_wheel_diameter'])
+    return tuple(_round(x, digits) for x in trail_array(**a))
+
+def spoke_length(wheels, digits=None):
+    """
+    Return the left (nondrive side) and right (drive side) spoke lengths
+    of the given Wheel objects as a dictionary of the form
+    side -> array with one entry per wheel.
+
+    Assume the following wheel attributes are non-null and non-empty:
+
+    - center_to_flange
+    - flange_diameter
+    - spoke_hole_diameter
+    - erd
+    - num_spokes
+
+    and the following wheel attributes are non-null, but possibly zero:
+
+    - offset
+    - num_crosses
+
+    Raise a ``ValueError``, if that is not the case.
+
+    EXAMPLES::
+
+        >>> from bicyclator.main import Wheel
+        >>> w = Wheel(center_to_flange={'left': 37.1, 'right': 20.9},
+        ...   flange_diameter={'left': 45, 'right': 45}, erd=560,
+        ...   spoke_hole_diameter=2.6, offset=3, num_spokes=36, num_crosses=3)
+        >>> spoke_length([w, w], digits=1)
+        {'left': array([270.3, 270.3]), 'right': array([269.2, 269.2])}
+
+    """
+    a = wheel_arrays(wheels, ['center_to_flange_left',
+      'center_to_flange_right', 'flange_diameter_left',
+      'flange_diameter_right', 'erd', 'spoke_hole_diameter', 'offset',
+      'num_spokes', 'num_crosses'])
+    result = spoke_length_array(**a)
+    return {k: _round(v, digits) for k, v in result.items()}
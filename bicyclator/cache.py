@@ -0,0 +1,280 @@
+"""
+Memoization of the calculators in :mod:`bicyclator.main`.
+
+Bicycle and Wheel objects are mutable and unhashable, so results are
+keyed instead by a fingerprint of just the attributes each calculator
+depends on, as listed in ``DEPENDENCIES``.
+For example, two bicycles with the same cogs, crank length and rear
+wheel diameter share one cached :func:`bicyclator.main.gain_ratios`
+result, whatever their names or head tube angles.
+
+Each cached calculator keeps a bounded LRU cache with an optional
+time to live and counts its hits, misses and evictions.
+"""
+from collections import OrderedDict
+from collections.abc import Mapping
+from functools import update_wrapper
+import threading
+import time
+
+from . import main
+
+
+#: Calculator name -> attributes of its Bicycle or Wheel argument that
+#: its result depends on, with dots separating nested attributes
+DEPENDENCIES = {
+    'derailer_capacity': ['front_cogs', 'rear_cogs'],
+    'num_skid_patches': ['front_cogs', 'rear_cogs'],
+    'gear_ratios': ['front_cogs', 'rear_cogs'],
+    'gain_ratios': ['front_cogs', 'rear_cogs', 'crank_length',
+      'rear_wheel.diameter'],
+    'cadence_to_speeds': ['front_cogs', 'rear_cogs', 'crank_length',
+      'rear_wheel.diameter'],
+    'speed_to_cadences': ['front_cogs', 'rear_cogs', 'crank_length',
+      'rear_wheel.diameter'],
+    'trail': ['head_tube_angle', 'fork_rake', 'front_wheel.diameter'],
+    'spoke_length': ['center_to_flange', 'flange_diameter',
+      'spoke_hole_diameter', 'erd', 'offset', 'num_spokes', 'num_crosses'],
+    'approx_diameter': ['bsd', 'tire_width'],
+}
+
+def _freeze(v):
+    if isinstance(v, Mapping):
+        return tuple(sorted((k, _freeze(x)) for k, x in v.items()))
+    if isinstance(v, (list, tuple)):
+        return tuple(_freeze(x) for x in v)
+    return v
+
+def fingerprint(obj, attrs):
+    """
+    Return a hashable tuple of the values of the given attributes of
+    the given object, with lists and dictionaries frozen into tuples.
+    Attributes with dots are looked up on nested objects, and missing
+    objects along the way give None.
+
+    EXAMPLES::
+
+        >>> w = main.Wheel(diameter=600)
+        >>> b = main.Bicycle(front_cogs=[40], rear_cogs=[20, 30],
+        ...   crank_length=100, rear_wheel=w)
+        >>> fingerprint(b, DEPENDENCIES['gain_ratios'])
+        ((40,), (20, 30), 100, 600)
+
+    """
+    result = []
+    for attr in attrs:
+        v = obj
+        for a in attr.split('.'):
+            v = getattr(v, a, None)
+        result.append(_freeze(v))
+    return tuple(result)
+
+_MISSING = object()
+
+def _copy(v):
+    if isinstance(v, dict):
+        return dict(v)
+    if isinstance(v, list):
+        return list(v)
+    return v
+
+
+class LRUCache(object):
+    """
+    A dictionary-like cache holding at most ``maxsize`` entries
+    (unbounded if None), evicting the least recently used entry
+    when full, and expiring entries older than ``ttl`` seconds
+    (never if None).
+    Lookups, insertions and clearing hold a lock, so the cache may be
+    shared between threads.
+
+    Attributes:
+
+    - maxsize
+    - ttl
+    - hits, misses, evictions, expirations: counts since the last
+      :meth:`clear`
+    - clock: function returning the current time in seconds
+
+    EXAMPLES::
+
+        >>> now = [0]
+        >>> c = LRUCache(maxsize=2, ttl=10, clock=lambda: now[0])
+        >>> c.put('a', 1); c.put('b', 2); c.put('c', 3)
+        >>> c.get('a'), c.get('c')
+        (None, 3)
+        >>> now[0] = 10
+        >>> c.get('c')
+        >>> c.info()['evictions'], c.info()['expirations']
+        (1, 1)
+
+    """
+    def __init__(self, maxsize=1024, ttl=None, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return 'LRUCache({!s})'.format(self.info())
+
+    def clear(self):
+        """
+        Remove all entries and reset the statistics.
+        """
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.expirations = 0
+
+    def get(self, key, default=None):
+        """
+        Return the value cached for the given key and mark it as
+        recently used, or return ``default`` if there is none.
+        """
+        with self._lock:
+            try:
+                value, expiry = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expiry is not None and self.clock() >= expiry:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Cache the given value for the given key, evicting the least
+        recently used entry if the cache is full.
+        """
+        expiry = None if self.ttl is None else self.clock() + self.ttl
+        with self._lock:
+            self._data[key] = (value, expiry)
+            self._data.move_to_end(key)
+            if self.maxsize is not None and len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def info(self):
+        """
+        Return a dictionary of cache statistics.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits/lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+            }
+
+
+class CachedCalculator(object):
+    """
+    A calculator of one Bicycle or Wheel whose results are cached by
+    the fingerprint of the given attributes of its argument, together
+    with its other arguments.
+
+    Results are returned as shallow copies, so callers may modify them
+    without corrupting the cache.
+
+    Attributes:
+
+    - func: the wrapped calculator
+    - attrs: the attributes fingerprinted
+    - cache: an LRUCache
+    """
+    def __init__(self, func, attrs, maxsize=1024, ttl=None):
+        self.func = func
+        self.attrs = list(attrs)
+        self.cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        update_wrapper(self, func)
+
+    def __call__(self, obj, *args, **kwargs):
+        key = (fingerprint(obj, self.attrs), args,
+          tuple(sorted(kwargs.items())))
+        result = self.cache.get(key, _MISSING)
+        if result is _MISSING:
+            result = self.func(obj, *args, **kwargs)
+            self.cache.put(key, result)
+        return _copy(result)
+
+    def __repr__(self):
+        return 'CachedCalculator({!s}, {!s})'.format(self.func.__name__,
+          self.cache.info())
+
+    def cache_info(self):
+        """
+        Return the statistics of this calculator's cache.
+        """
+        return self.cache.info()
+
+    def cache_clear(self):
+        """
+        Empty this calculator's cache and reset its statistics.
+        """
+        self.cache.clear()
+
+def cached(func, attrs=None, maxsize=1024, ttl=None):
+    """
+    Return a CachedCalculator wrapping the given calculator.
+    If ``attrs`` is not given, look up the calculator's name in
+    ``DEPENDENCIES``.
+
+    EXAMPLES::
+
+        >>> f = cached(main.gain_ratios, maxsize=100)
+        >>> w = main.Wheel(diameter=600)
+        >>> b = main.Bicycle(name='a', front_cogs=[40], rear_cogs=[20, 30],
+        ...   crank_length=100, rear_wheel=w)
+        >>> c = b.copy()
+        >>> c.name = 'b'
+        >>> f(b, digits=1) == f(c, digits=1)
+        True
+        >>> f.cache_info()['hits'], f.cache_info()['misses']
+        (1, 1)
+
+    """
+    if attrs is None:
+        attrs = DEPENDENCIES[func.__name__]
+    return CachedCalculator(func, attrs, maxsize=maxsize, ttl=ttl)
+
+
+derailer_capacity = cached(main.derailer_capacity)
+num_skid_patches = cached(main.num_skid_patches)
+gear_ratios = cached(main.gear_ratios)
+gain_ratios = cached(main.gain_ratios)
+cadence_to_speeds = cached(main.cadence_to_speeds)
+speed_to_cadences = cached(main.speed_to_cadences)
+trail = cached(main.trail)
+spoke_length = cached(main.spoke_length)
+approx_diameter = cached(main.approx_diameter)
+
+def cache_info():
+    """
+    Return a dictionary of the form calculator name -> cache statistics
+    for the cached calculators of this module.
+    """
+    return {name: globals()[name].cache_info() for name in DEPENDENCIES}
+
+def cache_clear():
+    """
+    Empty the caches of the cached calculators of this module.
+    """
+    for name in DEPENDENCIES:
+        globals()[name].cache_clear()
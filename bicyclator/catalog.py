@@ -0,0 +1,416 @@
+"""
+An indexed catalog of wheels and drivetrains for compatibility queries.
+
+A Catalog holds its wheels in a WheelTable and its drivetrains, that is,
+cog sets such as cassettes, chainring sets or whole groupsets, in
+a BicycleTable (see :mod:`bicyclator.table`), and builds indexes on them
+once:
+
+- a SortedIndex, answering equality and range queries by binary search,
+  on every wheel column and on drivetrain derailer capacities
+- a HashIndex, answering equality queries by dictionary lookup,
+  on the wheel columns ``bsd``, ``num_spokes`` and ``num_crosses`` and
+  on drivetrain cog counts
+- an IntervalIndex, answering containment queries by two binary
+  searches, on the range (smallest cog, largest cog) of the front and
+  rear cogs of each drivetrain
+
+Queries return sorted arrays of row numbers, so query results combine
+by intersection, and rows are read lazily as row views.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from .table import BicycleTable, WheelTable
+from .batch import spoke_length_array
+
+
+def _missing(column):
+    if column.dtype.kind == 'f':
+        return np.isnan(column)
+    return column < 0
+
+
+class SortedIndex(object):
+    """
+    The rows of the given column sorted by value, skipping missing
+    values.
+
+    Attributes:
+
+    - keys: sorted array of the column's non-missing values
+    - rows: array of the corresponding row numbers
+
+    EXAMPLES::
+
+        >>> i = SortedIndex(np.array([600, np.nan, 540, 600]))
+        >>> i.range(550, None)
+        array([0, 3])
+        >>> i.equal(540)
+        array([2])
+
+    """
+    def __init__(self, column):
+        column = np.asarray(column)
+        rows = np.flatnonzero(~_missing(column))
+        self.rows = rows[np.argsort(column[rows], kind='stable')]
+        self.keys = column[self.rows]
+
+    def __len__(self):
+        return self.rows.size
+
+    def range(self, low=None, high=None):
+        """
+        Return the sorted array of rows whose values lie in the closed
+        interval [low, high], where None means unbounded.
+        """
+        i = 0 if low is None else np.searchsorted(self.keys, low, 'left')
+        j = self.keys.size if high is None else\
+          np.searchsorted(self.keys, high, 'right')
+        return np.sort(self.rows[i:j])
+
+    def equal(self, value):
+        """
+        Return the sorted array of rows with the given value.
+        """
+        return self.range(value, value)
+
+
+class HashIndex(object):
+    """
+    The rows of the given column grouped by value, skipping missing
+    values.
+
+    Attributes:
+
+    - groups: dictionary of the form value -> sorted array of rows
+
+    EXAMPLES::
+
+        >>> i = HashIndex(np.array([32, 36, -1, 32]))
+        >>> i.equal(32)
+        array([0, 3])
+        >>> i.equal(28)
+        array([], dtype=int64)
+
+    """
+    def __init__(self, column):
+        column = np.asarray(column)
+        rows = np.flatnonzero(~_missing(column))
+        keys, inverse = np.unique(column[rows], return_inverse=True)
+        order = np.argsort(inverse, kind='stable')
+        splits = np.cumsum(np.bincount(inverse, minlength=keys.size))[:-1]
+        self.groups = dict(zip(keys.tolist(),
+          np.split(rows[order], splits)))
+
+    def __len__(self):
+        return len(self.groups)
+
+    def equal(self, value):
+        """
+        Return the sorted array of rows with the given value.
+        """
+        return self.groups.get(value, np.array([], dtype=np.int64))
+
+
+class IntervalIndex(object):
+    """
+    An index of the closed intervals [lows[i], highs[i]] of the rows i,
+    skipping rows with missing bounds.
+
+    EXAMPLES::
+
+        >>> i = IntervalIndex([11, 10, 12], [28, 42, 25])
+        >>> i.within(11, 30)
+        array([0, 2])
+        >>> i.containing(11, 28)
+        array([0, 1])
+
+    """
+    def __init__(self, lows, highs):
+        self.lows = SortedIndex(lows)
+        self.highs = SortedIndex(highs)
+
+    def within(self, low=None, high=None):
+        """
+        Return the sorted array of rows whose intervals lie within
+        [low, high], where None means unbounded.
+        """
+        return np.intersect1d(self.lows.range(low, None),
+          self.highs.range(None, high), assume_unique=True)
+
+    def containing(self, low, high=None):
+        """
+        Return the sorted array of rows whose intervals contain
+        [low, high], or the point low if high is None.
+        """
+        if high is None:
+            high = low
+        return np.intersect1d(self.lows.range(None, low),
+          self.highs.range(high, None), assume_unique=True)
+
+
+def _ragged_reduce(ufunc, offsets, values):
+    """
+    Reduce each row of the given ragged array with the given ufunc,
+    giving NaN for empty rows.
+    """
+    result = np.full(offsets.size - 1, np.nan)
+    nonempty = np.flatnonzero(np.diff(offsets) > 0)
+    if nonempty.size:
+        result[nonempty] = ufunc.reduceat(values, offsets[nonempty])
+    return result
+
+#: A wheel build from :meth:`Catalog.spoke_builds`: hub and rim row
+#: numbers, spoke and cross counts, the left and right spoke lengths
+#: needed and the left and right spoke lengths in stock used
+SpokeBuild = namedtuple('SpokeBuild', ['hub', 'rim', 'num_spokes',
+  'num_crosses', 'left_length', 'right_length', 'left_stock',
+  'right_stock'])
+
+
+class Catalog(object):
+    """
+    An indexed catalog of the given wheels and drivetrains, each given
+    as a list of Wheel or Bicycle objects or as a WheelTable or
+    BicycleTable.
+    Only the cogs of the drivetrains are indexed.
+
+    Attributes:
+
+    - wheels: WheelTable
+    - drivetrains: BicycleTable
+    - wheel_indexes: dictionary of the form wheel column name ->
+      HashIndex or SortedIndex, with the hash index preferred for
+      columns having both
+    - drivetrain_indexes: dictionary of the form key -> index, with keys
+      ``'front_cogs'`` and ``'rear_cogs'`` (IntervalIndex of cog ranges),
+      ``'capacity'`` (SortedIndex of derailer capacities)
+      and ``'num_front_cogs'`` and ``'num_rear_cogs'`` (HashIndex)
+    - capacities: array of drivetrain derailer capacities, as
+      computed by :func:`bicyclator.main.derailer_capacity`, except
+      that a missing side counts as zero
+
+    EXAMPLES::
+
+        >>> from bicyclator.main import Bicycle, Wheel
+        >>> rims = [Wheel(name='a', bsd=622, erd=602, num_spokes=32),
+        ...   Wheel(name='b', bsd=584, erd=560, num_spokes=32),
+        ...   Wheel(name='c', bsd=622, erd=608, num_spokes=28)]
+        >>> cassettes = [Bicycle(name='11-28', rear_cogs=[11, 14, 18, 28]),
+        ...   Bicycle(name='11-42', rear_cogs=[11, 18, 28, 42])]
+        >>> c = Catalog(rims, cassettes)
+        >>> c.find_wheels(bsd=622, erd=(600, 605))
+        array([0])
+        >>> [c.drivetrains[i].name for i in c.fits_derailer(37, 36)]
+        ['11-28']
+
+    """
+    HASHED_WHEEL_COLUMNS = ['bsd', 'num_spokes', 'num_crosses']
+
+    def __init__(self, wheels=(), drivetrains=()):
+        if not isinstance(wheels, WheelTable):
+            wheels = WheelTable.from_wheels(list(wheels))
+        if not isinstance(drivetrains, BicycleTable):
+            drivetrains = BicycleTable.from_bicycles(list(drivetrains))
+        self.wheels = wheels
+        self.drivetrains = drivetrains
+
+        self.wheel_indexes = {}
+        self._sorted_wheel_indexes = {}
+        for (k, column) in wheels.columns.items():
+            self._sorted_wheel_indexes[k] = SortedIndex(column)
+            if k in self.HASHED_WHEEL_COLUMNS:
+                self.wheel_indexes[k] = HashIndex(column)
+            else:
+                self.wheel_indexes[k] = self._sorted_wheel_indexes[k]
+
+        t = drivetrains
+        self.drivetrain_indexes = {}
+        self._sorted_drivetrain_indexes = {}
+        spans = []
+        for side in ['front', 'rear']:
+            offsets = getattr(t, side + '_cog_offsets')
+            values = getattr(t, side + '_cog_values')
+            lows = _ragged_reduce(np.minimum, offsets, values)
+            highs = _ragged_reduce(np.maximum, offsets, values)
+            self.drivetrain_indexes[side + '_cogs'] = IntervalIndex(lows,
+              highs)
+            counts = np.diff(offsets)
+            k = 'num_{!s}_cogs'.format(side)
+            self.drivetrain_indexes[k] = HashIndex(counts)
+            self._sorted_drivetrain_indexes[k] = SortedIndex(counts)
+            spans.append(np.nan_to_num(highs - lows))
+        self.capacities = spans[0] + spans[1]
+        self.drivetrain_indexes['capacity'] = SortedIndex(self.capacities)
+
+        hub_columns = ['center_to_flange_left', 'center_to_flange_right',
+          'flange_diameter_left', 'flange_diameter_right',
+          'spoke_hole_diameter', 'num_spokes']
+        rim_columns = ['erd', 'offset', 'num_spokes']
+        self._hubs = HashIndex(self._complete(hub_columns))
+        self._rims = HashIndex(self._complete(rim_columns))
+
+    def __repr__(self):
+        return 'Catalog with {!s} wheels and {!s} drivetrains'.format(
+          len(self.wheels), len(self.drivetrains))
+
+    def _complete(self, columns):
+        """
+        Return the ``num_spokes`` column, with -1 in the rows missing
+        any of the given columns.
+        """
+        c = self.wheels.columns
+        bad = np.zeros(len(self.wheels), dtype=bool)
+        for k in columns:
+            bad |= _missing(c[k])
+        return np.where(bad, -1, c['num_spokes'])
+
+    def _find(self, indexes, conditions, sorted_indexes=None):
+        """
+        Return the sorted array of rows meeting all the given
+        (nonempty) conditions, looked up in the given indexes.
+        """
+        result = None
+        for (k, v) in conditions.items():
+            if k not in indexes:
+                raise ValueError("Can't query on '{!s}'".format(k))
+            index = indexes[k]
+            if isinstance(v, tuple):
+                if isinstance(index, HashIndex):
+                    if not sorted_indexes or k not in sorted_indexes:
+                        raise ValueError("Can't query a range of '{!s}'"\
+                          .format(k))
+                    index = sorted_indexes[k]
+                if isinstance(index, IntervalIndex):
+                    rows = index.within(*v)
+                else:
+                    rows = index.range(*v)
+            elif isinstance(index, IntervalIndex):
+                rows = index.containing(v)
+            else:
+                rows = index.equal(v)
+            result = rows if result is None else\
+              np.intersect1d(result, rows, assume_unique=True)
+        return result
+
+    def find_wheels(self, **conditions):
+        """
+        Return the sorted array of the rows of the wheels meeting all the
+        given conditions, each of the form ``column=value`` for equality
+        or ``column=(low, high)`` for the closed range [low, high],
+        where None means unbounded, and where the columns are those of
+        ``WHEEL_COLUMNS``.
+        With no conditions, return all rows.
+
+        Raise a ``ValueError`` if a column is not indexed.
+        """
+        if not conditions:
+            return np.arange(len(self.wheels))
+        return self._find(self.wheel_indexes, conditions,
+          self._sorted_wheel_indexes)
+
+    def find_drivetrains(self, **conditions):
+        """
+        Return the sorted array of the rows of the drivetrains meeting all
+        the given conditions, each of one of the forms
+
+        - ``capacity=value`` or ``capacity=(low, high)``, for derailer
+          capacities equal to value or in the closed range [low, high]
+        - ``num_front_cogs=value`` or ``num_front_cogs=(low, high)``,
+          and likewise for ``num_rear_cogs``
+        - ``front_cogs=(low, high)`` or ``rear_cogs=(low, high)``,
+          for cogs all between low and high teeth
+        - ``front_cogs=value`` or ``rear_cogs=value``, for cog ranges
+          spanning value teeth
+
+        where None means unbounded.
+        With no conditions, return all rows.
+
+        Raise a ``ValueError`` if a condition is not one of these.
+
+        EXAMPLES::
+
+            >>> from bicyclator.main import Bicycle
+            >>> c = Catalog(drivetrains=[Bicycle(rear_cogs=[11, 28]),
+            ...   Bicycle(rear_cogs=[11, 14, 18, 28]),
+            ...   Bicycle(rear_cogs=[11, 13, 15, 17, 19, 21, 24, 28])])
+            >>> c.find_drivetrains(num_rear_cogs=(2, 4))
+            array([0, 1])
+
+        """
+        if not conditions:
+            return np.arange(len(self.drivetrains))
+        return self._find(self.drivetrain_indexes, conditions,
+          self._sorted_drivetrain_indexes)
+
+    def fits_derailer(self, max_capacity, max_cog, min_cog=None):
+        """
+        Return the sorted array of the rows of the drivetrains that fit
+        a rear derailer with the given total capacity and largest
+        (and optionally smallest) rear cog.
+        """
+        return self.find_drivetrains(capacity=(None, max_capacity),
+          rear_cogs=(min_cog, max_cog))
+
+    def spoke_builds(self, stock, tolerance=1, num_crosses=3):
+        """
+        Return the list of SpokeBuilds, one for every pair of a hub and a
+        rim in this catalog with the same number of spokes for which
+        spoke lengths within ``tolerance`` millimeters of the needed
+        left and right lengths are in stock, laced with the given number
+        of crosses.
+        The chosen stock lengths are the nearest ones.
+
+        Hubs are the wheels with ``center_to_flange``,
+        ``flange_diameter``, ``spoke_hole_diameter`` and ``num_spokes``,
+        and rims are the wheels with ``erd``, ``offset`` and
+        ``num_spokes``.
+        The stock is an iterable of spoke lengths, and each needed length
+        is matched against it by binary search.
+
+        EXAMPLES::
+
+            >>> from bicyclator.main import Wheel
+            >>> hub = Wheel(name='hub', num_spokes=36,
+            ...   center_to_flange={'left': 37.1, 'right': 20.9},
+            ...   flange_diameter={'left': 45, 'right': 45})
+            >>> rims = [Wheel(erd=560, offset=3, num_spokes=36),
+            ...   Wheel(erd=600, num_spokes=36)]
+            >>> c = Catalog([hub] + rims)
+            >>> builds = c.spoke_builds([268, 270, 272])
+            >>> [(b.hub, b.rim, b.left_stock, b.right_stock) for b in builds]
+            [(0, 1, 270.0, 270.0)]
+
+        """
+        stock = np.unique(np.asarray(list(stock), dtype=float))
+        c = self.wheels.columns
+        result = []
+        for (n, hubs) in sorted(self._hubs.groups.items()):
+            rims = self._rims.equal(n)
+            if not rims.size or not stock.size:
+                continue
+            h = {k: c[k][hubs][:, None] for k in ['center_to_flange_left',
+              'center_to_flange_right', 'flange_diameter_left',
+              'flange_diameter_right', 'spoke_hole_diameter']}
+            lengths = spoke_length_array(erd=c['erd'][rims][None, :],
+              offset=c['offset'][rims][None, :], num_spokes=float(n),
+              num_crosses=float(num_crosses), **h)
+            nearest = {}
+            ok = True
+            for (side, needed) in lengths.items():
+                j = np.searchsorted(stock, needed)
+                lower = stock[np.maximum(j - 1, 0)]
+                upper = stock[np.minimum(j, stock.size - 1)]
+                near = np.where(needed - lower <= upper - needed, lower,
+                  upper)
+                nearest[side] = near
+                ok = ok & (np.abs(near - needed) <= tolerance)
+            for (i, j) in zip(*np.nonzero(ok)):
+                result.append(SpokeBuild(int(hubs[i]), int(rims[j]), n,
+                  num_crosses, float(lengths['left'][i, j]),
+                  float(lengths['right'][i, j]),
+                  float(nearest['left'][i, j]),
+                  float(nearest['right'][i, j])))
+        return result
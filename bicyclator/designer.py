@@ -0,0 +1,190 @@
+"""
+Design drivetrains whose gear or gain ratios come closest to a desired
+ladder of ratios.
+
+The error of a design is measured on a logarithmic scale, as the sum
+over the desired ratios of the squared differences between the natural
+logarithms of the achieved and desired ratios, so that it weighs
+relative differences alike across the ladder.
+That error is a sum of one term per rear cog, so for each chainring set
+the best cassettes are found by dynamic programming over the rear cogs
+in increasing order of teeth, keeping the k best partial cassettes
+ending in each tooth count.
+The smallest rear cog is branched on, best lower bound first, and a
+branch, or a partial cassette, is abandoned as soon as its error plus a
+lower bound on the error of the cogs still to come can no longer beat
+the k-th best design found so far.
+"""
+from collections import namedtuple
+from itertools import chain
+from math import ceil, log, sqrt
+import bisect
+import heapq
+
+from .main import check_attrs
+from .batch import gain_ratio_array
+
+
+#: A drivetrain design, where
+#:
+#: - ``rms_error`` and ``max_error`` are the root mean square and the
+#:   largest absolute difference between the natural logarithms of the
+#:   achieved and desired ratios, approximately relative errors,
+#:   e.g. 0.02 for 2%
+#: - ``derailer_capacity`` is as computed by
+#:   :func:`bicyclator.main.derailer_capacity`
+Design = namedtuple('Design', ['front_cogs', 'rear_cogs', 'rms_error',
+  'max_error', 'derailer_capacity'])
+
+def _check_ladders(targets, num_front_cogs):
+    if len(targets) != num_front_cogs:
+        raise ValueError('Need one ladder of target ratios per front cog')
+    n = len(targets[0])
+    if not n or any(len(ladder) != n for ladder in targets):
+        raise ValueError('Ladders of target ratios must have the same '
+          'nonzero length')
+    return n
+
+def _design(front_cogs, rear_cogs, targets, scale, total_error):
+    errors = [log(scale*f/r/t) for f, ladder in zip(front_cogs, targets)
+      for r, t in zip(rear_cogs, ladder) if t is not None]
+    rms = sqrt(total_error/len(errors)) if errors else 0.0
+    return Design(list(front_cogs), list(rear_cogs), rms,
+      max((abs(e) for e in errors), default=0.0),
+      front_cogs[-1] - front_cogs[0] + rear_cogs[-1] - rear_cogs[0])
+
+def iter_cassettes(targets, front_cogs, k=10, min_teeth=9, max_teeth=52,
+  allowed_steps=None, max_jump=None, max_derailer_capacity=None, scale=1):
+    """
+    Generate, best first, the pairs (error, rear cogs) of the at most
+    ``k`` cassettes for the given chainrings whose ratios
+    ``scale*front_cog/rear_cog`` come closest to the given targets,
+    as described in :func:`design_drivetrains`.
+    """
+    front_cogs = sorted(front_cogs)
+    n = _check_ladders(targets, len(front_cogs))
+    teeth = range(min_teeth, max_teeth + 1)
+    cost = [{r: sum(log(scale*f/r/ladder[i])**2 for f, ladder in
+      zip(front_cogs, targets) if ladder[i] is not None) for r in teeth}
+      for i in range(n)]
+    if max_derailer_capacity is None:
+        spare = max_teeth - min_teeth
+    else:
+        spare = max_derailer_capacity - (front_cogs[-1] - front_cogs[0])
+    if allowed_steps is not None:
+        allowed_steps = sorted(set(allowed_steps))
+
+    def predecessors(r):
+        # Rear cogs that may come just before r
+        if allowed_steps is not None:
+            ps = [r - s for s in allowed_steps if s > 0]
+        else:
+            ps = range(min_teeth, r)
+        if max_jump is not None:
+            low = ceil(r/(1 + max_jump) - 1e-9)
+            ps = [p for p in ps if p >= low]
+        return ps
+
+    def bounds(first, top):
+        # Lower bounds on the error of rear cogs i, ..., n - 1
+        result = [0.0]*(n + 1)
+        for i in range(n - 1, 0, -1):
+            result[i] = result[i + 1] + min(cost[i][r]
+              for r in range(first + i, top - (n - 1 - i) + 1))
+        result[0] = result[1] + cost[0][first]
+        return result
+
+    branches = []
+    for first in teeth:
+        top = min(max_teeth, first + spare)
+        if first + n - 1 <= top:
+            branches.append((bounds(first, top), first, top))
+    branches.sort(key=lambda b: (b[0][0], b[1]))
+
+    best = []
+    for (rest, first, top) in branches:
+        if len(best) == k and rest[0] > best[-1][0]:
+            break
+        layer = {first: [(cost[0][first], (first,))]}
+        for i in range(1, n):
+            bound = best[-1][0] if len(best) == k else float('inf')
+            new = {}
+            for r in range(first + i, top - (n - 1 - i) + 1):
+                lists = [layer[p] for p in predecessors(r) if p in layer]
+                if not lists:
+                    continue
+                c = cost[i][r]
+                kept = [(e + c, path + (r,)) for e, path in
+                  heapq.nsmallest(k, chain.from_iterable(lists))
+                  if e + c + rest[i + 1] <= bound]
+                if kept:
+                    new[r] = kept
+            layer = new
+        for item in chain.from_iterable(layer.values()):
+            bisect.insort(best, item)
+        del best[k:]
+    for (error, rear_cogs) in best:
+        yield error, list(rear_cogs)
+
+def design_drivetrains(targets, front_cog_sets, k=10, bicycle=None,
+  **kwargs):
+    """
+    Return the ``k`` Designs, best first, made of one of the given
+    chainring sets and a cassette whose ratios come closest to the given
+    targets, a list of ladders of desired ratios, one per chainring in
+    increasing order of teeth, each listing the desired ratios of that
+    chainring with the rear cogs in increasing order of teeth, or None
+    where any ratio will do.
+    The number of rear cogs is the length of the ladders.
+
+    The ratios are gear ratios, or gain ratios if a Bicycle object is
+    given, whose crank length and rear wheel diameter are then used.
+
+    The cassettes have distinct rear cogs with between ``min_teeth`` and
+    ``max_teeth`` teeth (default 9 and 52) such that
+
+    - every difference in teeth between neighbouring rear cogs is one
+      of ``allowed_steps``, if given, e.g. ``[1, 2, 3, 4]``
+    - every jump between neighbouring rear cogs is at most ``max_jump``
+      (e.g. 0.15), if given
+    - the derailer capacity is at most ``max_derailer_capacity``,
+      if given
+
+    Designs are ranked by smallest error, then by chainrings and rear
+    cogs.
+
+    Assume the ladders have the same nonzero length, one per chainring,
+    and, if a bicycle is given, the following bicycle attributes are
+    non-null:
+
+    - crank_length
+    - rear_wheel
+
+    Raise a ``ValueError``, if that is not the case.
+
+    EXAMPLES::
+
+        >>> ladder = [4.2, 3.7, 3.3, 2.9, 2.55, 2.25, 1.95, 1.7]
+        >>> d = design_drivetrains([ladder], [[46], [50]], k=2,
+        ...   allowed_steps=[1, 2, 3, 4], max_derailer_capacity=20)
+        >>> [(x.front_cogs, x.rear_cogs) for x in d]
+        [([46], [11, 12, 14, 16, 18, 20, 24, 27]), ([46], [11, 12, 14, 16, 18, 21, 24, 27])]
+        >>> round(d[0].max_error, 3)
+        0.035
+
+    """
+    if bicycle is None:
+        scale = 1
+    else:
+        check_attrs(bicycle, 'crank_length', 'rear_wheel')
+        check_attrs(bicycle.rear_wheel, 'diameter')
+        scale = float(gain_ratio_array([1], [1], bicycle.crank_length,
+          bicycle.rear_wheel.diameter)[0, 0])
+    best = []
+    for front_cogs in front_cog_sets:
+        front_cogs = sorted(front_cogs)
+        for (error, rear_cogs) in iter_cassettes(targets, front_cogs, k=k,
+          scale=scale, **kwargs):
+            bisect.insort(best, (error, front_cogs, rear_cogs))
+        del best[k:]
+    return [_design(f, r, targets, scale, e) for e, f, r in best]
@@ -0,0 +1,255 @@
+"""
+Shift planning on the graph of gears of a drivetrain.
+
+The nodes are the (front cog, rear cog) gears of
+:func:`bicyclator.main.gear_ratios`, minus the cross-chained ones,
+and the edges are single shifts: one rear cog up or down, or one
+chainring up or down.
+Each edge is weighted by its ratio jump, the absolute value of the
+logarithm of the ratio of the two gear ratios, so jumps up and down
+weigh the same.
+
+Graphs are cached per drivetrain and each graph caches its path
+queries, so repeated queries are dictionary lookups.
+"""
+from functools import lru_cache
+from math import exp, log, inf
+import heapq
+
+from .main import Bicycle, gear_ratios
+
+
+class GearGraph(object):
+    """
+    The graph of single shifts between the gears of the given cogs,
+    excluding cross-chained gears, that is, on the smallest chainring
+    the ``cross_chain_cogs`` smallest rear cogs and on the largest
+    chainring the ``cross_chain_cogs`` largest rear cogs.
+    Drivetrains with one chainring have no cross-chained gears.
+
+    Attributes:
+
+    - front_cogs, rear_cogs: sorted tuples of cogs
+    - gears: list of allowed gears (front cog, rear cog), in increasing
+      order of gear ratio
+    - ratios: dictionary of the form gear -> gear ratio
+    - adjacency: dictionary of the form gear -> list of triples
+      (neighbouring gear, ratio jump, 1 if a front shift else 0)
+    - jumps: dictionary of the form (gear, neighbouring gear) ->
+      ratio jump, the same in both directions
+    """
+    def __init__(self, front_cogs, rear_cogs, cross_chain_cogs=2):
+        self.front_cogs = tuple(sorted(front_cogs))
+        self.rear_cogs = tuple(sorted(rear_cogs))
+        self.cross_chain_cogs = cross_chain_cogs
+        self.ratios = gear_ratios(Bicycle(front_cogs=self.front_cogs,
+          rear_cogs=self.rear_cogs))
+
+        excluded = set()
+        if len(self.front_cogs) > 1 and cross_chain_cogs:
+            n = cross_chain_cogs
+            excluded |= {(self.front_cogs[0], r)
+              for r in self.rear_cogs[:n]}
+            excluded |= {(self.front_cogs[-1], r)
+              for r in self.rear_cogs[-n:]}
+        self.gears = sorted((g for g in self.ratios if g not in excluded),
+          key=lambda g: self.ratios[g])
+
+        allowed = set(self.gears)
+        self.adjacency = {g: [] for g in self.gears}
+        self.jumps = {}
+        fronts = self.front_cogs
+        rears = self.rear_cogs
+        for (i, f) in enumerate(fronts):
+            for (j, r) in enumerate(rears):
+                g = (f, r)
+                if g not in allowed:
+                    continue
+                for (h, front) in [((f, rears[j + 1]), 0)
+                  if j + 1 < len(rears) else (None, 0),
+                  ((fronts[i + 1], r), 1)
+                  if i + 1 < len(fronts) else (None, 1)]:
+                    if h is None or h not in allowed:
+                        continue
+                    jump = abs(log(self.ratios[h]/self.ratios[g]))
+                    self.adjacency[g].append((h, jump, front))
+                    self.adjacency[h].append((g, jump, front))
+                    self.jumps[g, h] = self.jumps[h, g] = jump
+
+        self._memo = {}
+
+    def __repr__(self):
+        return 'GearGraph(front_cogs={!s}, rear_cogs={!s}, '\
+          'cross_chain_cogs={!s})'.format(list(self.front_cogs),
+          list(self.rear_cogs), self.cross_chain_cogs)
+
+    def _check(self, *gears):
+        for g in gears:
+            if g not in self.adjacency:
+                raise ValueError('Gear {!s} is not an allowed gear of '\
+                  'this drivetrain'.format(g))
+
+    def _dijkstra(self, start, goal, cost, max_jump=inf):
+        """
+        Return the pair (cost, path) of the least-cost path from start
+        to goal as a tuple of gears, where ``cost(total, jump, front)``
+        gives the cost of extending a path of cost total by an edge and
+        costs are compared as tuples.
+        Only use edges with jumps at most ``max_jump``.
+        Return (None, None) if there is no path.
+        """
+        best = {start: cost(None, 0, 0)}
+        previous = {start: None}
+        heap = [(best[start], start)]
+        while heap:
+            c, g = heapq.heappop(heap)
+            if g == goal:
+                path = []
+                while g is not None:
+                    path.append(g)
+                    g = previous[g]
+                return c, tuple(path[::-1])
+            if c > best[g]:
+                continue
+            for (h, jump, front) in self.adjacency[g]:
+                if jump > max_jump:
+                    continue
+                d = cost(c, jump, front)
+                if h not in best or d < best[h]:
+                    best[h] = d
+                    previous[h] = g
+                    heapq.heappush(heap, (d, h))
+        return None, None
+
+    def _path(self, key):
+        path = self._memo[key]
+        return None if path is None else list(path)
+
+    def shortest_path(self, start, goal, front_shift_cost=2):
+        """
+        Return the list of gears from ``start`` to ``goal`` with the
+        fewest shifts, counting each front shift as ``front_shift_cost``
+        rear shifts, or None if there is no such path.
+
+        EXAMPLES::
+
+            >>> g = GearGraph([34, 50], [11, 13, 15, 17, 19],
+            ...   cross_chain_cogs=1)
+            >>> g.shortest_path((34, 19), (50, 13))
+            [(34, 19), (34, 17), (34, 15), (34, 13), (50, 13)]
+
+        """
+        self._check(start, goal)
+        key = ('shortest', start, goal, front_shift_cost)
+        if key not in self._memo:
+            def cost(total, jump, front):
+                if total is None:
+                    return (0,)
+                return (total[0] + 1 + (front_shift_cost - 1)*front,)
+            self._memo[key] = self._dijkstra(start, goal, cost)[1]
+        return self._path(key)
+
+    def bottleneck_path(self, start, goal):
+        """
+        Return the list of gears from ``start`` to ``goal`` whose largest
+        ratio jump is as small as possible, and among those, with the
+        fewest front shifts and then the fewest shifts,
+        or None if there is no such path.
+
+        The smallest possible largest jump is found first with a minimax
+        search; the path is then the shortest one using only jumps no
+        larger than that.
+
+        EXAMPLES::
+
+            >>> g = GearGraph([30, 39, 50], [12, 14, 16, 18, 21, 24, 28])
+            >>> g.bottleneck_path((30, 28), (50, 12))
+            [(30, 28), (30, 24), (30, 21), (30, 18), (39, 18), (39, 16), (39, 14), (39, 12), (50, 12)]
+            >>> round(g.max_jump(_), 3)
+            0.3
+            >>> g.shortest_path((30, 28), (50, 12))
+            [(30, 28), (30, 24), (30, 21), (30, 18), (30, 16), (39, 16), (39, 14), (39, 12), (50, 12)]
+
+        """
+        self._check(start, goal)
+        key = ('bottleneck', start, goal)
+        if key not in self._memo:
+            def minimax(total, jump, front):
+                if total is None:
+                    return (0.0,)
+                return (max(total[0], jump),)
+            bottleneck, path = self._dijkstra(start, goal, minimax)
+            if path is not None:
+                # The minimax cost is the largest stored edge jump, so
+                # the bottleneck edge itself passes the filter below
+                bottleneck = bottleneck[0]
+                def shifts(total, jump, front):
+                    if total is None:
+                        return (0, 0)
+                    return (total[0] + front, total[1] + 1)
+                path = self._dijkstra(start, goal, shifts,
+                  max_jump=bottleneck)[1]
+            self._memo[key] = path
+        return self._path(key)
+
+    def shift_sequence(self):
+        """
+        Return the :meth:`bottleneck_path` from the lowest allowed gear
+        to the highest allowed gear, that is, the way to shift through
+        the whole range with the smallest largest jump and then the
+        fewest front shifts.
+
+        EXAMPLES::
+
+            >>> g = GearGraph([37, 48], [11, 13, 19, 22, 26, 27, 29, 30, 31])
+            >>> path = g.shift_sequence()
+            >>> path[0], path[-1], round(g.max_jump(path), 3)
+            ((37, 31), (48, 11), 0.462)
+
+        """
+        return self.bottleneck_path(self.gears[0], self.gears[-1])
+
+    def _max_log_jump(self, path):
+        # Read the stored edge jumps rather than recomputing them, which
+        # can differ in the last place in the other direction
+        return max((self.jumps[g, h] if (g, h) in self.jumps else
+          abs(log(self.ratios[h]/self.ratios[g]))
+          for g, h in zip(path, path[1:])), default=0.0)
+
+    def max_jump(self, path):
+        """
+        Return the largest ratio jump along the given path, as a fraction,
+        e.g. 0.15 for a 15% jump.
+        """
+        return exp(self._max_log_jump(path)) - 1
+
+@lru_cache(maxsize=1024)
+def _gear_graph(front_cogs, rear_cogs, cross_chain_cogs):
+    return GearGraph(front_cogs, rear_cogs, cross_chain_cogs)
+
+def gear_graph(bicycle, cross_chain_cogs=2):
+    """
+    Return the GearGraph of the given Bicycle object's cogs.
+    Graphs, and hence their cached path queries, are shared between
+    calls for the same drivetrain.
+
+    Assume the following bicycle attributes are non-null and non-empty:
+
+    - front_cogs
+    - rear_cogs
+
+    Raise a ``ValueError``, if that is not the case.
+
+    EXAMPLES::
+
+        >>> b = Bicycle(front_cogs=[34, 50], rear_cogs=[11, 13, 15, 17, 19])
+        >>> gear_graph(b) is gear_graph(b.copy())
+        True
+
+    """
+    b = bicycle
+    if not b.front_cogs or not b.rear_cogs:
+        # Let gear_ratios raise the usual error
+        gear_ratios(b)
+    return _gear_graph(tuple(sorted(b.front_cogs)),
+      tuple(sorted(b.rear_cogs)), cross_chain_cogs)
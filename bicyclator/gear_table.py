@@ -0,0 +1,245 @@
+"""
+GearTable, an array-backed alternative to the ``{(front cog, rear cog):
+value}`` dictionaries returned by the calculators in
+:mod:`bicyclator.main`.
+
+A GearTable sorts its values once on construction and then answers
+nearest-gear, k-nearest and range queries by binary search.
+It is also a read-only mapping with the same keys and values as the
+corresponding dictionary, so it can be passed to code expecting one.
+"""
+from collections.abc import Mapping
+
+import numpy as np
+
+from .main import check_attrs
+from .batch import gear_ratio_array, gain_ratio_array,\
+  cadence_to_speed_array, speed_to_cadence_array
+
+
+class GearTable(Mapping):
+    """
+    A read-only mapping of the form (front cog, rear cog) -> value
+    whose items are stored in increasing order of value.
+
+    Attributes:
+
+    - front_cogs: NumPy array of front cogs, one per gear
+    - rear_cogs: NumPy array of rear cogs, one per gear
+    - values: NumPy array of values, one per gear, in increasing order
+    """
+    def __init__(self, front_cogs, rear_cogs, values):
+        values = np.asarray(values, dtype=float)
+        order = np.argsort(values, kind='stable')
+        self.front_cogs = np.asarray(front_cogs)[order]
+        self.rear_cogs = np.asarray(rear_cogs)[order]
+        self.values = values[order]
+        self._positions = None
+
+    @classmethod
+    def from_grid(cls, front_cogs, rear_cogs, grid):
+        """
+        Return a GearTable from a list of front cogs, a list of rear
+        cogs and an array of shape ``(len(front_cogs), len(rear_cogs))``
+        of values.
+        """
+        f, r = np.meshgrid(front_cogs, rear_cogs, indexing='ij')
+        return cls(f.ravel(), r.ravel(), np.asarray(grid).ravel())
+
+    @classmethod
+    def from_dict(cls, d):
+        """
+        Return a GearTable from a dictionary of the form
+        (front cog, rear cog) -> value.
+
+        EXAMPLES::
+
+            >>> t = GearTable.from_dict({(40, 20): 2.0, (40, 30): 1.5})
+            >>> list(t.items())
+            [((40, 30), 1.5), ((40, 20), 2.0)]
+
+        """
+        keys = list(d.keys())
+        return cls([f for f, r in keys], [r for f, r in keys],
+          list(d.values()))
+
+    def _item(self, i):
+        return ((self.front_cogs[i].item(), self.rear_cogs[i].item()),
+          self.values[i].item())
+
+    def __getitem__(self, key):
+        if self._positions is None:
+            self._positions = {k: i for i, k in enumerate(
+              zip(self.front_cogs.tolist(), self.rear_cogs.tolist()))}
+        return self.values[self._positions[key]].item()
+
+    def __iter__(self):
+        return zip(self.front_cogs.tolist(), self.rear_cogs.tolist())
+
+    def __len__(self):
+        return self.values.size
+
+    def __repr__(self):
+        return 'GearTable({!r})'.format(self.as_dict())
+
+    def as_dict(self):
+        """
+        Return this table as a dictionary of the form
+        (front cog, rear cog) -> value, in increasing order of value.
+        """
+        return dict(zip(self, self.values.tolist()))
+
+    def nearest(self, value):
+        """
+        Return the item ((front cog, rear cog), value) of this table
+        whose value is nearest the given value.
+        Ties go to the smaller value.
+
+        EXAMPLES::
+
+            >>> t = GearTable.from_dict({(40, 20): 2.0, (40, 30): 1.5,
+            ...   (30, 20): 1.5, (30, 30): 1.0})
+            >>> t.nearest(1.9)
+            ((40, 20), 2.0)
+
+        """
+        if not len(self):
+            raise ValueError('GearTable is empty')
+        i = np.searchsorted(self.values, value)
+        if i == len(self) or \
+          (i > 0 and value - self.values[i - 1] <= self.values[i] - value):
+            i -= 1
+        return self._item(i)
+
+    def nearest_positions(self, values):
+        """
+        Return the array of positions in this table of the values
+        nearest each of the given values, computed by one vectorized
+        binary search.
+        Ties go to the smaller value.
+
+        EXAMPLES::
+
+            >>> t = GearTable.from_dict({(40, 20): 2.0, (40, 30): 1.5,
+            ...   (30, 20): 1.5, (30, 30): 1.0})
+            >>> i = t.nearest_positions([0.2, 1.3, 1.9, 5])
+            >>> t.front_cogs[i].tolist(), t.rear_cogs[i].tolist()
+            ([30, 40, 40, 40], [30, 30, 20, 20])
+
+        """
+        if not len(self):
+            raise ValueError('GearTable is empty')
+        values = np.asarray(values, dtype=float)
+        i = np.searchsorted(self.values, values)
+        if len(self) == 1:
+            return np.zeros_like(i)
+        i = np.clip(i, 1, len(self) - 1)
+        left = values - self.values[i - 1] <= self.values[i] - values
+        return np.where(left, i - 1, i)
+
+    def k_nearest(self, value, k):
+        """
+        Return a list of the ``k`` items ((front cog, rear cog), value)
+        of this table whose values are nearest the given value,
+        nearest first.
+
+        EXAMPLES::
+
+            >>> t = GearTable.from_dict({(40, 20): 2.0, (40, 30): 1.5,
+            ...   (30, 20): 1.5, (30, 30): 1.0})
+            >>> t.k_nearest(1.9, 2)
+            [((40, 20), 2.0), ((40, 30), 1.5)]
+
+        """
+        i = np.searchsorted(self.values, value)
+        lo = max(0, i - k)
+        hi = min(len(self), i + k)
+        window = np.abs(self.values[lo:hi] - value)
+        order = np.argsort(window, kind='stable')[:k]
+        return [self._item(lo + j) for j in order]
+
+    def within(self, min_value, max_value):
+        """
+        Return a list of the items ((front cog, rear cog), value)
+        of this table whose values lie in the interval
+        [``min_value``, ``max_value``], in increasing order of value.
+
+        EXAMPLES::
+
+            >>> t = GearTable.from_dict({(40, 20): 2.0, (40, 30): 1.5,
+            ...   (30, 20): 1.5, (30, 30): 1.0})
+            >>> t.within(1.2, 2)
+            [((40, 30), 1.5), ((30, 20), 1.5), ((40, 20), 2.0)]
+
+        """
+        lo = np.searchsorted(self.values, min_value, side='left')
+        hi = np.searchsorted(self.values, max_value, side='right')
+        return [self._item(i) for i in range(lo, hi)]
+
+
+def gear_ratio_table(bicycle):
+    """
+    Return the gear ratios of the given Bicycle object as a GearTable.
+    Same assumptions as :func:`bicyclator.main.gear_ratios`.
+
+    EXAMPLES::
+
+        >>> from bicyclator.main import Bicycle
+        >>> b = Bicycle(front_cogs=[40], rear_cogs=[20, 30])
+        >>> gear_ratio_table(b).nearest(1.5)
+        ((40, 30), 1.3333333333333333)
+
+    """
+    b = bicycle
+    check_attrs(b, 'front_cogs', 'rear_cogs')
+    return GearTable.from_grid(b.front_cogs, b.rear_cogs,
+      gear_ratio_array(b.front_cogs, b.rear_cogs))
+
+def gain_ratio_table(bicycle):
+    """
+    Return the gain ratios of the given Bicycle object as a GearTable.
+    Same assumptions as :func:`bicyclator.main.gain_ratios`.
+    """
+    b = bicycle
+    check_attrs(b, 'front_cogs', 'rear_cogs', 'crank_length', 'rear_wheel')
+    check_attrs(b.rear_wheel, 'diameter')
+    return GearTable.from_grid(b.front_cogs, b.rear_cogs,
+      gain_ratio_array(b.front_cogs, b.rear_cogs, b.crank_length,
+      b.rear_wheel.diameter))
+
+def cadence_to_speed_table(bicycle, cadence):
+    """
+    Return the speeds of the given Bicycle object at the given cadence
+    as a GearTable.
+    Same assumptions as :func:`bicyclator.main.cadence_to_speeds`.
+    """
+    b = bicycle
+    check_attrs(b, 'front_cogs', 'rear_cogs', 'crank_length', 'rear_wheel')
+    check_attrs(b.rear_wheel, 'diameter')
+    return GearTable.from_grid(b.front_cogs, b.rear_cogs,
+      cadence_to_speed_array(b.front_cogs, b.rear_cogs, b.crank_length,
+      b.rear_wheel.diameter, cadence))
+
+def speed_to_cadence_table(bicycle, speed):
+    """
+    Return the cadences of the given Bicycle object at the given speed
+    as a GearTable.
+    Same assumptions as :func:`bicyclator.main.speed_to_cadences`.
+
+    EXAMPLES::
+
+        >>> from bicyclator.main import Bicycle, Wheel, speed_to_cadences
+        >>> w = Wheel(diameter=600)
+        >>> b = Bicycle(front_cogs=[40], rear_cogs=[20, 30],
+        ...   crank_length=100, rear_wheel=w)
+        >>> t = speed_to_cadence_table(b, 18.1)
+        >>> t[(40, 30)] == speed_to_cadences(b, 18.1)[(40, 30)]
+        True
+
+    """
+    b = bicycle
+    check_attrs(b, 'front_cogs', 'rear_cogs', 'crank_length', 'rear_wheel')
+    check_attrs(b.rear_wheel, 'diameter')
+    return GearTable.from_grid(b.front_cogs, b.rear_cogs,
+      speed_to_cadence_array(b.front_cogs, b.rear_cogs, b.crank_length,
+      b.rear_wheel.diameter, speed))
@@ -0,0 +1,139 @@
+"""
+Frame geometry sweeps and closed-form inverse solvers for the trail
+quantities of :func:`bicyclator.main.trail`.
+
+All functions take broadcastable NumPy arrays, so a whole grid of
+targets is solved at once.
+Where a target cannot be reached, the result is NaN.
+
+Notation: with head tube angle ``a``, fork rake ``r`` and front wheel
+radius ``R``,
+
+- trail ``t = (R*cos(a) - r)/sin(a)``
+- mechanical trail ``t*sin(a) = R*cos(a) - r``
+- wheel flop ``t*sin(a)*cos(a) = (R*cos(a) - r)*cos(a)``
+"""
+import numpy as np
+
+from .batch import trail_array
+
+
+def trail_grid(head_tube_angles, fork_rakes, front_wheel_diameters):
+    """
+    Return the tuple of arrays (trail, mechanical trail, wheel flop)
+    for every combination of the given head tube angles, fork rakes and
+    front wheel diameters, each of shape
+    ``(len(head_tube_angles), len(fork_rakes), len(front_wheel_diameters))``.
+
+    EXAMPLES::
+
+        >>> t, m, f = trail_grid([72, 73], [45, 64], [700])
+        >>> t.shape
+        (2, 2, 1)
+        >>> float(t[1, 1, 0].round(1))
+        40.1
+
+    """
+    a, r, d = np.ix_(np.asarray(head_tube_angles, dtype=float),
+      np.asarray(fork_rakes, dtype=float),
+      np.asarray(front_wheel_diameters, dtype=float))
+    return trail_array(a, r, d)
+
+def fork_rake_for_trail(trail, head_tube_angle, front_wheel_diameter):
+    """
+    Return the fork rakes giving the given trails for the given
+    head tube angles and front wheel diameters.
+
+    EXAMPLES::
+
+        >>> float(fork_rake_for_trail(40.1, 73, 700).round(1))
+        64.0
+
+    """
+    a = np.radians(np.asarray(head_tube_angle, dtype=float))
+    wheel_radius = np.asarray(front_wheel_diameter, dtype=float)/2
+    return wheel_radius*np.cos(a) - np.asarray(trail, dtype=float)*np.sin(a)
+
+def fork_rake_for_mechanical_trail(mechanical_trail, head_tube_angle,
+  front_wheel_diameter):
+    """
+    Return the fork rakes giving the given mechanical trails for the given
+    head tube angles and front wheel diameters.
+    """
+    a = np.radians(np.asarray(head_tube_angle, dtype=float))
+    wheel_radius = np.asarray(front_wheel_diameter, dtype=float)/2
+    return wheel_radius*np.cos(a) - np.asarray(mechanical_trail, dtype=float)
+
+def fork_rake_for_flop(wheel_flop, head_tube_angle, front_wheel_diameter):
+    """
+    Return the fork rakes giving the given wheel flops for the given
+    head tube angles and front wheel diameters.
+    """
+    a = np.radians(np.asarray(head_tube_angle, dtype=float))
+    wheel_radius = np.asarray(front_wheel_diameter, dtype=float)/2
+    cos_a = np.cos(a)
+    return wheel_radius*cos_a - np.asarray(wheel_flop, dtype=float)/cos_a
+
+def head_tube_angle_for_trail(trail, fork_rake, front_wheel_diameter):
+    """
+    Return the head tube angles giving the given trails for the given
+    fork rakes and front wheel diameters.
+
+    Writing ``R*cos(a) - t*sin(a) = rho*cos(a + phi)`` with
+    ``rho = hypot(R, t)`` and ``phi = arctan2(t, R)``, the angle is
+    ``arccos(r/rho) - phi``.
+
+    EXAMPLES::
+
+        >>> float(head_tube_angle_for_trail(40.1, 64, 700).round(1))
+        73.0
+
+    """
+    t = np.asarray(trail, dtype=float)
+    wheel_radius = np.asarray(front_wheel_diameter, dtype=float)/2
+    rho = np.hypot(wheel_radius, t)
+    phi = np.arctan2(t, wheel_radius)
+    with np.errstate(invalid='ignore'):
+        a = np.arccos(np.asarray(fork_rake, dtype=float)/rho) - phi
+    return np.degrees(a)
+
+def head_tube_angle_for_flop(wheel_flop, fork_rake, front_wheel_diameter):
+    """
+    Return the head tube angles giving the given wheel flops for the given
+    fork rakes and front wheel diameters.
+
+    The flop equation is the quadratic ``R*c**2 - r*c - flop = 0`` in
+    ``c = cos(a)``, whose larger root gives the angle (the smaller root,
+    which exists only for negative flop, gives an unrealistically steep
+    head tube).
+
+    EXAMPLES::
+
+        >>> float(head_tube_angle_for_flop(11.2, 64, 700).round(1))
+        73.0
+
+    """
+    f = np.asarray(wheel_flop, dtype=float)
+    r = np.asarray(fork_rake, dtype=float)
+    wheel_radius = np.asarray(front_wheel_diameter, dtype=float)/2
+    with np.errstate(invalid='ignore'):
+        c = (r + np.sqrt(r**2 + 4*wheel_radius*f))/(2*wheel_radius)
+        a = np.arccos(c)
+    return np.degrees(a)
+
+def front_wheel_diameter_for_trail(trail, head_tube_angle, fork_rake):
+    """
+    Return the front wheel diameters giving the given trails for the given
+    head tube angles and fork rakes.
+
+    EXAMPLES::
+
+        >>> float(front_wheel_diameter_for_trail(40.1, 73, 64).round())
+        700.0
+
+    """
+    a = np.radians(np.asarray(head_tube_angle, dtype=float))
+    t = np.asarray(trail, dtype=float)
+    wheel_radius = (t*np.sin(a) + np.asarray(fork_rake, dtype=float))/\
+      np.cos(a)
+    return 2*wheel_radius
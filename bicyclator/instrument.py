@@ -0,0 +1,255 @@
+"""
+Opt-in instrumentation of the calculators.
+
+:func:`enable` replaces the public calculators of :mod:`bicyclator.main`
+and :mod:`bicyclator.batch`, and :func:`bicyclator.main.check_attrs`,
+together with their re-exports in the :mod:`bicyclator` package, such as
+``bicyclator.gain_ratios``, with wrappers that record per function
+
+- the number of calls
+- a histogram of call latencies
+- a histogram of input sizes, such as the number of gears
+  (front cogs times rear cogs) of one bicycle, or the number of
+  bicycles or wheels of a batch, rounded up to a power of two
+- the number of validation errors, that is, ``ValueError`` exceptions
+
+and pass each call to any registered sinks.
+:func:`disable` puts the original functions back, so when
+instrumentation is disabled there is no overhead at all.
+
+Only calls that look the functions up on their modules at call time are
+seen, such as ``main.gain_ratios(b)`` or the calculators' own calls to
+``check_attrs``; references taken before :func:`enable`, such as
+``from bicyclator.main import gain_ratios``, keep calling the originals.
+"""
+from contextlib import contextmanager
+from functools import wraps
+from importlib import import_module
+from math import inf
+import time
+
+from . import main, batch
+
+
+#: Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1, inf)
+
+def _num_gears(bicycle, *args, **kwargs):
+    return len(bicycle.front_cogs or ())*len(bicycle.rear_cogs or ())
+
+def _num_spokes(wheel, *args, **kwargs):
+    return wheel.num_spokes or 0
+
+def _one(*args, **kwargs):
+    return 1
+
+def _num_items(items, *args, **kwargs):
+    return len(items)
+
+def _num_attrs(obj, *attrs):
+    return len(attrs)
+
+#: Module name -> dictionary of the form function name -> function of
+#: the call's arguments returning its input size
+TARGETS = {
+    'main': {
+        'check_attrs': _num_attrs,
+        'derailer_capacity': _num_gears,
+        'num_skid_patches': _num_gears,
+        'gear_ratios': _num_gears,
+        'gain_ratios': _num_gears,
+        'cadence_to_speeds': _num_gears,
+        'speed_to_cadences': _num_gears,
+        'trail': _one,
+        'spoke_length': _num_spokes,
+        'approx_diameter': _one,
+    },
+    'batch': dict.fromkeys(['gear_ratios', 'gain_ratios',
+      'cadence_to_speeds', 'speed_to_cadences', 'derailer_capacity',
+      'num_skid_patches', 'approx_diameter', 'trail', 'spoke_length'],
+      _num_items),
+}
+
+_MODULES = {'main': main, 'batch': batch}
+_originals = {}
+_stats = {}
+_sinks = []
+
+
+class FunctionStats(object):
+    """
+    The statistics of one instrumented function.
+
+    Attributes:
+
+    - calls: number of calls
+    - validation_errors: number of calls raising ``ValueError``
+    - total_time: total latency in seconds
+    - latencies: list of counts, one per bucket of ``LATENCY_BUCKETS``
+    - sizes: dictionary of the form input size, rounded up to a power of
+      two, -> count
+    """
+    def __init__(self):
+        self.calls = 0
+        self.validation_errors = 0
+        self.total_time = 0.0
+        self.latencies = [0]*len(LATENCY_BUCKETS)
+        self.sizes = {}
+
+    def record(self, seconds, size, error):
+        self.calls += 1
+        self.total_time += seconds
+        if isinstance(error, ValueError):
+            self.validation_errors += 1
+        i = 0
+        while seconds > LATENCY_BUCKETS[i]:
+            i += 1
+        self.latencies[i] += 1
+        if size is not None:
+            size = 1 << (size - 1).bit_length() if size > 0 else 0
+            self.sizes[size] = self.sizes.get(size, 0) + 1
+
+    def as_dict(self):
+        """
+        Return these statistics as a dictionary, with the latency
+        histogram as a dictionary of the form bucket upper bound -> count.
+        """
+        return {
+            'calls': self.calls,
+            'validation_errors': self.validation_errors,
+            'total_time': self.total_time,
+            'latencies': dict(zip(LATENCY_BUCKETS, self.latencies)),
+            'sizes': dict(sorted(self.sizes.items())),
+        }
+
+def _record(name, seconds, size, error):
+    _stats.setdefault(name, FunctionStats()).record(seconds, size, error)
+    if _sinks:
+        event = {'function': name, 'seconds': seconds, 'size': size,
+          'error': None if error is None else type(error).__name__}
+        for sink in list(_sinks):
+            sink(event)
+
+def _wrap(name, func, size_of):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        error = None
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            try:
+                size = size_of(*args, **kwargs)
+            except Exception:
+                size = None
+            _record(name, seconds, size, error)
+    return wrapper
+
+def enable():
+    """
+    Instrument the functions of ``TARGETS``.
+    Do nothing if they are already instrumented.
+    """
+    if _originals:
+        return
+    package = import_module(__package__)
+    for (module_name, functions) in TARGETS.items():
+        module = _MODULES[module_name]
+        for (name, size_of) in functions.items():
+            func = getattr(module, name)
+            key = module_name + '.' + name
+            wrapper = _wrap(key, func, size_of)
+            _originals[key] = (module, name, func)
+            setattr(module, name, wrapper)
+            # Names re-exported by ``from .main import *``
+            if getattr(package, name, None) is func:
+                _originals['package.' + key] = (package, name, func)
+                setattr(package, name, wrapper)
+
+def disable():
+    """
+    Put back the original functions of ``TARGETS``, keeping the
+    statistics recorded so far.
+    """
+    for (module, name, func) in _originals.values():
+        setattr(module, name, func)
+    _originals.clear()
+
+def is_enabled():
+    """
+    Return True if instrumentation is enabled.
+    """
+    return bool(_originals)
+
+@contextmanager
+def instrumented():
+    """
+    A context manager enabling instrumentation within its block, and
+    restoring the previous state after it.
+    """
+    was_enabled = is_enabled()
+    enable()
+    try:
+        yield
+    finally:
+        if not was_enabled:
+            disable()
+
+def add_sink(callback):
+    """
+    Call ``callback(event)`` after every instrumented call, where event
+    is a dictionary with the keys ``'function'`` (e.g.
+    ``'main.gain_ratios'``), ``'seconds'``, ``'size'`` and ``'error'``
+    (the exception class name or None).
+    Return a function of no arguments that removes the sink.
+    """
+    _sinks.append(callback)
+    return lambda: _sinks.remove(callback)
+
+def stats():
+    """
+    Return a dictionary of the form function name -> dictionary of
+    statistics (see :meth:`FunctionStats.as_dict`) for the
+    instrumented functions called so far.
+
+    EXAMPLES::
+
+        >>> b = main.Bicycle(front_cogs=[34, 50], rear_cogs=[11, 13, 15])
+        >>> reset()
+        >>> with instrumented():
+        ...     _ = main.gear_ratios(b)
+        ...     try:
+        ...         main.gear_ratios(main.Bicycle(front_cogs=[34]))
+        ...     except ValueError:
+        ...         pass
+        >>> s = stats()['main.gear_ratios']
+        >>> s['calls'], s['validation_errors'], s['sizes']
+        (2, 1, {0: 1, 8: 1})
+        >>> stats()['main.check_attrs']['validation_errors']
+        1
+        >>> is_enabled()
+        False
+
+    Calls through the package namespace are recorded too::
+
+        >>> import bicyclator as bc
+        >>> reset()
+        >>> with instrumented():
+        ...     _ = bc.gear_ratios(b)
+        >>> stats()['main.gear_ratios']['calls']
+        1
+        >>> bc.gear_ratios is main.gear_ratios
+        True
+
+    """
+    return {name: s.as_dict() for name, s in _stats.items()}
+
+def reset():
+    """
+    Clear the statistics.
+    """
+    _stats.clear()
@@ -0,0 +1,208 @@
+"""
+A live bicycle model for interactive builders, which keeps the tables
+of :func:`bicyclator.main.gear_ratios`, :func:`bicyclator.main.gain_ratios`,
+:func:`bicyclator.main.cadence_to_speeds` and
+:func:`bicyclator.main.speed_to_cadences` up to date as components change,
+recomputing only the affected entries:
+
+- adding or removing a cog adds or removes one row or column of cells
+  in every table
+- changing the crank length recomputes only the gain ratios, since
+  speeds and cadences do not depend on it
+- changing the rear wheel diameter recomputes the gain ratios, speeds
+  and cadences, but not the gear ratios
+- changing the cadence or speed recomputes only the speeds or cadences
+
+Subscribers are notified of each change with just the changed cells.
+"""
+from .main import check_attrs
+from .batch import grid_dict, gear_ratio_array, gain_ratio_array,\
+  cadence_to_speed_array, speed_to_cadence_array
+
+
+class LiveBicycle(object):
+    """
+    A mutable gearing model of a bicycle whose derived tables are
+    updated incrementally.
+
+    Attributes:
+
+    - front_cogs, rear_cogs: sorted lists of cogs
+    - crank_length
+    - rear_wheel_diameter
+    - cadence: in hertz, for the ``cadence_to_speeds`` table
+    - speed: in kilometers per hour, for the ``speed_to_cadences`` table
+    - tables: dictionary of the form table name -> dictionary of the
+      form (front cog, rear cog) -> value, with the table names of
+      ``DEPENDENCIES``
+
+    Read these attributes freely, but change them only through the
+    methods below.
+    Table values agree with the corresponding calculators of
+    :mod:`bicyclator.main` up to floating point rounding.
+
+    EXAMPLES::
+
+        >>> from bicyclator.main import Bicycle, Wheel
+        >>> w = Wheel(diameter=600)
+        >>> b = Bicycle(front_cogs=[40], rear_cogs=[20, 30],
+        ...   crank_length=100, rear_wheel=w)
+        >>> lb = LiveBicycle(b, cadence=2, speed=18.1)
+        >>> events = []
+        >>> unsubscribe = lb.subscribe(
+        ...   lambda table, cells: events.append((table, sorted(cells))))
+        >>> lb.add_cog('rear', 24)
+        >>> lb.tables['gain_ratios'][(40, 24)]
+        5.0
+        >>> events[1]
+        ('gain_ratios', [(40, 24)])
+        >>> events.clear()
+        >>> lb.set(crank_length=200)
+        >>> [table for table, cells in events]
+        ['gain_ratios']
+
+    """
+    #: Table name -> attributes it depends on
+    DEPENDENCIES = {
+        'gear_ratios': {'front_cogs', 'rear_cogs'},
+        'gain_ratios': {'front_cogs', 'rear_cogs', 'crank_length',
+          'rear_wheel_diameter'},
+        'cadence_to_speeds': {'front_cogs', 'rear_cogs',
+          'rear_wheel_diameter', 'cadence'},
+        'speed_to_cadences': {'front_cogs', 'rear_cogs',
+          'rear_wheel_diameter', 'speed'},
+    }
+
+    def __init__(self, bicycle, cadence=1.5, speed=30):
+        b = bicycle
+        check_attrs(b, 'front_cogs', 'rear_cogs', 'crank_length',
+          'rear_wheel')
+        check_attrs(b.rear_wheel, 'diameter')
+        self.front_cogs = sorted(b.front_cogs)
+        self.rear_cogs = sorted(b.rear_cogs)
+        self.crank_length = b.crank_length
+        self.rear_wheel_diameter = b.rear_wheel.diameter
+        self.cadence = cadence
+        self.speed = speed
+        self._subscribers = []
+        self.tables = {name: self._compute(name, self.front_cogs,
+          self.rear_cogs) for name in self.DEPENDENCIES}
+
+    def __repr__(self):
+        return 'LiveBicycle(front_cogs={!s}, rear_cogs={!s}, '\
+          'crank_length={!s}, rear_wheel_diameter={!s})'.format(
+          self.front_cogs, self.rear_cogs, self.crank_length,
+          self.rear_wheel_diameter)
+
+    def _compute(self, name, front_cogs, rear_cogs):
+        """
+        Return the dictionary of the given table's values for the
+        given cogs.
+        """
+        if not front_cogs or not rear_cogs:
+            return {}
+        args = [front_cogs, rear_cogs]
+        if name == 'gear_ratios':
+            values = gear_ratio_array(*args)
+        else:
+            args += [self.crank_length, self.rear_wheel_diameter]
+            if name == 'gain_ratios':
+                values = gain_ratio_array(*args)
+            elif name == 'cadence_to_speeds':
+                values = cadence_to_speed_array(*args, self.cadence)
+            else:
+                values = speed_to_cadence_array(*args, self.speed)
+        return grid_dict(front_cogs, rear_cogs, values)
+
+    def subscribe(self, callback):
+        """
+        Call ``callback(table name, cells)`` after every change, once for
+        each affected table, where cells is a dictionary of the form
+        (front cog, rear cog) -> new value, or None for removed cells.
+        Return a function of no arguments that unsubscribes the callback.
+        """
+        self._subscribers.append(callback)
+        return lambda: self._subscribers.remove(callback)
+
+    def _notify(self, name, cells):
+        for callback in list(self._subscribers):
+            callback(name, cells)
+
+    def add_cog(self, side, teeth):
+        """
+        Add a cog with the given number of teeth on the given side,
+        ``'front'`` or ``'rear'``, computing only the new cells.
+        Do nothing if the cog is already there.
+        """
+        cogs = getattr(self, side + '_cogs')
+        if teeth in cogs:
+            return
+        cogs.append(teeth)
+        cogs.sort()
+        if side == 'front':
+            fronts, rears = [teeth], self.rear_cogs
+        else:
+            fronts, rears = self.front_cogs, [teeth]
+        for name in self.DEPENDENCIES:
+            cells = self._compute(name, fronts, rears)
+            self.tables[name].update(cells)
+            self._notify(name, cells)
+
+    def remove_cog(self, side, teeth):
+        """
+        Remove the cog with the given number of teeth on the given side,
+        ``'front'`` or ``'rear'``, along with its cells.
+        """
+        cogs = getattr(self, side + '_cogs')
+        cogs.remove(teeth)
+        i = 0 if side == 'front' else 1
+        for name in self.DEPENDENCIES:
+            table = self.tables[name]
+            cells = {k: None for k in table if k[i] == teeth}
+            for k in cells:
+                del table[k]
+            self._notify(name, cells)
+
+    def set(self, **changes):
+        """
+        Set any of the attributes ``crank_length``,
+        ``rear_wheel_diameter``, ``cadence`` and ``speed``,
+        and recompute only the tables that depend on them.
+
+        Assume the new values are non-null, and ``crank_length`` and
+        ``rear_wheel_diameter``, which the tables divide by, are nonzero.
+
+        Raise a ``ValueError``, if that is not the case.
+
+        EXAMPLES::
+
+            >>> from bicyclator.main import Bicycle, Wheel
+            >>> lb = LiveBicycle(Bicycle(front_cogs=[40], rear_cogs=[20],
+            ...   crank_length=100, rear_wheel=Wheel(diameter=600)))
+            >>> lb.set(cadence=0, speed=0)
+            >>> lb.tables['cadence_to_speeds'], lb.tables['speed_to_cadences']
+            ({(40, 20): 0.0}, {(40, 20): 0.0})
+            >>> lb.set(crank_length=0)
+            Traceback (most recent call last):
+            ...
+            ValueError: Attribute 'crank_length' must not be zero
+
+        """
+        for (k, v) in changes.items():
+            if k not in ['crank_length', 'rear_wheel_diameter', 'cadence',
+              'speed']:
+                raise ValueError("Can't set attribute '{!s}'".format(k))
+            if v is None:
+                raise ValueError("Attribute '{!s}' must not be None"\
+                  .format(k))
+            if k in ['crank_length', 'rear_wheel_diameter'] and v == 0:
+                raise ValueError("Attribute '{!s}' must not be zero"\
+                  .format(k))
+        changed = {k for k, v in changes.items() if getattr(self, k) != v}
+        for k in changed:
+            setattr(self, k, changes[k])
+        for (name, deps) in self.DEPENDENCIES.items():
+            if deps & changed:
+                cells = self._compute(name, self.front_cogs, self.rear_cogs)
+                self.tables[name] = cells
+                self._notify(name, cells)
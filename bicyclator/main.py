@@ -5,9 +5,9 @@ Conventions:
 - All angles are measured in degrees, unless noted otherwise
 """
 from math import *
-from fractions import gcd
 from itertools import product
 from copy import deepcopy
+from types import MappingProxyType
 
 
 class Bicycle(object):
@@ -130,6 +130,211 @@ class Wheel(object):
         return deepcopy(self)
 
 
+class _Frozen(object):
+    """
+    Base class of immutable, slotted records whose fields are the
+    slots other than ``_hash``.
+    Subclasses set ``_fields`` and ``_normalize(field, value)``.
+    """
+    __slots__ = ('_hash',)
+    _fields = ()
+
+    def __setattr__(self, attr, value):
+        raise AttributeError("{!s} is immutable; use evolve() "\
+          "instead".format(type(self).__name__))
+
+    def __delattr__(self, attr):
+        raise AttributeError("{!s} is immutable".format(
+          type(self).__name__))
+
+    def _key(self):
+        return tuple(_hashable(getattr(self, k)) for k in self._fields)
+
+    def __hash__(self):
+        h = object.__getattribute__(self, '_hash')
+        if h is None:
+            h = hash((type(self), self._key()))
+            object.__setattr__(self, '_hash', h)
+        return h
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self is other or self._key() == other._key()
+
+    def __reduce__(self):
+        fields = {}
+        for k in self._fields:
+            v = getattr(self, k)
+            if isinstance(v, MappingProxyType):
+                v = dict(v)
+            fields[k] = v
+        return (_rebuild, (type(self), fields))
+
+    def copy(self):
+        """
+        Return this object, which is immutable and so needs no copying.
+        """
+        return self
+
+    def evolve(self, **changes):
+        """
+        Return a new object equal to this one, except for the given
+        attribute changes.
+        Unchanged attributes are shared with this object, not copied.
+        """
+        new = object.__new__(type(self))
+        for k in self._fields:
+            if k in changes:
+                v = self._normalize(k, changes.pop(k))
+            else:
+                v = getattr(self, k)
+            object.__setattr__(new, k, v)
+        if changes:
+            raise TypeError("Unknown attributes {!s}".format(
+              sorted(changes)))
+        object.__setattr__(new, '_hash', None)
+        return new
+
+def _hashable(v):
+    if isinstance(v, MappingProxyType):
+        return tuple(sorted(v.items()))
+    return v
+
+def _rebuild(cls, fields):
+    return cls(**fields)
+
+
+class FrozenWheel(_Frozen):
+    """
+    An immutable, hashable Wheel.
+    It has the same attributes as a Wheel, except that
+    ``center_to_flange`` and ``flange_diameter`` are read-only
+    dictionaries.
+    Use :meth:`evolve` to make a changed copy.
+
+    EXAMPLES::
+
+        >>> w = FrozenWheel(erd=560, num_spokes=32)
+        >>> v = w.evolve(num_spokes=36)
+        >>> v.num_spokes, w.num_spokes, v.erd
+        (36, 32, 560)
+        >>> {w: 'old', v: 'new'}[FrozenWheel(erd=560, num_spokes=36)]
+        'new'
+
+    """
+    __slots__ = ('name', 'bsd', 'erd', 'tire_width', 'diameter',
+      'center_to_flange', 'flange_diameter', 'spoke_hole_diameter',
+      'num_spokes', 'num_crosses', 'offset')
+    _fields = __slots__
+
+    def __init__(self, name=None, bsd=None, erd=None,
+      tire_width=None, diameter=None,
+      center_to_flange=None, flange_diameter=None,
+      spoke_hole_diameter=2.6, num_spokes=None, num_crosses=3,
+      offset=0):
+        values = locals()
+        for k in self._fields:
+            object.__setattr__(self, k, self._normalize(k, values[k]))
+        object.__setattr__(self, '_hash', None)
+
+    @staticmethod
+    def _normalize(field, value):
+        if field in ['center_to_flange', 'flange_diameter']:
+            if value is None:
+                value = {'left': None, 'right': None}
+            if not isinstance(value, MappingProxyType):
+                value = MappingProxyType(dict(value))
+        return value
+
+    @classmethod
+    def from_wheel(cls, wheel):
+        """
+        Return a FrozenWheel with the attributes of the given Wheel.
+        """
+        return cls(**{k: getattr(wheel, k) for k in cls._fields})
+
+    def thaw(self):
+        """
+        Return a mutable Wheel with the attributes of this FrozenWheel.
+        """
+        kwargs = {k: getattr(self, k) for k in self._fields}
+        for k in ['center_to_flange', 'flange_diameter']:
+            kwargs[k] = dict(kwargs[k])
+        return Wheel(**kwargs)
+
+    def __repr__(self):
+        return Wheel.__repr__(self.thaw())
+
+_DEFAULT_WHEEL = FrozenWheel()
+
+
+class FrozenBicycle(_Frozen):
+    """
+    An immutable, hashable Bicycle.
+    It has the same attributes as a Bicycle, except that the cogs are
+    sorted tuples and the wheels are FrozenWheels.
+    Use :meth:`evolve` to make a changed copy.
+
+    EXAMPLES::
+
+        >>> b = FrozenBicycle(front_cogs=[34, 50], rear_cogs=[11, 28],
+        ...   crank_length=170)
+        >>> c = b.evolve(rear_cogs=b.rear_cogs + (32,))
+        >>> c.rear_cogs, b.rear_cogs
+        ((11, 28, 32), (11, 28))
+        >>> c.front_cogs is b.front_cogs
+        True
+
+    """
+    __slots__ = ('name', 'head_tube_angle', 'fork_rake', 'crank_length',
+      'front_cogs', 'rear_cogs', 'front_wheel', 'rear_wheel')
+    _fields = __slots__
+
+    def __init__(self, name=None, head_tube_angle=None,
+      fork_rake=None, crank_length=None,
+      front_cogs=None, rear_cogs=None,
+      front_wheel=None, rear_wheel=None):
+        values = locals()
+        for k in self._fields:
+            object.__setattr__(self, k, self._normalize(k, values[k]))
+        object.__setattr__(self, '_hash', None)
+
+    @staticmethod
+    def _normalize(field, value):
+        if field in ['front_cogs', 'rear_cogs']:
+            if value is None:
+                value = ()
+            value = tuple(sorted(value))
+        elif field in ['front_wheel', 'rear_wheel']:
+            if value is None:
+                value = _DEFAULT_WHEEL
+            elif not isinstance(value, FrozenWheel):
+                value = FrozenWheel.from_wheel(value)
+        return value
+
+    @classmethod
+    def from_bicycle(cls, bicycle):
+        """
+        Return a FrozenBicycle with the attributes of the given Bicycle.
+        """
+        return cls(**{k: getattr(bicycle, k) for k in cls._fields})
+
+    def thaw(self):
+        """
+        Return a mutable Bicycle with the attributes of this FrozenBicycle.
+        """
+        kwargs = {k: getattr(self, k) for k in self._fields}
+        for k in ['front_cogs', 'rear_cogs']:
+            kwargs[k] = list(kwargs[k])
+        for k in ['front_wheel', 'rear_wheel']:
+            kwargs[k] = kwargs[k].thaw()
+        return Bicycle(**kwargs)
+
+    def __repr__(self):
+        return Bicycle.__repr__(self.thaw())
+
+
 def check_attrs(obj, *attrs):
     for attr in attrs:
         v = getattr(obj, attr)
@@ -180,9 +385,9 @@ def num_skid_patches(bicycle, ambidextrous=False):
 
         >>> b = Bicycle(front_cogs=[50], rear_cogs=[25, 30])
         >>> num_skid_patches(b, ambidextrous=False)
-        {(50, 30): 3.0, (50, 25): 1.0}
+        {(50, 25): 1, (50, 30): 3}
         >>> num_skid_patches(b, ambidextrous=True)
-        {(50, 30): 6.0, (50, 25): 1.0}
+        {(50, 25): 1, (50, 30): 6}
 
     SKID PATCH THEOREM:
 
@@ -204,14 +409,26 @@ def num_skid_patches(bicycle, ambidextrous=False):
     result = {}
     for (f, r) in product(b.front_cogs, b.rear_cogs):
         g = gcd(f, r)
-        a = f/g
-        b = r/g
+        a = f//g
+        b = r//g
         if ambidextrous and (a % 2) != 0:
             result[(f, r)] =  2*b
         else:
             result[(f, r)] = b
     return result
 
+def _gain_ratio_dict(bicycle):
+    """
+    Return the unrounded gain ratios of the given checked Bicycle object,
+    computed in pure Python with the same operations, in the same order,
+    as :func:`bicyclator.batch.gain_ratio_array`, which is faster only
+    for many bicycles at once.
+    """
+    b = bicycle
+    w = float(b.rear_wheel.diameter)/2/float(b.crank_length)
+    return {(f, r): w*f/r
+      for (f, r) in product(b.front_cogs, b.rear_cogs)}
+
 def gear_ratios(bicycle, digits=None):
     """
     Return the gear ratios for the given Bicycle object.
@@ -227,16 +444,15 @@ def gear_ratios(bicycle, digits=None):
 
         >>> b = Bicycle(front_cogs=[40], rear_cogs=[20, 30])
         >>> gear_ratios(b)
-        {(40, 30): 1.3333333333333333, (40, 20): 2.0}
+        {(40, 20): 2.0, (40, 30): 1.3333333333333333}
 
     """
     b = bicycle
     attrs = ['front_cogs', 'rear_cogs']
     check_attrs(b, *attrs)
 
-    result = {}
-    for (f, r) in product(b.front_cogs, b.rear_cogs):
-        result[(f, r)] = f/r
+    result = {(f, r): f/r
+      for (f, r) in product(b.front_cogs, b.rear_cogs)}
 
     if digits is not None:
         result = {k: round(v, digits) for k, v in result.items()}
@@ -261,7 +477,7 @@ def gain_ratios(bicycle, digits=None):
         >>> w = Wheel(diameter=600)
         >>> b = Bicycle(front_cogs=[40], rear_cogs=[20, 30], crank_length=100, rear_wheel=w)
         >>> gain_ratios(b, digits=1)
-        {(40, 30): 4.0, (40, 20): 6.0}
+        {(40, 20): 6.0, (40, 30): 4.0}
 
     REFERENCES:
 
@@ -272,10 +488,7 @@ def gain_ratios(bicycle, digits=None):
     check_attrs(b, *attrs)
     check_attrs(b.rear_wheel, 'diameter')
 
-    result = {}
-    w = b.rear_wheel.diameter/2/b.crank_length
-    for (f, r) in product(b.front_cogs, b.rear_cogs):
-        result[(f, r)] = w*f/r
+    result = _gain_ratio_dict(b)
 
     if digits is not None:
         result = {k: round(v, digits) for k, v in result.items()}
@@ -301,7 +514,7 @@ def cadence_to_speeds(bicycle, cadence, digits=None):
         >>> w = Wheel(diameter=600)
         >>> b = Bicycle(front_cogs=[40], rear_cogs=[20, 30], crank_length=100, rear_wheel=w)
         >>> cadence_to_speeds(b, 2, digits=1)
-        {(40, 30): 18.1, (40, 20): 27.1}
+        {(40, 20): 27.1, (40, 30): 18.1}
 
     """
     b = bicycle
@@ -309,10 +522,10 @@ def cadence_to_speeds(bicycle, cadence, digits=None):
     check_attrs(b, *attrs)
     check_attrs(b.rear_wheel, 'diameter')
 
-    gr = gain_ratios(b)
-    result = {}
-    for (k, g) in gr.items():
-        result[k] = 2*pi*b.crank_length*g*cadence*(3600/1e6)
+    c = float(b.crank_length)
+    cadence = float(cadence)
+    result = {k: 2*pi*c*g*cadence*(3600/1e6)
+      for (k, g) in _gain_ratio_dict(b).items()}
 
     if digits is not None:
         result = {k: round(v, digits) for k, v in result.items()}
@@ -338,7 +551,7 @@ def speed_to_cadences(bicycle, speed, digits=None):
         >>> w = Wheel(diameter=600)
         >>> b = Bicycle(front_cogs=[40], rear_cogs=[20, 30], crank_length=100, rear_wheel=w)
         >>> speed_to_cadences(b, 18.1, digits=1)
-        {(40, 30): 2.0, (40, 20): 1.3}
+        {(40, 20): 1.3, (40, 30): 2.0}
 
     """
     b = bicycle
@@ -346,10 +559,10 @@ def speed_to_cadences(bicycle, speed, digits=None):
     check_attrs(b, *attrs)
     check_attrs(b.rear_wheel, 'diameter')
 
-    gr = gain_ratios(b)
-    result = {}
-    for (k, g) in gr.items():
-        result[k] = speed/(2*pi*b.crank_length*g*(3600/1e6))
+    c = float(b.crank_length)
+    speed = float(speed)
+    result = {k: speed/(2*pi*c*g*(3600/1e6))
+      for (k, g) in _gain_ratio_dict(b).items()}
 
     if digits is not None:
         result = {k: round(v, digits) for k, v in result.items()}
@@ -408,8 +621,11 @@ def spoke_length(wheel, digits=None):
     - flange_diameter
     - spoke_hole_diameter
     - erd
-    - offset
     - num_spokes
+
+    and the following wheel attributes are non-null, but possibly zero:
+
+    - offset
     - num_crosses
 
     Raise a ``ValueError``, if that is not the case.
@@ -418,7 +634,10 @@ def spoke_length(wheel, digits=None):
 
         >>> w = Wheel(center_to_flange={'left': 37.1, 'right': 20.9}, flange_diameter={'left': 45, 'right': 45}, erd=560, spoke_hole_diameter=2.6, offset=3, num_spokes=36, num_crosses=3)
         >>> spoke_length(w, digits=1)
-        {'right': 269.2, 'left': 270.3}
+        {'left': 270.3, 'right': 269.2}
+        >>> w.num_crosses = 0
+        >>> spoke_length(w, digits=1)
+        {'left': 258.4, 'right': 257.3}
 
     REFERENCES:
 
@@ -426,8 +645,12 @@ def spoke_length(wheel, digits=None):
     """
     w = wheel
     attrs = ['center_to_flange', 'flange_diameter', 'spoke_hole_diameter',
-      'erd', 'offset', 'num_spokes', 'num_crosses']
+      'erd', 'num_spokes']
     check_attrs(w, *attrs)
+    for attr in ['offset', 'num_crosses']:
+        if getattr(w, attr) is None:
+            raise ValueError("Attribute '{!s}' "\
+              "must not be None in object \n{!s}".format(attr, w))
 
     result = {}
     for k in w.center_to_flange:
@@ -0,0 +1,237 @@
+"""
+Evaluate a calculator from :mod:`bicyclator.main` over a large catalog
+of bicycles or wheels on a pool of worker processes.
+
+The catalog is converted once to a BicycleTable or WheelTable
+(see :mod:`bicyclator.table`), whose columns are copied into shared
+memory.
+Each worker attaches to the shared columns when it starts, so a task is
+just a calculator, a row range and keyword arguments; no Bicycle or
+Wheel objects are pickled.
+Calculators of :mod:`bicyclator.main` with a counterpart in
+:mod:`bicyclator.batch`, listed in ``BATCH_RUNNERS``, are evaluated by
+that counterpart once per task on the task's slice of the shared
+columns, and the result is split into one result per item in the
+calculator's format.
+Other calculators, and tasks holding an invalid item, are evaluated
+item by item on row views, so errors are those of the calculator.
+Results are returned in input order.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from multiprocessing import shared_memory
+import os
+
+import numpy as np
+
+from . import main, batch
+from .table import BicycleTable, WheelTable
+
+
+# Per-process state of a worker: its table and shared memory handles
+_worker = {}
+
+def _share_arrays(arrays):
+    """
+    Copy the given dictionary of the form name -> NumPy array into
+    shared memory, and return the pair (spec, handles), where spec is a
+    picklable dictionary of the form
+    name -> (shared memory name, dtype string, shape) and
+    handles is the list of SharedMemory objects to close and unlink
+    when done.
+    """
+    spec = {}
+    handles = []
+    for (k, a) in arrays.items():
+        a = np.ascontiguousarray(a)
+        shm = shared_memory.SharedMemory(create=True, size=max(a.nbytes, 1))
+        np.ndarray(a.shape, dtype=a.dtype, buffer=shm.buf)[...] = a
+        spec[k] = (shm.name, a.dtype.str, a.shape)
+        handles.append(shm)
+    return spec, handles
+
+def _attach_arrays(spec):
+    arrays = {}
+    handles = []
+    for (k, (name, dtype, shape)) in spec.items():
+        shm = shared_memory.SharedMemory(name=name)
+        arrays[k] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        handles.append(shm)
+    return arrays, handles
+
+def _table_arrays(table):
+    """
+    Return a dictionary of the form name -> NumPy array of all the
+    numeric arrays of the given BicycleTable or WheelTable.
+    """
+    if isinstance(table, WheelTable):
+        return {'wheels.' + k: v for k, v in table.columns.items()}
+    result = _table_arrays(table.wheels)
+    result.update({'columns.' + k: v for k, v in table.columns.items()})
+    for k in ['front_cog_offsets', 'front_cog_values', 'rear_cog_offsets',
+      'rear_cog_values']:
+        result[k] = getattr(table, k)
+    return result
+
+def _table_from_arrays(kind, arrays):
+    wheels = WheelTable({k[len('wheels.'):]: v for k, v in arrays.items()
+      if k.startswith('wheels.')})
+    if kind == 'wheels':
+        return wheels
+    columns = {k[len('columns.'):]: v for k, v in arrays.items()
+      if k.startswith('columns.')}
+    return BicycleTable(columns, arrays['front_cog_offsets'],
+      arrays['front_cog_values'], arrays['rear_cog_offsets'],
+      arrays['rear_cog_values'], wheels)
+
+def _init_worker(kind, spec):
+    arrays, handles = _attach_arrays(spec)
+    _worker['table'] = _table_from_arrays(kind, arrays)
+    _worker['handles'] = handles
+
+def _slice(table, start, stop):
+    """
+    Return the table of rows start to stop of the given BicycleTable or
+    WheelTable, sharing its columns (and wheels).
+    """
+    columns = {k: v[start:stop] for k, v in table.columns.items()}
+    names = table.names[start:stop]
+    if isinstance(table, WheelTable):
+        return WheelTable(columns, names=names)
+    cogs = []
+    for side in ['front', 'rear']:
+        offsets = getattr(table, side + '_cog_offsets')[start:stop + 1]
+        values = getattr(table, side + '_cog_values')[
+          offsets[0]:offsets[-1]]
+        cogs += [offsets - offsets[0], values]
+    return BicycleTable(columns, *cogs, table.wheels, names=names)
+
+def _cog_lists(table, side):
+    offsets = getattr(table, side + '_cog_offsets').tolist()
+    values = getattr(table, side + '_cog_values').tolist()
+    return [values[a:b] for a, b in zip(offsets, offsets[1:])]
+
+def _round_dict(d, digits):
+    if digits is None:
+        return d
+    return {k: round(v, digits) for k, v in d.items()}
+
+def _grid_runner(batch_func, convert=None):
+    def run(table, digits=None, **kwargs):
+        result = []
+        for (fs, rs, v) in zip(_cog_lists(table, 'front'),
+          _cog_lists(table, 'rear'), batch_func(table, **kwargs).tolist()):
+            n = len(rs)
+            values = [x for row in v[:len(fs)] for x in row[:n]]
+            if convert is not None:
+                values = [convert(x) for x in values]
+            if digits is not None:
+                values = [round(x, digits) for x in values]
+            result.append(dict(zip(product(fs, rs), values)))
+        return result
+    return run
+
+def _derailer_capacity(table):
+    return [int(v) for v in batch.derailer_capacity(table).tolist()]
+
+def _approx_diameter(table):
+    return batch.approx_diameter(table).tolist()
+
+def _trail(table, digits=None):
+    rows = zip(*[x.tolist() for x in batch.trail(table)])
+    if digits is None:
+        return [list(row) for row in rows]
+    return [tuple(round(v, digits) for v in row) for row in rows]
+
+def _spoke_length(table, digits=None):
+    d = batch.spoke_length(table)
+    return [_round_dict({'left': l, 'right': r}, digits)
+      for (l, r) in zip(d['left'].tolist(), d['right'].tolist())]
+
+#: Calculator of :mod:`bicyclator.main` -> function of a BicycleTable or
+#: WheelTable and the calculator's keyword arguments returning the list
+#: of the calculator's results on its rows, computed with
+#: :mod:`bicyclator.batch`
+BATCH_RUNNERS = {
+    main.gear_ratios: _grid_runner(batch.gear_ratios),
+    main.gain_ratios: _grid_runner(batch.gain_ratios),
+    main.cadence_to_speeds: _grid_runner(batch.cadence_to_speeds),
+    main.speed_to_cadences: _grid_runner(batch.speed_to_cadences),
+    main.num_skid_patches: _grid_runner(batch.num_skid_patches, int),
+    main.derailer_capacity: _derailer_capacity,
+    main.approx_diameter: _approx_diameter,
+    main.trail: _trail,
+    main.spoke_length: _spoke_length,
+}
+
+def _run_shard(func, start, stop, kwargs):
+    table = _worker['table']
+    try:
+        run = BATCH_RUNNERS.get(func)
+    except TypeError:
+        run = None
+    if run is not None:
+        try:
+            return run(_slice(table, start, stop), **kwargs)
+        except ValueError:
+            # Let the row views raise the calculator's own error
+            pass
+    return [func(table[i], **kwargs) for i in range(start, stop)]
+
+def evaluate(func, items, chunk_size=None, max_workers=None, **kwargs):
+    """
+    Return the list ``[func(item, **kwargs) for item in items]``
+    computed on a pool of ``max_workers`` processes
+    (by default, the number of CPUs), each task covering
+    ``chunk_size`` consecutive items (by default, enough for about four
+    tasks per worker).
+
+    The items are a list of Bicycle objects, a list of Wheel objects,
+    a BicycleTable or a WheelTable, and ``func`` is a calculator
+    that takes one of them, such as :func:`bicyclator.main.gain_ratios`,
+    :func:`bicyclator.main.trail` or :func:`bicyclator.main.spoke_length`,
+    or any other picklable function of one Bicycle or Wheel.
+    Workers see each item as a row view of a table, so item names
+    are not available to ``func``.
+
+    EXAMPLES::
+
+        >>> from bicyclator.main import Bicycle, Wheel, gain_ratios
+        >>> w = Wheel(diameter=600)
+        >>> bs = [Bicycle(front_cogs=[40], rear_cogs=[20, c],
+        ...   crank_length=100, rear_wheel=w) for c in [25, 30]]
+        >>> evaluate(gain_ratios, bs, max_workers=2, digits=1)
+        [{(40, 20): 6.0, (40, 25): 4.8}, {(40, 20): 6.0, (40, 30): 4.0}]
+
+    """
+    if isinstance(items, (BicycleTable, WheelTable)):
+        table = items
+    elif items and hasattr(items[0], 'front_cogs'):
+        table = BicycleTable.from_bicycles(items)
+    else:
+        table = WheelTable.from_wheels(items)
+    kind = 'wheels' if isinstance(table, WheelTable) else 'bicycles'
+
+    n = len(table)
+    if n == 0:
+        return []
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if chunk_size is None:
+        chunk_size = max(1, -(-n//(4*max_workers)))
+    shards = [(s, min(n, s + chunk_size)) for s in range(0, n, chunk_size)]
+
+    spec, handles = _share_arrays(_table_arrays(table))
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers,
+          initializer=_init_worker, initargs=(kind, spec)) as executor:
+            futures = [executor.submit(_run_shard, func, start, stop, kwargs)
+              for (start, stop) in shards]
+            result = []
+            for f in futures:
+                result.extend(f.result())
+    finally:
+        for shm in handles:
+            shm.close()
+            shm.unlink()
+    return result
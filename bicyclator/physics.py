@@ -0,0 +1,155 @@
+"""
+A rider power and speed model, for choosing gears and cadences.
+
+At steady speed v (meters per second) on a road of gradient s
+(rise over run), the rider's power P (watts) times the drivetrain
+efficiency balances aerodynamic drag, rolling resistance and gravity:
+
+    efficiency*P = a*v**3 + b*v
+
+where a = air_density*cda/2 and b = mass*g*(crr*cos(t) + sin(t))
+with t = arctan(s).
+The right side is convex in v for v >= 0, so Newton iterations started
+to the right of the root converge monotonically to it, and they run on
+whole arrays of riders, gradients and powers at once.
+
+Speeds are measured in kilometers per hour and cadences in hertz, as in
+:mod:`bicyclator.main`.
+"""
+from math import pi
+
+import numpy as np
+
+from .batch import bicycle_arrays, gain_ratio_array
+
+
+#: Standard gravity in meters per second squared
+GRAVITY = 9.80665
+
+def _coefficients(gradient, mass, cda, crr, air_density):
+    t = np.arctan(np.asarray(gradient, dtype=float))
+    a = 0.5*np.asarray(air_density, dtype=float)*np.asarray(cda,
+      dtype=float)
+    b = np.asarray(mass, dtype=float)*GRAVITY*(crr*np.cos(t) + np.sin(t))
+    return a, b
+
+def power_from_speed(speed, gradient=0, mass=85, cda=0.32, crr=0.004,
+  air_density=1.225, efficiency=0.976):
+    """
+    Return the power in watts needed to ride at the given speed
+    in kilometers per hour up the given gradient, e.g. 0.05 for 5%,
+    for a rider and bicycle of the given total mass in kilograms,
+    drag area in square meters, rolling resistance coefficient and
+    drivetrain efficiency, in air of the given density in kilograms per
+    cubic meter.
+    Arguments are scalars or arrays, broadcast together.
+
+    EXAMPLES::
+
+        >>> round(float(power_from_speed(30)), 1)
+        144.7
+
+    """
+    a, b = _coefficients(gradient, mass, cda, crr, air_density)
+    v = np.asarray(speed, dtype=float)/3.6
+    return (a*v**3 + b*v)/efficiency
+
+def speed_from_power(power, gradient=0, mass=85, cda=0.32, crr=0.004,
+  air_density=1.225, efficiency=0.976, tolerance=1e-9, max_iterations=50):
+    """
+    Return the steady speed in kilometers per hour for the given power
+    in watts, solving the power balance of :func:`power_from_speed`
+    with Newton iterations, stopped when every speed has changed by
+    less than ``tolerance`` meters per second or after
+    ``max_iterations`` iterations.
+    Arguments are scalars or arrays, broadcast together.
+
+    EXAMPLES::
+
+        >>> speed_from_power([144.7, 300], gradient=[[0], [0.05]]).round(2)
+        array([[30.  , 39.37],
+               [10.88, 20.53]])
+
+    """
+    a, b = _coefficients(gradient, mass, cda, crr, air_density)
+    p = np.asarray(power, dtype=float)*efficiency
+    a, b, p = np.broadcast_arrays(a, b, p)
+    # A start to the right of the root, where the balance is convex
+    v = np.cbrt(p/a) + np.sqrt(np.maximum(-b, 0)/a)
+    for i in range(max_iterations):
+        step = (a*v**3 + b*v - p)/(3*a*v**2 + b)
+        step = np.where(np.isfinite(step), step, 0)
+        v = v - step
+        if np.all(np.abs(step) < tolerance):
+            break
+    return v*3.6
+
+def optimal_gears(bicycles, power, gradient=0, cadence=1.5, **rider):
+    """
+    Choose, for each of the given Bicycle objects, or BicycleTable,
+    and each scenario of power and gradient, the gear whose cadence at
+    the steady speed of :func:`speed_from_power` is nearest the
+    preferred cadence in hertz.
+
+    The power, gradient, cadence and the rider keyword arguments of
+    :func:`speed_from_power` are scalars or arrays, broadcast together
+    to the scenario shape S.
+    Return a dictionary with the keys
+
+    - ``'speed'``: speeds in kilometers per hour, of shape S
+    - ``'cadences'``: the cadence in every gear, of shape
+      ``(n, *S, F, R)`` for n bicycles with at most F front and R rear
+      cogs, padded with NaN
+    - ``'front_cog'``, ``'rear_cog'`` and ``'cadence'``: the chosen
+      gear and its cadence, of shape ``(n, *S)``
+
+    Assume the following bicycle attributes are non-null and non-empty:
+
+    - front_cogs
+    - rear_cogs
+    - crank_length
+    - rear_wheel
+
+    Raise a ``ValueError``, if that is not the case.
+
+    EXAMPLES::
+
+        >>> from bicyclator.main import Bicycle, Wheel
+        >>> w = Wheel(diameter=680)
+        >>> b = Bicycle(front_cogs=[34, 50], rear_cogs=[11, 14, 18, 24],
+        ...   crank_length=170, rear_wheel=w)
+        >>> d = optimal_gears([b], power=250, gradient=[0, 0.04, 0.08])
+        >>> d['speed'].round(1)
+        array([36.8, 20.4, 12.2])
+        >>> d['front_cog'], d['rear_cog']
+        (array([[34, 34, 34]]), array([[11, 18, 24]]))
+        >>> (d['cadence']*60).round()
+        array([[93., 84., 67.]])
+
+    """
+    a = bicycle_arrays(bicycles, ['front_cogs', 'rear_cogs', 'crank_length',
+      'rear_wheel_diameter'])
+    f, r, c = a['front_cogs'], a['rear_cogs'], a['crank_length']
+    g = gain_ratio_array(f, r, c, a['rear_wheel_diameter'])
+
+    speed = speed_from_power(power, gradient, **rider)
+    cadence = np.asarray(cadence, dtype=float)
+    speed, cadence = np.broadcast_arrays(speed, cadence)
+    n = g.shape[0]
+    extra = (1,)*speed.ndim
+    g = g.reshape((n,) + extra + g.shape[1:])
+    c = c.reshape((n,) + extra + (1, 1))
+    cadences = speed[..., None, None]/(2*pi*c*g*(3600/1e6))
+
+    flat = cadences.reshape(cadences.shape[:-2] + (-1,))
+    error = np.abs(flat - cadence[..., None])
+    best = np.argmin(np.where(np.isnan(error), np.inf, error), axis=-1)
+    num_rear = r.shape[-1]
+    rows = np.arange(n).reshape((n,) + extra)
+    return {
+        'speed': speed,
+        'cadences': cadences,
+        'front_cog': f[rows, best//num_rear].astype(int),
+        'rear_cog': r[rows, best % num_rear].astype(int),
+        'cadence': np.take_along_axis(flat, best[..., None], -1)[..., 0],
+    }
@@ -0,0 +1,129 @@
+"""
+Search for chainring and cassette combinations that cover a target
+range of gear ratios.
+
+Cassettes are built one cog at a time in increasing order of teeth,
+and a partial cassette is abandoned as soon as it can no longer
+satisfy the maximum ratio jump, the derailer capacity (as computed by
+:func:`bicyclator.main.derailer_capacity`), or the target range,
+so only a small part of the space of all cassettes is visited.
+"""
+from collections import namedtuple
+from math import floor, log
+import heapq
+
+from .main import Bicycle, derailer_capacity
+
+
+#: A drivetrain found by the search, where
+#:
+#: - ``gear_range`` is the largest gear ratio divided by the smallest
+#: - ``max_jump`` is the largest relative jump between neighbouring
+#:   rear cogs, e.g. 0.15 for a 15% jump
+#: - ``step_unevenness`` is the standard deviation of the logarithms of
+#:   the rear cog jumps, so 0 means perfectly even steps
+Drivetrain = namedtuple('Drivetrain', ['front_cogs', 'rear_cogs',
+  'gear_range', 'max_jump', 'step_unevenness', 'derailer_capacity'])
+
+def _drivetrain(front_cogs, rear_cogs):
+    steps = [log(b/a) for a, b in zip(rear_cogs, rear_cogs[1:])]
+    if steps:
+        mean = sum(steps)/len(steps)
+        unevenness = (sum((s - mean)**2 for s in steps)/len(steps))**0.5
+        max_jump = max(b/a for a, b in zip(rear_cogs, rear_cogs[1:])) - 1
+    else:
+        unevenness = 0.0
+        max_jump = 0.0
+    gear_range = (front_cogs[-1]/rear_cogs[0])/(front_cogs[0]/rear_cogs[-1])
+    capacity = derailer_capacity(Bicycle(front_cogs=front_cogs,
+      rear_cogs=rear_cogs))
+    return Drivetrain(list(front_cogs), list(rear_cogs), gear_range,
+      max_jump, unevenness, capacity)
+
+def iter_drivetrains(front_cog_sets, num_rear_cogs, target_range,
+  min_teeth=9, max_teeth=52, max_jump=None, max_derailer_capacity=None):
+    """
+    Generate, in the order found, every Drivetrain made of one of the
+    given chainring sets and a cassette of ``num_rear_cogs`` distinct
+    rear cogs with between ``min_teeth`` and ``max_teeth`` teeth such that
+
+    - the smallest gear ratio is at most ``target_range[0]`` and the
+      largest gear ratio is at least ``target_range[1]``
+    - every jump between neighbouring rear cogs is at most
+      ``max_jump`` (e.g. 0.15), if given
+    - the derailer capacity is at most ``max_derailer_capacity``,
+      if given
+
+    EXAMPLES::
+
+        >>> ds = iter_drivetrains([[34, 50]], 3, (1.2, 4), min_teeth=11,
+        ...   max_teeth=30, max_jump=0.6, max_derailer_capacity=33)
+        >>> [d.rear_cogs for d in ds]
+        [[12, 19, 29]]
+
+    """
+    low, high = target_range
+    for front_cogs in front_cog_sets:
+        front_cogs = sorted(front_cogs)
+        # The derailer capacity left for the cassette
+        if max_derailer_capacity is None:
+            spare = max_teeth - min_teeth
+        else:
+            spare = max_derailer_capacity - derailer_capacity(
+              Bicycle(front_cogs=front_cogs, rear_cogs=[min_teeth]))
+        # The largest gear must reach high and the smallest gear must
+        # reach low
+        first_max = min(max_teeth, floor(front_cogs[-1]/high))
+        last_min = front_cogs[0]/low
+
+        def reachable(r, k, top):
+            # Largest cog reachable from r in k more cogs below top
+            for _ in range(k):
+                if max_jump is not None:
+                    r = min(top, floor(r*(1 + max_jump) + 1e-9))
+                else:
+                    r = top
+            return r
+
+        def extend(cogs, top):
+            k = num_rear_cogs - len(cogs)
+            r = cogs[-1]
+            if k == 0:
+                if r >= last_min:
+                    yield _drivetrain(front_cogs, cogs)
+                return
+            # Not enough room for k more cogs or for the smallest gear
+            if r + k > top or reachable(r, k, top) < last_min:
+                return
+            hi = top - k + 1
+            if max_jump is not None:
+                hi = min(hi, floor(r*(1 + max_jump) + 1e-9))
+            for s in range(r + 1, hi + 1):
+                yield from extend(cogs + [s], top)
+
+        for first in range(min_teeth, first_max + 1):
+            top = min(max_teeth, first + spare)
+            yield from extend([first], top)
+
+def best_drivetrains(front_cog_sets, num_rear_cogs, target_range, k=10,
+  key=None, **kwargs):
+    """
+    Return the ``k`` best Drivetrains found by :func:`iter_drivetrains`
+    with the given arguments, best first.
+    By default, drivetrains are ranked by smallest step unevenness,
+    and then by largest gear range.
+    Alternatively, give a ``key`` function of a Drivetrain,
+    smaller values being better.
+
+    EXAMPLES::
+
+        >>> d = best_drivetrains([[34, 50], [36, 52]], 11, (1.0, 4.0),
+        ...   min_teeth=11, max_teeth=34, max_jump=0.15, k=1)[0]
+        >>> d.front_cogs, d.rear_cogs
+        ([34, 50], [12, 13, 14, 16, 18, 20, 22, 25, 28, 31, 34])
+
+    """
+    if key is None:
+        key = lambda d: (d.step_unevenness, -d.gear_range)
+    return heapq.nsmallest(k, iter_drivetrains(front_cog_sets,
+      num_rear_cogs, target_range, **kwargs), key=key)
@@ -0,0 +1,308 @@
+"""
+An asyncio service that coalesces concurrent calculator requests into
+batches.
+
+Each request for, say, the gain ratios of one bicycle waits up to
+``window`` seconds for other requests to the same calculator with the
+same options, and then the whole batch is evaluated in one pass through
+:mod:`bicyclator.batch` and each caller gets back its own result, in
+the format of the corresponding calculator of :mod:`bicyclator.main`.
+If a batch fails, its requests are retried one by one with the
+calculators of :mod:`bicyclator.main`, so only the callers with invalid
+bicycles or wheels get the error.
+
+Batches run on the event loop's thread: the vectorized pass is short,
+and running it inline avoids handing arrays between threads.
+Only the standard library and NumPy are needed.
+"""
+from collections import deque
+import asyncio
+import time
+
+import numpy as np
+
+from . import main, batch
+
+
+def _round_dict(d, digits):
+    if digits is None:
+        return d
+    return {k: round(v, digits) for k, v in d.items()}
+
+def _grid_results(bicycles, values, digits):
+    result = []
+    for (b, v) in zip(bicycles, values):
+        d = batch.grid_dict(b.front_cogs, b.rear_cogs,
+          v[:len(b.front_cogs), :len(b.rear_cogs)])
+        result.append(_round_dict(d, digits))
+    return result
+
+def _gear_ratios(items, digits):
+    bicycles = [b for (b,) in items]
+    return _grid_results(bicycles, batch.gear_ratios(bicycles), digits)
+
+def _gain_ratios(items, digits):
+    bicycles = [b for (b,) in items]
+    return _grid_results(bicycles, batch.gain_ratios(bicycles), digits)
+
+def _cadence_to_speeds(items, digits):
+    bicycles = [b for (b, c) in items]
+    cadences = np.array([c for (b, c) in items], dtype=float)
+    return _grid_results(bicycles, batch.cadence_to_speeds(bicycles,
+      cadences), digits)
+
+def _speed_to_cadences(items, digits):
+    bicycles = [b for (b, s) in items]
+    speeds = np.array([s for (b, s) in items], dtype=float)
+    return _grid_results(bicycles, batch.speed_to_cadences(bicycles,
+      speeds), digits)
+
+def _trail(items, digits):
+    columns = [x.tolist() for x in batch.trail([b for (b,) in items])]
+    result = [list(row) for row in zip(*columns)]
+    if digits is not None:
+        result = [tuple(round(v, digits) for v in row) for row in result]
+    return result
+
+def _spoke_length(items, digits):
+    d = batch.spoke_length([w for (w,) in items])
+    left = d['left'].tolist()
+    right = d['right'].tolist()
+    return [_round_dict({'left': l, 'right': r}, digits)
+      for (l, r) in zip(left, right)]
+
+#: Calculator name -> function evaluating a list of argument tuples
+#: with the given digits
+BATCH_CALCULATORS = {
+    'gear_ratios': _gear_ratios,
+    'gain_ratios': _gain_ratios,
+    'cadence_to_speeds': _cadence_to_speeds,
+    'speed_to_cadences': _speed_to_cadences,
+    'trail': _trail,
+    'spoke_length': _spoke_length,
+}
+
+
+class Metrics(object):
+    """
+    Batch size and latency statistics, keeping the latencies of the
+    last ``max_samples`` requests.
+
+    Attributes:
+
+    - num_requests, num_batches, num_fallbacks: counts of requests,
+      batches evaluated, and batches retried request by request
+    - batch_sizes: dictionary of the form batch size -> count
+    - latencies: deque of the most recent request latencies in seconds,
+      from submission to result
+    """
+    def __init__(self, max_samples=10000):
+        self.max_samples = max_samples
+        self.reset()
+
+    def reset(self):
+        """
+        Reset all the statistics.
+        """
+        self.num_requests = 0
+        self.num_batches = 0
+        self.num_fallbacks = 0
+        self.batch_sizes = {}
+        self.latencies = deque(maxlen=self.max_samples)
+
+    def record(self, size, latencies, fallback=False):
+        """
+        Record a batch of the given size, the given latencies of its
+        requests, and whether it was retried request by request.
+        """
+        self.num_requests += size
+        self.num_batches += 1
+        self.num_fallbacks += fallback
+        self.batch_sizes[size] = self.batch_sizes.get(size, 0) + 1
+        self.latencies.extend(latencies)
+
+    def summary(self):
+        """
+        Return a dictionary of the request and batch counts, the mean
+        and largest batch sizes, and the mean and the 50th, 90th and 99th
+        percentile latencies in seconds (None without requests).
+        """
+        result = {
+            'num_requests': self.num_requests,
+            'num_batches': self.num_batches,
+            'num_fallbacks': self.num_fallbacks,
+            'mean_batch_size': self.num_requests/self.num_batches
+              if self.num_batches else None,
+            'max_batch_size': max(self.batch_sizes, default=None),
+        }
+        if self.latencies:
+            a = np.array(self.latencies)
+            result['mean_latency'] = float(a.mean())
+            for (k, q) in [('p50', 50), ('p90', 90), ('p99', 99)]:
+                result[k + '_latency'] = float(np.percentile(a, q))
+        else:
+            for k in ['mean', 'p50', 'p90', 'p99']:
+                result[k + '_latency'] = None
+        return result
+
+
+class _Batcher(object):
+    """
+    The pending requests to one calculator with one set of options.
+    """
+    def __init__(self, name, digits, service):
+        self.name = name
+        self.digits = digits
+        self.service = service
+        self.pending = []
+        self.timer = None
+
+    async def submit(self, args):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((args, future, time.perf_counter()))
+        if len(self.pending) >= self.service.max_batch_size:
+            self.flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.service.window, self.flush)
+        return await future
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        requests, self.pending = self.pending, []
+        if not requests:
+            return
+
+        fallback = False
+        try:
+            results = BATCH_CALCULATORS[self.name](
+              [args for (args, future, start) in requests], self.digits)
+            errors = [None]*len(requests)
+        except Exception:
+            fallback = True
+            func = getattr(main, self.name)
+            results = []
+            errors = []
+            for (args, future, start) in requests:
+                try:
+                    results.append(func(*args, digits=self.digits))
+                    errors.append(None)
+                except Exception as e:
+                    results.append(None)
+                    errors.append(e)
+
+        end = time.perf_counter()
+        for ((args, future, start), result, error) in zip(requests, results,
+          errors):
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+        self.service.metrics.record(len(requests),
+          [end - start for (args, future, start) in requests], fallback)
+
+
+class CalculatorService(object):
+    """
+    A micro-batching front end to the calculators of
+    :mod:`bicyclator.main`, for use from coroutines on one event loop.
+    Requests wait at most ``window`` seconds before their batch is
+    evaluated, and a batch is evaluated at once when it reaches
+    ``max_batch_size`` requests.
+
+    Attributes:
+
+    - window
+    - max_batch_size
+    - metrics: Metrics of all the batches evaluated
+
+    Results agree with those of :mod:`bicyclator.main` up to floating
+    point rounding.
+
+    EXAMPLES::
+
+        >>> from bicyclator.main import Bicycle, Wheel
+        >>> w = Wheel(diameter=600)
+        >>> bs = [Bicycle(front_cogs=[40], rear_cogs=[20, c],
+        ...   crank_length=100, rear_wheel=w) for c in [25, 30]]
+        >>> service = CalculatorService(window=0.01)
+        >>> async def handle_all():
+        ...     return await asyncio.gather(*[service.gain_ratios(b, digits=1)
+        ...       for b in bs])
+        >>> asyncio.run(handle_all())
+        [{(40, 20): 6.0, (40, 25): 4.8}, {(40, 20): 6.0, (40, 30): 4.0}]
+        >>> service.metrics.summary()['max_batch_size']
+        2
+
+    """
+    def __init__(self, window=0.002, max_batch_size=1024):
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.metrics = Metrics()
+        self._batchers = {}
+
+    def __repr__(self):
+        return 'CalculatorService(window={!s}, max_batch_size={!s})'.format(
+          self.window, self.max_batch_size)
+
+    async def call(self, name, *args, digits=None):
+        """
+        Return the result of the calculator of :mod:`bicyclator.main`
+        with the given name, one of ``BATCH_CALCULATORS``,
+        on the given arguments, evaluated in a batch.
+        """
+        if name not in BATCH_CALCULATORS:
+            raise ValueError("Can't batch calculator '{!s}'".format(name))
+        key = (name, digits)
+        if key not in self._batchers:
+            self._batchers[key] = _Batcher(name, digits, self)
+        return await self._batchers[key].submit(args)
+
+    def flush(self):
+        """
+        Evaluate all the pending requests now.
+        """
+        for b in self._batchers.values():
+            b.flush()
+
+    async def gear_ratios(self, bicycle, digits=None):
+        """
+        Batched :func:`bicyclator.main.gear_ratios`.
+        """
+        return await self.call('gear_ratios', bicycle, digits=digits)
+
+    async def gain_ratios(self, bicycle, digits=None):
+        """
+        Batched :func:`bicyclator.main.gain_ratios`.
+        """
+        return await self.call('gain_ratios', bicycle, digits=digits)
+
+    async def cadence_to_speeds(self, bicycle, cadence, digits=None):
+        """
+        Batched :func:`bicyclator.main.cadence_to_speeds`.
+        """
+        return await self.call('cadence_to_speeds', bicycle, cadence,
+          digits=digits)
+
+    async def speed_to_cadences(self, bicycle, speed, digits=None):
+        """
+        Batched :func:`bicyclator.main.speed_to_cadences`.
+        """
+        return await self.call('speed_to_cadences', bicycle, speed,
+          digits=digits)
+
+    async def trail(self, bicycle, digits=None):
+        """
+        Batched :func:`bicyclator.main.trail`.
+        """
+        return await self.call('trail', bicycle, digits=digits)
+
+    async def spoke_length(self, wheel, digits=None):
+        """
+        Batched :func:`bicyclator.main.spoke_length`.
+        """
+        return await self.call('spoke_length', wheel, digits=digits)
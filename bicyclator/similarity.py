@@ -0,0 +1,278 @@
+"""
+Nearest-neighbour search of bicycles by gearing.
+
+Each bicycle's gain ratios (see :func:`bicyclator.main.gain_ratios`)
+are embedded as a fixed-length profile vector of ``PROFILE_FEATURES``,
+all on a logarithmic scale, so that distances measure relative
+differences in gearing:
+
+- the natural logarithms of the smallest gain ratio, the 25th, 50th and
+  75th percentile gain ratios, and the largest gain ratio
+- the mean and largest logarithmic steps between neighbouring gears
+  (see :mod:`bicyclator.analysis`)
+
+Profiles are indexed in a k-d tree built with NumPy, whose leaves hold
+contiguous blocks of profiles and whose nodes hold bounding boxes, so
+that a query visits only the few boxes near it.
+Inserted bicycles go into a buffer searched by brute force alongside
+the tree, and the tree is rebuilt once the buffer grows to an eighth of
+the index, so inserts take amortized logarithmic time.
+"""
+import heapq
+
+import numpy as np
+
+from .batch import bicycle_arrays, gain_ratio_array
+from .analysis import spacing_arrays
+
+
+#: Names of the entries of a profile vector
+PROFILE_FEATURES = ['log_min', 'log_q25', 'log_median', 'log_q75',
+  'log_max', 'mean_log_step', 'max_log_step']
+
+def gearing_profiles(bicycles):
+    """
+    Return the profile vectors of the given Bicycle objects, or
+    BicycleTable, as an array of shape
+    ``(num_bicycles, len(PROFILE_FEATURES))``.
+
+    Assume the following bicycle attributes are non-null and non-empty:
+
+    - front_cogs
+    - rear_cogs
+    - crank_length
+    - rear_wheel
+
+    Raise a ``ValueError``, if that is not the case.
+
+    EXAMPLES::
+
+        >>> from bicyclator.main import Bicycle, Wheel
+        >>> b = Bicycle(front_cogs=[40], rear_cogs=[20, 30],
+        ...   crank_length=100, rear_wheel=Wheel(diameter=600))
+        >>> np.exp(gearing_profiles([b])).round(3)
+        array([[4.   , 4.427, 4.899, 5.422, 6.   , 1.5  , 1.5  ]])
+
+    """
+    a = bicycle_arrays(bicycles, ['front_cogs', 'rear_cogs', 'crank_length',
+      'rear_wheel_diameter'])
+    g = gain_ratio_array(a['front_cogs'], a['rear_cogs'], a['crank_length'],
+      a['rear_wheel_diameter'])
+    logs = np.log(g.reshape(g.shape[0], -1))
+    if not logs.shape[0]:
+        return np.zeros((0, len(PROFILE_FEATURES)))
+    quantiles = np.nanquantile(logs, [0, 0.25, 0.5, 0.75, 1], axis=1).T
+    s = spacing_arrays(g)
+    intervals = np.maximum(s['num_gears'] - 1, 1)
+    mean_step = np.log(s['gear_range'])/intervals
+    max_step = np.nan_to_num(np.log1p(s['max_step']))
+    return np.column_stack([quantiles, mean_step, max_step])
+
+
+def _squared_distances(points, q):
+    diff = points - q
+    return np.einsum('ij,ij->i', diff, diff)
+
+
+class _KDTree(object):
+    """
+    A static k-d tree over the given points, an array of shape (n, d),
+    with at most ``leaf_size`` points per leaf.
+    Points are reordered so that each node covers a contiguous block
+    ``points[start[i]:end[i]]``, and ``ids`` maps reordered rows to
+    original rows.
+    """
+    def __init__(self, points, leaf_size=32):
+        n = len(points)
+        perm = np.arange(n)
+        start, end, left, right, lows, highs = [], [], [], [], [], []
+        stack = [(0, n)]
+        parents = [(-1, None)]
+        while stack:
+            s, e = stack.pop()
+            parent, side = parents.pop()
+            node = len(start)
+            if parent >= 0:
+                (left if side == 0 else right)[parent] = node
+            block = points[perm[s:e]]
+            lo = block.min(axis=0) if e > s else np.zeros(points.shape[1])
+            hi = block.max(axis=0) if e > s else np.zeros(points.shape[1])
+            start.append(s)
+            end.append(e)
+            left.append(-1)
+            right.append(-1)
+            lows.append(lo)
+            highs.append(hi)
+            spread = hi - lo
+            if e - s <= leaf_size or not spread.any():
+                continue
+            dim = int(np.argmax(spread))
+            m = (s + e)//2
+            order = np.argpartition(block[:, dim], m - s)
+            perm[s:e] = perm[s:e][order]
+            stack += [(m, e), (s, m)]
+            parents += [(node, 1), (node, 0)]
+        self.points = points[perm]
+        self.ids = perm
+        self.start = start
+        self.end = end
+        self.left = left
+        self.right = right
+        self.lows = np.array(lows)
+        self.highs = np.array(highs)
+
+    def _box_distance(self, node, q):
+        # The squared distance from q to its nearest point of the box,
+        # computed with the same expression as the point distances so
+        # that a box is never farther than its own points
+        nearest = np.clip(q, self.lows[node], self.highs[node])
+        return float(_squared_distances(nearest[None, :], q)[0])
+
+    def query(self, q, k, best):
+        """
+        Merge into the given list ``best`` of pairs (-squared distance,
+        row), kept as a heap of at most k entries, the k nearest rows
+        of this tree to q.
+        """
+        stack = [(0.0, 0)]
+        while stack:
+            dmin, node = stack.pop()
+            # Allow for rounding, so that boxes of points at exactly the
+            # k-th distance with smaller ids are still visited
+            if len(best) == k and dmin > -best[0][0]*(1 + 1e-12):
+                continue
+            if self.left[node] < 0:
+                s, e = self.start[node], self.end[node]
+                d = _squared_distances(self.points[s:e], q)
+                if len(best) == k:
+                    keep = np.flatnonzero(d <= -best[0][0])
+                else:
+                    keep = np.arange(e - s)
+                ids = self.ids[s:e][keep]
+                for j in keep[np.lexsort((ids, d[keep]))]:
+                    item = (-float(d[j]), -int(self.ids[s + j]))
+                    if len(best) < k:
+                        heapq.heappush(best, item)
+                    elif item > best[0]:
+                        heapq.heapreplace(best, item)
+                    else:
+                        break
+                continue
+            children = [(self._box_distance(c, q), c)
+              for c in (self.left[node], self.right[node])]
+            children.sort(reverse=True)
+            stack += children
+        return best
+
+
+class GearingIndex(object):
+    """
+    A nearest-neighbour index of the gearing profiles of the given
+    Bicycle objects, or BicycleTable, with optional per-feature
+    weights for the distance, which is weighted Euclidean distance
+    between profile vectors.
+    Bicycles are identified by their insertion order, starting at 0.
+
+    EXAMPLES::
+
+        >>> from bicyclator.main import Bicycle, Wheel
+        >>> w = Wheel(diameter=680)
+        >>> bs = [Bicycle(front_cogs=f, rear_cogs=r, crank_length=170,
+        ...   rear_wheel=w) for f, r in [([50, 34], [11, 13, 15, 17, 19, 21,
+        ...   24, 28]), ([38], [10, 12, 14, 16, 18, 21, 24, 28, 33, 42]),
+        ...   ([52, 36], [11, 12, 13, 14, 15, 17, 19, 21, 23, 25])]]
+        >>> index = GearingIndex(bs[:2])
+        >>> index.add(bs[2:])
+        array([2])
+        >>> mine = Bicycle(front_cogs=[50, 34], rear_cogs=[11, 12, 13, 14,
+        ...   16, 18, 20, 22, 25, 28], crank_length=172.5, rear_wheel=w)
+        >>> distances, ids = index.query(mine, k=2)
+        >>> ids
+        array([0, 2])
+
+    """
+    def __init__(self, bicycles=(), weights=None, leaf_size=32):
+        if weights is None:
+            weights = np.ones(len(PROFILE_FEATURES))
+        self.weights = np.asarray(weights, dtype=float)
+        self.leaf_size = leaf_size
+        self._tree = None
+        self._tree_size = 0
+        self._buffer = np.zeros((0, len(PROFILE_FEATURES)))
+        if len(bicycles):
+            self.add(bicycles)
+
+    def __len__(self):
+        return self._tree_size + len(self._buffer)
+
+    def __repr__(self):
+        return 'GearingIndex with {!s} bicycles'.format(len(self))
+
+    def add(self, bicycles):
+        """
+        Add the given Bicycle objects, or BicycleTable, to the index
+        and return the array of their ids.
+        """
+        return self.add_profiles(gearing_profiles(bicycles))
+
+    def add_profiles(self, profiles):
+        """
+        Add the given profile vectors to the index and return the array
+        of their ids.
+        """
+        profiles = np.asarray(profiles, dtype=float)*self.weights
+        ids = np.arange(len(self), len(self) + len(profiles))
+        self._buffer = np.concatenate([self._buffer, profiles])
+        if len(self._buffer) > max(self.leaf_size, self._tree_size//8):
+            self._rebuild()
+        return ids
+
+    def _rebuild(self):
+        points = self._buffer
+        if self._tree is not None:
+            points = np.concatenate([self._tree.points[
+              np.argsort(self._tree.ids)], points])
+        self._tree = _KDTree(points, self.leaf_size)
+        self._tree_size = len(points)
+        self._buffer = points[:0]
+
+    def query(self, bicycle, k=5):
+        """
+        Return the pair (distances, ids) of arrays of the at most k
+        bicycles in the index nearest the given Bicycle object,
+        nearest first, ties broken by id.
+        """
+        return self.query_profile(gearing_profiles([bicycle])[0], k)
+
+    def query_profile(self, profile, k=5):
+        """
+        Return the pair (distances, ids) of arrays of the at most k
+        bicycles in the index nearest the given profile vector,
+        nearest first, ties broken by id.
+
+        EXAMPLES::
+
+            >>> profiles = np.random.default_rng(0).normal(size=(2000, 7))
+            >>> profiles[::7] = profiles[0]
+            >>> index = GearingIndex()
+            >>> _ = index.add_profiles(profiles)
+            >>> index.query_profile(profiles[0], k=5)[1]
+            array([ 0,  7, 14, 21, 28])
+
+        """
+        q = np.asarray(profile, dtype=float)*self.weights
+        best = []
+        if self._tree is not None:
+            self._tree.query(q, k, best)
+        if len(self._buffer):
+            d = _squared_distances(self._buffer, q)
+            for j in np.argsort(d, kind='stable')[:k]:
+                item = (-float(d[j]), -int(self._tree_size + j))
+                if len(best) < k:
+                    heapq.heappush(best, item)
+                elif item > best[0]:
+                    heapq.heapreplace(best, item)
+        best.sort(reverse=True)
+        distances = np.sqrt([-d for d, i in best])
+        ids = np.array([-i for d, i in best], dtype=np.int64)
+        return distances, ids
@@ -0,0 +1,160 @@
+"""
+A precomputed table of gear ratios and skid patch counts for every
+(front cog, rear cog) pair in a range of tooth counts, for answering
+fixed gear queries such as "all pairs with a ratio between 1.8 and 2.9
+and at least 14 ambidextrous skid patches" without recomputing anything.
+
+Skid patch counts follow the skid patch theorem of
+:func:`bicyclator.main.num_skid_patches` and are computed exactly in
+integer arithmetic.
+"""
+import numpy as np
+
+
+#: NumPy dtype of the rows returned by SkidPatchTable queries
+SKID_PATCH_DTYPE = np.dtype([('front_cog', np.int32),
+  ('rear_cog', np.int32), ('gear_ratio', np.float64),
+  ('num_skid_patches', np.int32),
+  ('num_ambidextrous_skid_patches', np.int32)])
+
+
+class SkidPatchTable(object):
+    """
+    Gear ratios and skid patch counts of every (front cog, rear cog) pair
+    with tooth counts between ``min_teeth`` and ``max_teeth`` inclusive.
+
+    Attributes:
+
+    - min_teeth
+    - max_teeth
+    - rows: NumPy array of dtype ``SKID_PATCH_DTYPE`` sorted by gear ratio
+    - by_skid_patches, by_ambidextrous_skid_patches: indices of ``rows``
+      sorted by (single-sided, respectively ambidextrous) skid patch count
+    """
+    def __init__(self, min_teeth=9, max_teeth=80):
+        self.min_teeth = min_teeth
+        self.max_teeth = max_teeth
+
+        teeth = np.arange(min_teeth, max_teeth + 1, dtype=np.int32)
+        f, r = np.meshgrid(teeth, teeth, indexing='ij')
+        f = f.ravel()
+        r = r.ravel()
+        g = np.gcd(f, r)
+        a = f//g
+        b = r//g
+
+        rows = np.empty(f.size, dtype=SKID_PATCH_DTYPE)
+        rows['front_cog'] = f
+        rows['rear_cog'] = r
+        rows['gear_ratio'] = f/r
+        rows['num_skid_patches'] = b
+        rows['num_ambidextrous_skid_patches'] = np.where(a % 2, 2*b, b)
+        self.rows = rows[np.argsort(rows['gear_ratio'], kind='stable')]
+
+        self._ratios = self.rows['gear_ratio']
+        self.by_skid_patches = np.argsort(self.rows['num_skid_patches'],
+          kind='stable')
+        self.by_ambidextrous_skid_patches = np.argsort(
+          self.rows['num_ambidextrous_skid_patches'], kind='stable')
+        self._skid_patches = {
+            False: self.rows['num_skid_patches'][self.by_skid_patches],
+            True: self.rows['num_ambidextrous_skid_patches'][
+              self.by_ambidextrous_skid_patches],
+        }
+
+        # Row position of each (front cog, rear cog) pair
+        n = teeth.size
+        self._positions = np.empty(n*n, dtype=np.int64)
+        i = (self.rows['front_cog'] - min_teeth)*n + \
+          self.rows['rear_cog'] - min_teeth
+        self._positions[i] = np.arange(self.rows.size)
+
+    def __len__(self):
+        return self.rows.size
+
+    def __repr__(self):
+        return 'SkidPatchTable of {!s} gears with {!s} to {!s} teeth'.format(
+          len(self), self.min_teeth, self.max_teeth)
+
+    def lookup(self, front_cog, rear_cog):
+        """
+        Return the row of the given (front cog, rear cog) pair.
+
+        EXAMPLES::
+
+            >>> t = SkidPatchTable()
+            >>> row = t.lookup(50, 30)
+            >>> int(row['num_skid_patches']), int(row['num_ambidextrous_skid_patches'])
+            (3, 6)
+
+        """
+        n = self.max_teeth - self.min_teeth + 1
+        for c in [front_cog, rear_cog]:
+            if not self.min_teeth <= c <= self.max_teeth:
+                raise ValueError('Cog {!s} is outside of the table '\
+                  'range {!s} to {!s}'.format(c, self.min_teeth,
+                  self.max_teeth))
+        i = (front_cog - self.min_teeth)*n + rear_cog - self.min_teeth
+        return self.rows[self._positions[i]]
+
+    def query(self, min_ratio=None, max_ratio=None, min_skid_patches=None,
+      max_skid_patches=None, ambidextrous=False):
+        """
+        Return the rows (sorted by gear ratio) whose gear ratio lies in
+        the interval [``min_ratio``, ``max_ratio``] and
+        whose skid patch count lies in the interval
+        [``min_skid_patches``, ``max_skid_patches``].
+        Skid patch counts are single-sided, or ambidextrous if
+        ``ambidextrous``.
+        Omitted bounds are unbounded.
+
+        Binary search narrows the rows by gear ratio and by skid patch
+        count, and only the smaller of the two candidate sets is
+        filtered.
+
+        EXAMPLES::
+
+            >>> t = SkidPatchTable()
+            >>> rows = t.query(1.8, 2.9, min_skid_patches=14,
+            ...   ambidextrous=True)
+            >>> len(rows)
+            487
+            >>> rows[['front_cog', 'rear_cog']][:3].tolist()
+            [(74, 41), (65, 36), (56, 31)]
+
+        """
+        lo = 0
+        hi = self.rows.size
+        if min_ratio is not None:
+            lo = np.searchsorted(self._ratios, min_ratio, side='left')
+        if max_ratio is not None:
+            hi = np.searchsorted(self._ratios, max_ratio, side='right')
+
+        counts = self._skid_patches[bool(ambidextrous)]
+        slo = 0
+        shi = counts.size
+        if min_skid_patches is not None:
+            slo = np.searchsorted(counts, min_skid_patches, side='left')
+        if max_skid_patches is not None:
+            shi = np.searchsorted(counts, max_skid_patches, side='right')
+
+        if hi - lo <= shi - slo:
+            rows = self.rows[lo:hi]
+            if ambidextrous:
+                c = rows['num_ambidextrous_skid_patches']
+            else:
+                c = rows['num_skid_patches']
+            mask = np.ones(rows.size, dtype=bool)
+            if min_skid_patches is not None:
+                mask &= c >= min_skid_patches
+            if max_skid_patches is not None:
+                mask &= c <= max_skid_patches
+            return rows[mask]
+        else:
+            if ambidextrous:
+                index = self.by_ambidextrous_skid_patches
+            else:
+                index = self.by_skid_patches
+            positions = np.sort(index[slo:shi])
+            positions = positions[(positions >= lo) & (positions < hi)]
+            return self.rows[positions]
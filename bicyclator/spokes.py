@@ -0,0 +1,188 @@
+"""
+Allocation of stocked spokes to batches of wheel builds.
+
+Spoke lengths for all the wheels are computed in one pass with
+:func:`bicyclator.batch.spoke_length`, and each wheel side then needs
+half its spokes, all of one stocked length within a tolerance of the
+computed length.
+Wheels are allocated whole, so no spokes are held for a wheel that
+can't be built.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from .table import WheelTable
+from .batch import spoke_length
+
+
+#: The result of :func:`allocate`:
+#:
+#: - lengths: dictionary of the form side -> array of the spoke lengths
+#:   needed by each wheel
+#: - stock: dictionary of the form side -> array of the stocked spoke
+#:   lengths allocated to each wheel, NaN for wheels not built
+#: - built: boolean array, True for the wheels allocated spokes
+#: - remaining: dictionary of the form spoke length -> quantity left
+Allocation = namedtuple('Allocation', ['lengths', 'stock', 'built',
+  'remaining'])
+
+
+class _Inventory(object):
+    """
+    Spoke quantities by sorted length, with skip pointers over the
+    lengths that have run out, so that finding the shortest length
+    in stock above a given length takes amortized logarithmic time.
+    """
+    def __init__(self, inventory):
+        items = sorted((float(k), int(v)) for k, v in inventory.items())
+        self.lengths = np.array([k for k, v in items], dtype=float)
+        self.quantities = [v for k, v in items]
+        m = len(items)
+        self._next = [i if self.quantities[i] > 0 else i + 1
+          for i in range(m)] + [m]
+
+    def _find(self, i):
+        root = i
+        while self._next[root] != root:
+            root = self._next[root]
+        while self._next[i] != root:
+            self._next[i], i = root, self._next[i]
+        return root
+
+    def take(self, low, high, quantity):
+        """
+        Take the given quantity of spokes of the shortest length in
+        [low, high] that has that many in stock, and return the index
+        of that length, or return None if there is none.
+        Lengths that run out are skipped only after :meth:`commit`.
+        """
+        m = len(self.quantities)
+        i = self._find(int(np.searchsorted(self.lengths, low, 'left')))
+        while i < m and self.lengths[i] <= high:
+            if self.quantities[i] >= quantity:
+                self.quantities[i] -= quantity
+                return i
+            i = self._find(i + 1)
+        return None
+
+    def commit(self, i):
+        """
+        Skip the length of index i from now on if it has run out.
+        """
+        if not self.quantities[i]:
+            self._next[i] = i + 1
+
+def _allocate_sides(lengths, half, wheels, inventory, tolerance):
+    """
+    Allocate spokes from the given inventory to both sides of each of
+    the given wheels, taking the sides in increasing order of the
+    largest acceptable length, each the shortest acceptable length still
+    in stock, and return the pair (inventory left, dictionary of the
+    form (wheel, side) -> index of the length allocated).
+    """
+    inv = _Inventory(inventory)
+    sides = sorted((lengths[side][w] + tolerance, w, j, side)
+      for w in wheels for (j, side) in enumerate(['left', 'right']))
+    taken = {}
+    for (deadline, w, j, side) in sides:
+        x = lengths[side][w]
+        i = inv.take(x - tolerance, x + tolerance, int(half[w]))
+        if i is not None:
+            inv.commit(i)
+            taken[w, side] = i
+    return inv, taken
+
+def allocate(wheels, inventory, tolerance=1):
+    """
+    Allocate spokes from the given inventory, a dictionary of the form
+    spoke length -> quantity in stock, to the given wheels, a list of
+    Wheel objects or a WheelTable, and return the Allocation.
+
+    Each wheel side needs ``num_spokes // 2`` spokes of one stocked
+    length within ``tolerance`` millimeters of its computed spoke
+    length.
+    The wheel sides are allocated in increasing order of the largest
+    length acceptable on them, each the shortest acceptable length still
+    in stock, an earliest-deadline-first rule, which serves every side
+    whenever that is possible, if all the wheels have the same number of
+    spokes and the stock comes in multiples of half that number.
+    Wheels with a side left unserved are then dropped and the sides of
+    the other wheels allocated again, until every side is served.
+    Finally, each dropped wheel, in increasing order of the smaller of
+    the largest lengths acceptable on its two sides, is added back if
+    the sides of the wheels built so far and its own can all be served.
+    Spokes go only to wheels that are built, so the inventory used is
+    exactly the spokes of the built wheels.
+
+    Assume the wheel attributes needed by
+    :func:`bicyclator.main.spoke_length` are non-null.
+
+    Raise a ``ValueError``, if that is not the case.
+
+    EXAMPLES::
+
+        >>> from bicyclator.main import Wheel
+        >>> w = Wheel(center_to_flange={'left': 37.1, 'right': 20.9},
+        ...   flange_diameter={'left': 45, 'right': 45}, erd=560,
+        ...   offset=3, num_spokes=36)
+        >>> a = allocate([w, w.copy()], {269: 18, 270: 18, 272: 36})
+        >>> a.built
+        array([ True, False])
+        >>> a.stock['left'], a.stock['right']
+        (array([270.,  nan]), array([269.,  nan]))
+        >>> a.remaining
+        {269.0: 0, 270.0: 0, 272.0: 36}
+
+    Both sides of a wheel draw on the same stock, so allocating a wheel
+    at a time could give the first wheel below 270 and 271 and leave
+    nothing for the second::
+
+        >>> ws = [Wheel(center_to_flange={'left': l, 'right': r},
+        ...   flange_diameter={'left': 45, 'right': 45}, erd=557,
+        ...   offset=0, num_spokes=32) for l, r in [(20, 39), (30, 30)]]
+        >>> a = allocate(ws, {270: 16, 271: 16, 272: 16, 273: 16})
+        >>> a.lengths['left'].round(1), a.lengths['right'].round(1)
+        (array([270.1, 271. ]), array([272.2, 271. ]))
+        >>> a.built
+        array([ True,  True])
+        >>> a.stock['left'], a.stock['right']
+        (array([270., 271.]), array([273., 272.]))
+
+    """
+    if not isinstance(wheels, WheelTable):
+        wheels = WheelTable.from_wheels(list(wheels))
+    lengths = spoke_length(wheels)
+    half = wheels.columns['num_spokes']//2
+
+    def served(wheels, taken):
+        return [w for w in wheels
+          if (w, 'left') in taken and (w, 'right') in taken]
+
+    n = len(wheels)
+    active = list(range(n))
+    while True:
+        inv, taken = _allocate_sides(lengths, half, active, inventory,
+          tolerance)
+        kept = served(active, taken)
+        if len(kept) == len(active):
+            break
+        active = kept
+
+    deadline = np.minimum(lengths['left'], lengths['right']) + tolerance
+    dropped = sorted(set(range(n)) - set(active), key=lambda w: deadline[w])
+    for w in dropped:
+        result = _allocate_sides(lengths, half, active + [w], inventory,
+          tolerance)
+        if len(served(active + [w], result[1])) == len(active) + 1:
+            active.append(w)
+            inv, taken = result
+
+    stock = {side: np.full(n, np.nan) for side in lengths}
+    built = np.zeros(n, dtype=bool)
+    built[active] = True
+    for ((w, side), i) in taken.items():
+        stock[side][w] = inv.lengths[i]
+
+    remaining = dict(zip(inv.lengths.tolist(), inv.quantities))
+    return Allocation(lengths, stock, built, remaining)
@@ -0,0 +1,209 @@
+"""
+A versioned binary file format for catalogs of bicycles and wheels,
+that is, for BicycleTables and WheelTables (see :mod:`bicyclator.table`).
+Component catalogs fit too: a catalog of cassettes or chainrings is a
+BicycleTable with only cogs, and a catalog of rims or hubs is a
+WheelTable with only rim or hub columns.
+
+Files are loaded with ``mmap``, and the table columns are NumPy views
+of the mapped file, so loading copies nothing and takes constant time.
+Row views, and hence Bicycle and Wheel objects, are made only on
+demand, and the calculators of :mod:`bicyclator.batch` run directly on
+the mapped columns.
+
+Layout, with all integers little-endian:
+
+- header: the magic bytes ``FORMAT_MAGIC``, the format version (uint32),
+  the table kind (uint32, 0 for wheels and 1 for bicycles) and
+  the number of sections (uint32)
+- section directory: for each section, its name (32 bytes, NUL padded),
+  byte offset (uint64), byte length (uint64) and item count (uint64)
+- sections, each starting at a multiple of ``ALIGNMENT`` bytes:
+
+  - ``wheel_records``: one fixed-width record per wheel, of
+    ``record_dtype(WHEEL_COLUMNS)``
+  - ``wheel_strings``: the UTF-8 wheel names, concatenated
+  - for bicycles also ``bicycle_records``, ``bicycle_strings``, and
+    the ragged cog arrays ``front_cog_offsets``, ``front_cog_values``,
+    ``rear_cog_offsets`` and ``rear_cog_values``
+
+Each record holds its row's numeric columns, followed by the offset
+and length of its name in the string table, the length being -1 for
+no name.
+"""
+from collections.abc import Sequence
+import mmap
+import struct
+
+import numpy as np
+
+from .table import BicycleTable, WheelTable, WHEEL_COLUMNS,\
+  BICYCLE_COLUMNS
+
+
+FORMAT_MAGIC = b'BICYCAT\x00'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+_HEADER = struct.Struct('<8sIII')
+_SECTION = struct.Struct('<32sQQQ')
+_KINDS = {WheelTable: 0, BicycleTable: 1}
+
+def record_dtype(columns):
+    """
+    Return the little-endian structured NumPy dtype of the records
+    of a table with the given columns, a dictionary of the form
+    column name -> NumPy dtype.
+    """
+    fields = [(k, np.dtype(v).newbyteorder('<')) for k, v in columns.items()]
+    fields += [('name_offset', '<i8'), ('name_length', '<i4')]
+    return np.dtype(fields)
+
+
+class StringColumn(Sequence):
+    """
+    A read-only sequence of strings (or None) decoded on access
+    from a string table given as a NumPy array of bytes and arrays of
+    offsets and lengths.
+    """
+    def __init__(self, data, offsets, lengths):
+        self.data = data
+        self.offsets = offsets
+        self.lengths = lengths
+
+    def __len__(self):
+        return self.offsets.size
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        n = int(self.lengths[i])
+        if n < 0:
+            return None
+        start = int(self.offsets[i])
+        return self.data[start:start + n].tobytes().decode('utf-8')
+
+def _encode_names(names):
+    """
+    Return the triple (string table bytes, offsets, lengths) for the
+    given names.
+    """
+    encoded = [None if s is None else s.encode('utf-8') for s in names]
+    lengths = np.array([-1 if e is None else len(e) for e in encoded],
+      dtype='<i4')
+    offsets = np.zeros(len(encoded), dtype='<i8')
+    if len(encoded):
+        np.cumsum(np.maximum(lengths, 0)[:-1], out=offsets[1:])
+    return b''.join(e for e in encoded if e), offsets, lengths
+
+def _records(table, columns, prefix):
+    data, offsets, lengths = _encode_names(list(table.names))
+    records = np.zeros(len(table), dtype=record_dtype(columns))
+    for k in columns:
+        records[k] = table.columns[k]
+    records['name_offset'] = offsets
+    records['name_length'] = lengths
+    return {prefix + '_records': records,
+      prefix + '_strings': np.frombuffer(data, dtype=np.uint8)}
+
+def save(table, path):
+    """
+    Write the given BicycleTable or WheelTable to a file at the given path.
+    """
+    kind = _KINDS[type(table)]
+    if kind == 0:
+        sections = _records(table, WHEEL_COLUMNS, 'wheel')
+    else:
+        sections = _records(table.wheels, WHEEL_COLUMNS, 'wheel')
+        sections.update(_records(table, BICYCLE_COLUMNS, 'bicycle'))
+        for k in ['front_cog_offsets', 'rear_cog_offsets']:
+            sections[k] = getattr(table, k).astype('<i8')
+        for k in ['front_cog_values', 'rear_cog_values']:
+            sections[k] = getattr(table, k).astype('<i4')
+
+    offset = _HEADER.size + _SECTION.size*len(sections)
+    directory = []
+    for (name, a) in sections.items():
+        offset = -(-offset//ALIGNMENT)*ALIGNMENT
+        directory.append((name, offset, a.nbytes, a.size))
+        offset += a.nbytes
+
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(FORMAT_MAGIC, FORMAT_VERSION, kind,
+          len(sections)))
+        for (name, offset, nbytes, count) in directory:
+            f.write(_SECTION.pack(name.encode('ascii'), offset, nbytes,
+              count))
+        for ((name, offset, nbytes, count), a) in zip(directory,
+          sections.values()):
+            f.write(b'\x00'*(offset - f.tell()))
+            f.write(a.tobytes())
+
+def _load_records(buf, sections, columns, prefix):
+    offset, nbytes, count = sections[prefix + '_records']
+    records = np.frombuffer(buf, dtype=record_dtype(columns), count=count,
+      offset=offset)
+    offset, nbytes, count = sections[prefix + '_strings']
+    strings = np.frombuffer(buf, dtype=np.uint8, count=count, offset=offset)
+    names = StringColumn(strings, records['name_offset'],
+      records['name_length'])
+    return {k: records[k] for k in columns}, names
+
+def load(path):
+    """
+    Memory map the file at the given path, written by :func:`save`,
+    and return its BicycleTable or WheelTable, whose columns are views of
+    the mapped file and whose names are decoded on access.
+
+    Raise a ``ValueError`` if the file is not in this format or has an
+    unsupported version.
+
+    EXAMPLES::
+
+        >>> import os, tempfile
+        >>> from bicyclator.main import Bicycle, Wheel, gain_ratios
+        >>> w = Wheel(name='rear', diameter=600)
+        >>> t = BicycleTable.from_bicycles([Bicycle(name='b',
+        ...   front_cogs=[40], rear_cogs=[20, 30], crank_length=100,
+        ...   rear_wheel=w)])
+        >>> path = os.path.join(tempfile.mkdtemp(), 'catalog.bin')
+        >>> save(t, path)
+        >>> u = load(path)
+        >>> u[0].name, u[0].rear_wheel.name
+        ('b', 'rear')
+        >>> gain_ratios(u[0])
+        {(40, 20): 6.0, (40, 30): 4.0}
+
+    """
+    with open(path, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(buf) < _HEADER.size:
+        raise ValueError('{!s} is not a bicyclator catalog'.format(path))
+    magic, version, kind, num_sections = _HEADER.unpack_from(buf, 0)
+    if magic != FORMAT_MAGIC:
+        raise ValueError('{!s} is not a bicyclator catalog'.format(path))
+    if version != FORMAT_VERSION:
+        raise ValueError('{!s} has unsupported catalog format version '\
+          '{!s}'.format(path, version))
+
+    sections = {}
+    for i in range(num_sections):
+        name, offset, nbytes, count = _SECTION.unpack_from(buf,
+          _HEADER.size + i*_SECTION.size)
+        sections[name.rstrip(b'\x00').decode('ascii')] = (offset, nbytes,
+          count)
+
+    columns, names = _load_records(buf, sections, WHEEL_COLUMNS, 'wheel')
+    wheels = WheelTable(columns, names=names)
+    if kind == 0:
+        return wheels
+
+    columns, names = _load_records(buf, sections, BICYCLE_COLUMNS, 'bicycle')
+    cogs = {}
+    for (k, dtype) in [('front_cog_offsets', '<i8'),
+      ('front_cog_values', '<i4'), ('rear_cog_offsets', '<i8'),
+      ('rear_cog_values', '<i4')]:
+        offset, nbytes, count = sections[k]
+        cogs[k] = np.frombuffer(buf, dtype=dtype, count=count, offset=offset)
+    return BicycleTable(columns, wheels=wheels, names=names, **cogs)
@@ -0,0 +1,249 @@
+"""
+A persistent SQLite store of calculator results, for incremental runs
+over large catalogs.
+
+Results are keyed by a SHA-256 hash of the library version, the
+calculator name, the fingerprint of just the Bicycle or Wheel attributes
+the calculator depends on (see :mod:`bicyclator.cache`) and the
+calculator's other arguments.
+So renaming a bicycle, or changing an attribute the calculator ignores,
+keeps its stored results, and upgrading the library invalidates them all.
+Numbers are hashed as floats, so that a Bicycle object, a row of a
+BicycleTable and NumPy scalar arguments with equal values share keys.
+Results are stored as JSON tagged with their shape, so that they load
+back exactly, tuple keys and all.
+"""
+import copy
+import hashlib
+import json
+import numbers
+import sqlite3
+
+from . import main
+from ._version import __version__
+from .cache import DEPENDENCIES, fingerprint
+
+
+#: Maximum number of keys per lookup query
+QUERY_CHUNK_SIZE = 500
+
+def _encode(result):
+    if isinstance(result, dict) and result and\
+      isinstance(next(iter(result)), tuple):
+        return ['grid', [[f, r, v] for (f, r), v in result.items()]]
+    for (tag, kind) in [('dict', dict), ('tuple', tuple), ('list', list)]:
+        if isinstance(result, kind):
+            return [tag, result]
+    return ['value', result]
+
+def _decode(tag, value):
+    if tag == 'grid':
+        return {(f, r): v for f, r, v in value}
+    if tag == 'tuple':
+        return tuple(value)
+    return value
+
+def _plain(v):
+    """
+    Return the given key token with every number, NumPy scalars
+    included, as a float and every tuple as a list, for hashing as JSON.
+    """
+    if isinstance(v, (list, tuple)):
+        return [_plain(x) for x in v]
+    if isinstance(v, bool) or v is None or isinstance(v, str):
+        return v
+    if isinstance(v, numbers.Number):
+        return float(v)
+    if hasattr(v, 'item'):
+        return _plain(v.item())
+    return v
+
+def dumps(result):
+    """
+    Return the given calculator result as a JSON string tagged with its
+    shape: a gear grid, that is, a dictionary with (front cog, rear cog)
+    keys, a dictionary with string keys, a tuple, a list, or a number.
+
+    EXAMPLES::
+
+        >>> dumps({(40, 20): 2.0})
+        '["grid", [[40, 20, 2.0]]]'
+        >>> loads(_) == {(40, 20): 2.0}
+        True
+
+    """
+    return json.dumps(_encode(result))
+
+def loads(s):
+    """
+    Return the calculator result stored as the given JSON string.
+    """
+    return _decode(*json.loads(s))
+
+
+class ResultStore(object):
+    """
+    A store of calculator results in the SQLite database at the given
+    path, which is created if need be, for the given library version.
+
+    The calculators are those of :mod:`bicyclator.main` named in
+    ``bicyclator.cache.DEPENDENCIES``, such as ``'gear_ratios'``,
+    ``'gain_ratios'``, ``'trail'``, ``'spoke_length'`` and
+    ``'num_skid_patches'``.
+
+    EXAMPLES::
+
+        >>> import os, tempfile
+        >>> from bicyclator.main import Bicycle, Wheel
+        >>> path = os.path.join(tempfile.mkdtemp(), 'results.sqlite')
+        >>> w = Wheel(diameter=600)
+        >>> bs = [Bicycle(front_cogs=[40], rear_cogs=[20, c],
+        ...   crank_length=100, rear_wheel=w) for c in [25, 30]]
+        >>> with ResultStore(path) as store:
+        ...     results, missing = store.lookup('gain_ratios', bs, digits=1)
+        ...     missing
+        [0, 1]
+        >>> with ResultStore(path) as store:
+        ...     _ = store.compute('gain_ratios', bs[:1], digits=1)
+        ...     store.compute('gain_ratios', bs, digits=1)
+        [{(40, 20): 6.0, (40, 25): 4.8}, {(40, 20): 6.0, (40, 30): 4.0}]
+        >>> with ResultStore(path) as store:
+        ...     store.lookup('gain_ratios', bs, digits=1)[1]
+        []
+
+    """
+    def __init__(self, path, version=__version__):
+        self.path = path
+        self.version = version
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS results ('
+              'key TEXT PRIMARY KEY, calculator TEXT NOT NULL, '
+              'version TEXT NOT NULL, value TEXT NOT NULL) WITHOUT ROWID')
+
+    def __repr__(self):
+        return 'ResultStore({!r}, version={!r})'.format(self.path,
+          self.version)
+
+    def __len__(self):
+        return self.connection.execute(
+          'SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Close the database connection.
+        """
+        self.connection.close()
+
+    def key(self, calculator, obj, *args, **kwargs):
+        """
+        Return the hexadecimal key of the result of the given calculator
+        on the given Bicycle or Wheel object and other arguments.
+
+        Raise a ``ValueError`` if the calculator is unknown.
+
+        EXAMPLES::
+
+            >>> import numpy as np
+            >>> from bicyclator.main import Bicycle, Wheel
+            >>> from bicyclator.table import BicycleTable
+            >>> b = Bicycle(front_cogs=[40], rear_cogs=[20, 30],
+            ...   crank_length=100, rear_wheel=Wheel(diameter=600))
+            >>> row = BicycleTable.from_bicycles([b])[0]
+            >>> store = ResultStore(':memory:')
+            >>> k = store.key('gain_ratios', row, digits=np.int64(1))
+            >>> k == store.key('gain_ratios', b, digits=1)
+            True
+
+        """
+        if calculator not in DEPENDENCIES:
+            raise ValueError("Unknown calculator '{!s}'".format(calculator))
+        token = (self.version, calculator,
+          fingerprint(obj, DEPENDENCIES[calculator]), args,
+          tuple(sorted(kwargs.items())))
+        s = json.dumps(_plain(token), sort_keys=True, default=repr)
+        return hashlib.sha256(s.encode('utf-8')).hexdigest()
+
+    def get_many(self, keys):
+        """
+        Return a dictionary of the form key -> result for the given keys
+        that are stored.
+        """
+        keys = list(keys)
+        result = {}
+        for i in range(0, len(keys), QUERY_CHUNK_SIZE):
+            chunk = keys[i:i + QUERY_CHUNK_SIZE]
+            rows = self.connection.execute(
+              'SELECT key, value FROM results WHERE key IN ({!s})'.format(
+              ', '.join('?'*len(chunk))), chunk)
+            for (k, v) in rows:
+                result[k] = loads(v)
+        return result
+
+    def put_many(self, calculator, items):
+        """
+        Store the given (key, result) pairs of the given calculator
+        in one transaction, replacing any stored results of those keys.
+        """
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO results '
+              'VALUES (?, ?, ?, ?)', ((k, calculator, self.version, dumps(v))
+              for k, v in items))
+
+    def lookup(self, calculator, objects, *args, **kwargs):
+        """
+        Look up the results of the given calculator on each of the given
+        Bicycle or Wheel objects with the given other arguments, and
+        return the pair (results, missing), where results is a list with
+        one result per object, None if not stored, and missing is the
+        list of indices of the objects whose results are not stored.
+        Objects with the same key get copies of one result.
+        """
+        keys = [self.key(calculator, obj, *args, **kwargs)
+          for obj in objects]
+        found = self.get_many(set(keys))
+        seen = set()
+        results = []
+        for k in keys:
+            results.append(copy.deepcopy(found.get(k)) if k in seen
+              else found.get(k))
+            seen.add(k)
+        missing = [i for i, k in enumerate(keys) if k not in found]
+        return results, missing
+
+    def compute(self, calculator, objects, *args, **kwargs):
+        """
+        Return the list of results of the given calculator on each of the
+        given Bicycle or Wheel objects with the given other arguments,
+        computing and storing only the results not stored yet, once per
+        distinct key, and giving objects with the same key copies of one
+        result.
+        """
+        objects = list(objects)
+        results, missing = self.lookup(calculator, objects, *args, **kwargs)
+        func = getattr(main, calculator)
+        computed = {}
+        for i in missing:
+            k = self.key(calculator, objects[i], *args, **kwargs)
+            if k not in computed:
+                computed[k] = results[i] = func(objects[i], *args, **kwargs)
+            else:
+                results[i] = copy.deepcopy(computed[k])
+        self.put_many(calculator, computed.items())
+        return results
+
+    def prune(self):
+        """
+        Delete the results stored for other library versions, and return
+        the number deleted.
+        """
+        with self.connection:
+            cursor = self.connection.execute(
+              'DELETE FROM results WHERE version != ?', (self.version,))
+        return cursor.rowcount
@@ -0,0 +1,411 @@
+"""
+Columnar (struct-of-arrays) storage for many bicycles and wheels.
+
+A WheelTable holds one fixed-width NumPy column per numeric Wheel
+attribute, with the left and right entries of ``center_to_flange``
+and ``flange_diameter`` split into their own columns.
+A BicycleTable holds one column per numeric Bicycle attribute,
+its cogs as ragged arrays (offsets plus values), and its wheels as
+row indices into a WheelTable.
+
+Missing values are stored as NaN in float columns and -1 in integer
+columns, and read back as None.
+Indexing a table returns a row view that reads straight from the columns
+and behaves like a Bicycle or Wheel, so it can be passed to the
+calculators in :mod:`bicyclator.main`; the calculators in
+:mod:`bicyclator.batch` accept whole tables.
+"""
+import numpy as np
+
+from .main import Bicycle, Wheel
+
+
+#: Wheel column name -> NumPy dtype
+WHEEL_COLUMNS = {
+    'bsd': np.float64,
+    'erd': np.float64,
+    'tire_width': np.float64,
+    'diameter': np.float64,
+    'center_to_flange_left': np.float64,
+    'center_to_flange_right': np.float64,
+    'flange_diameter_left': np.float64,
+    'flange_diameter_right': np.float64,
+    'spoke_hole_diameter': np.float64,
+    'num_spokes': np.int32,
+    'num_crosses': np.int32,
+    'offset': np.float64,
+}
+
+#: Bicycle column name -> NumPy dtype, excluding the cog columns
+BICYCLE_COLUMNS = {
+    'head_tube_angle': np.float64,
+    'fork_rake': np.float64,
+    'crank_length': np.float64,
+    'front_wheel': np.int64,
+    'rear_wheel': np.int64,
+}
+
+def _to_column(values, dtype):
+    if np.issubdtype(dtype, np.integer):
+        values = [-1 if v is None else v for v in values]
+    else:
+        values = [np.nan if v is None else v for v in values]
+    return np.array(values, dtype=dtype)
+
+def _from_column(column, i):
+    v = column[i].item()
+    if isinstance(v, float) and v != v:
+        return None
+    if isinstance(v, int) and v < 0 and column.dtype.kind == 'i':
+        return None
+    return v
+
+def _check_column(column, attr):
+    if column.dtype.kind == 'i':
+        bad = np.flatnonzero(column < 0)
+    else:
+        bad = np.flatnonzero(np.isnan(column))
+    if bad.size:
+        raise ValueError("Attribute '{!s}' "\
+          "must not be None or empty in row {!s}".format(attr, bad[0]))
+
+def ragged_to_padded(offsets, values):
+    """
+    Given the offsets and values of a ragged array, return the float
+    array with one row per ragged row, padded with NaN.
+
+    EXAMPLES::
+
+        >>> ragged_to_padded(np.array([0, 2, 3]), np.array([28, 42, 34]))
+        array([[28., 42.],
+               [34., nan]])
+
+    """
+    lengths = np.diff(offsets)
+    n = lengths.size
+    m = int(lengths.max()) if n else 0
+    result = np.full((n, m), np.nan)
+    rows = np.repeat(np.arange(n), lengths)
+    cols = np.arange(values.size) - np.repeat(offsets[:-1], lengths)
+    result[rows, cols] = values[offsets[0]:offsets[-1]]
+    return result
+
+
+class WheelTable(object):
+    """
+    Columnar storage for many wheels.
+
+    Attributes:
+
+    - names: list of wheel names
+    - columns: dictionary of the form column name -> NumPy array,
+      with one entry per wheel and the column names and dtypes
+      of ``WHEEL_COLUMNS``
+    """
+    def __init__(self, columns, names=None):
+        if names is not None:
+            n = len(names)
+        elif columns:
+            n = len(next(iter(columns.values())))
+        else:
+            n = 0
+        self.columns = {}
+        for (k, dtype) in WHEEL_COLUMNS.items():
+            if k in columns:
+                self.columns[k] = np.asarray(columns[k], dtype=dtype)
+            else:
+                self.columns[k] = _to_column([None]*n, dtype)
+        if names is None:
+            names = [None]*n
+        self.names = names
+
+    @classmethod
+    def from_wheels(cls, wheels):
+        """
+        Return a WheelTable holding the given Wheel objects.
+
+        EXAMPLES::
+
+            >>> t = WheelTable.from_wheels([Wheel(name='a', erd=560),
+            ...   Wheel(name='b', diameter=700)])
+            >>> len(t), t[1].diameter, t[1].erd
+            (2, 700.0, None)
+
+        """
+        columns = {}
+        for (k, dtype) in WHEEL_COLUMNS.items():
+            if k.endswith('_left') or k.endswith('_right'):
+                attr, side = k.rsplit('_', 1)
+                values = [getattr(w, attr)[side] for w in wheels]
+            else:
+                values = [getattr(w, k) for w in wheels]
+            columns[k] = _to_column(values, dtype)
+        return cls(columns, names=[w.name for w in wheels])
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, i):
+        if not -len(self) <= i < len(self):
+            raise IndexError('wheel table index out of range')
+        return WheelView(self, i % len(self))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield WheelView(self, i)
+
+    def __repr__(self):
+        return 'WheelTable with {!s} wheels'.format(len(self))
+
+    def to_wheels(self):
+        """
+        Return a list of Wheel objects, one for each row of this table.
+        """
+        return [v.copy() for v in self]
+
+    def arrays(self, attrs):
+        """
+        Return a dictionary of the form column name -> NumPy array
+        for the given column names.
+
+        Raise a ``ValueError`` if any of the columns contain
+        missing values.
+        """
+        result = {}
+        for attr in attrs:
+            _check_column(self.columns[attr], attr)
+            result[attr] = self.columns[attr]
+        return result
+
+
+class WheelView(object):
+    """
+    A read-only view of one row of a WheelTable that behaves like a Wheel.
+    """
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    def __getattr__(self, attr):
+        t = self.table
+        i = self.index
+        if attr == 'name':
+            return t.names[i]
+        if attr in ['center_to_flange', 'flange_diameter']:
+            return {side: _from_column(t.columns[attr + '_' + side], i)
+              for side in ['left', 'right']}
+        if attr in t.columns:
+            return _from_column(t.columns[attr], i)
+        raise AttributeError(attr)
+
+    def __repr__(self):
+        return repr(self.copy())
+
+    def copy(self):
+        """
+        Return this row as a Wheel.
+        """
+        kwargs = {k: getattr(self, k) for k in ['name', 'bsd', 'erd',
+          'tire_width', 'diameter', 'center_to_flange', 'flange_diameter',
+          'spoke_hole_diameter', 'num_spokes', 'num_crosses', 'offset']}
+        return Wheel(**kwargs)
+
+
+class BicycleTable(object):
+    """
+    Columnar storage for many bicycles.
+
+    Attributes:
+
+    - names: list of bicycle names
+    - columns: dictionary of the form column name -> NumPy array,
+      with one entry per bicycle and the column names and dtypes of
+      ``BICYCLE_COLUMNS``; the wheel columns hold row indices into
+      ``wheels``
+    - front_cog_offsets, front_cog_values: ragged array of front cogs;
+      the front cogs of bicycle ``i`` are
+      ``front_cog_values[front_cog_offsets[i]:front_cog_offsets[i + 1]]``
+    - rear_cog_offsets, rear_cog_values: ragged array of rear cogs
+    - wheels: WheelTable of the wheels used
+    """
+    def __init__(self, columns, front_cog_offsets, front_cog_values,
+      rear_cog_offsets, rear_cog_values, wheels, names=None):
+        n = len(front_cog_offsets) - 1
+        self.columns = {}
+        for (k, dtype) in BICYCLE_COLUMNS.items():
+            if k in columns:
+                self.columns[k] = np.asarray(columns[k], dtype=dtype)
+            else:
+                self.columns[k] = _to_column([None]*n, dtype)
+        self.front_cog_offsets = np.asarray(front_cog_offsets,
+          dtype=np.int64)
+        self.front_cog_values = np.asarray(front_cog_values, dtype=np.int32)
+        self.rear_cog_offsets = np.asarray(rear_cog_offsets, dtype=np.int64)
+        self.rear_cog_values = np.asarray(rear_cog_values, dtype=np.int32)
+        self.wheels = wheels
+        if names is None:
+            names = [None]*n
+        self.names = names
+
+    @classmethod
+    def from_bicycles(cls, bicycles):
+        """
+        Return a BicycleTable holding the given Bicycle objects.
+        Wheel objects shared between bicycles are stored once.
+
+        EXAMPLES::
+
+            >>> w = Wheel(diameter=600)
+            >>> bs = [Bicycle(front_cogs=[40], rear_cogs=[20, 30],
+            ...   crank_length=100, rear_wheel=w, front_wheel=w),
+            ...   Bicycle(front_cogs=[30, 45], rear_cogs=[15])]
+            >>> t = BicycleTable.from_bicycles(bs)
+            >>> len(t), len(t.wheels)
+            (2, 3)
+            >>> t[0].rear_cogs, t[0].rear_wheel.diameter
+            ([20, 30], 600.0)
+
+        """
+        wheels = []
+        wheel_index = {}
+        columns = {k: [] for k in BICYCLE_COLUMNS}
+        for b in bicycles:
+            for k in ['front_wheel', 'rear_wheel']:
+                w = getattr(b, k)
+                if w is None:
+                    columns[k].append(None)
+                    continue
+                if id(w) not in wheel_index:
+                    wheel_index[id(w)] = len(wheels)
+                    wheels.append(w)
+                columns[k].append(wheel_index[id(w)])
+            for k in ['head_tube_angle', 'fork_rake', 'crank_length']:
+                columns[k].append(getattr(b, k))
+        columns = {k: _to_column(v, BICYCLE_COLUMNS[k])
+          for k, v in columns.items()}
+
+        cogs = {}
+        for k in ['front_cogs', 'rear_cogs']:
+            lists = [getattr(b, k) for b in bicycles]
+            offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+            np.cumsum([len(c) for c in lists], out=offsets[1:])
+            values = [c for cs in lists for c in cs]
+            cogs[k] = (offsets, np.array(values, dtype=np.int32))
+
+        return cls(columns, *cogs['front_cogs'], *cogs['rear_cogs'],
+          WheelTable.from_wheels(wheels),
+          names=[b.name for b in bicycles])
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, i):
+        if not -len(self) <= i < len(self):
+            raise IndexError('bicycle table index out of range')
+        return BicycleView(self, i % len(self))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield BicycleView(self, i)
+
+    def __repr__(self):
+        return 'BicycleTable with {!s} bicycles'.format(len(self))
+
+    def to_bicycles(self):
+        """
+        Return a list of Bicycle objects, one for each row of this table.
+        """
+        return [v.copy() for v in self]
+
+    def wheel_column(self, wheel, attr):
+        """
+        Return the column of the given wheel attribute (e.g.
+        ``'diameter'``) for the given wheel (``'front_wheel'`` or
+        ``'rear_wheel'``) of each bicycle, with NaN or -1 for bicycles
+        without that wheel.
+        """
+        idx = self.columns[wheel]
+        column = self.wheels.columns[attr]
+        if column.size == 0:
+            return _to_column([None]*len(self), column.dtype)
+        missing = np.nan if column.dtype.kind == 'f' else -1
+        return np.where(idx >= 0, column[idx], missing)
+
+    def arrays(self, attrs):
+        """
+        Return a dictionary of the form attribute -> NumPy array
+        for the given attributes, as in
+        :func:`bicyclator.batch.bicycle_arrays`.
+        The attributes ``'front_wheel_diameter'`` and
+        ``'rear_wheel_diameter'`` are read from the wheels and
+        the cog attributes are padded with NaN.
+
+        Raise a ``ValueError`` if any of the attributes contain
+        missing values or empty cog lists.
+        """
+        result = {}
+        for attr in attrs:
+            if attr in ['front_cogs', 'rear_cogs']:
+                prefix = attr[:-1]
+                offsets = getattr(self, prefix + '_offsets')
+                values = getattr(self, prefix + '_values')
+                empty = np.flatnonzero(np.diff(offsets) == 0)
+                if empty.size:
+                    raise ValueError("Attribute '{!s}' must not be None "\
+                      "or empty in row {!s}".format(attr, empty[0]))
+                result[attr] = ragged_to_padded(offsets, values)
+            elif attr.endswith('_wheel_diameter'):
+                column = self.wheel_column(attr[:-len('_diameter')],
+                  'diameter')
+                _check_column(column, attr)
+                result[attr] = column
+            else:
+                _check_column(self.columns[attr], attr)
+                result[attr] = self.columns[attr]
+        return result
+
+
+class BicycleView(object):
+    """
+    A read-only view of one row of a BicycleTable that behaves like
+    a Bicycle.
+    """
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    def __getattr__(self, attr):
+        t = self.table
+        i = self.index
+        if attr == 'name':
+            return t.names[i]
+        if attr in ['front_cogs', 'rear_cogs']:
+            offsets = getattr(t, attr[:-1] + '_offsets')
+            values = getattr(t, attr[:-1] + '_values')
+            return values[offsets[i]:offsets[i + 1]].tolist()
+        if attr in ['front_wheel', 'rear_wheel']:
+            j = t.columns[attr][i]
+            if j < 0:
+                return None
+            return WheelView(t.wheels, int(j))
+        if attr in t.columns:
+            return _from_column(t.columns[attr], i)
+        raise AttributeError(attr)
+
+    def __repr__(self):
+        return Bicycle.__repr__(self)
+
+    def copy(self):
+        """
+        Return this row as a Bicycle.
+        """
+        kwargs = {k: getattr(self, k) for k in ['name', 'head_tube_angle',
+          'fork_rake', 'crank_length', 'front_cogs', 'rear_cogs']}
+        for k in ['front_wheel', 'rear_wheel']:
+            w = getattr(self, k)
+            kwargs[k] = None if w is None else w.copy()
+        return Bicycle(**kwargs)
@@ -0,0 +1,158 @@
+"""
+Streaming inference of the gear a rider used at each sample of a
+ride telemetry file.
+
+At speed ``v`` (kilometers per hour) and cadence ``c`` (hertz), the
+relationship of :func:`bicyclator.main.speed_to_cadences` gives the
+gain ratio ``v/(2*pi*crank_length*c*(3600/1e6))`` in use, and the
+inferred gear is the one with the nearest gain ratio.
+
+Telemetry is read in fixed-size chunks, either from CSV files through a
+buffered reader or from binary files of ``TELEMETRY_DTYPE`` records
+through a memory map, annotated one chunk at a time, and written
+out incrementally, so memory use does not grow with the length of the
+ride.
+"""
+from math import pi
+from itertools import islice
+import csv
+
+import numpy as np
+
+from .gear_table import gain_ratio_table
+
+
+#: NumPy dtype of the records of a binary telemetry file
+TELEMETRY_DTYPE = np.dtype([('speed', '<f8'), ('cadence', '<f8')])
+
+#: NumPy dtype of the annotated samples, where front and rear cog are -1
+#: for samples without pedalling or movement and ``gain_ratio_error``
+#: is the relative difference between the observed gain ratio and that
+#: of the inferred gear
+ANNOTATION_DTYPE = np.dtype([('speed', '<f8'), ('cadence', '<f8'),
+  ('front_cog', '<i4'), ('rear_cog', '<i4'), ('gain_ratio_error', '<f8')])
+
+def read_csv_chunks(path, chunk_size=65536, speed_column='speed',
+  cadence_column='cadence', buffer_size=1 << 20):
+    """
+    Read the CSV file at the given path, which has a header row naming
+    its speed and cadence columns, and generate arrays of
+    ``TELEMETRY_DTYPE`` of at most ``chunk_size`` samples each.
+    Empty speed or cadence fields are read as NaN.
+    """
+    with open(path, newline='', buffering=buffer_size) as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        i = header.index(speed_column)
+        j = header.index(cadence_column)
+        while True:
+            rows = list(islice(reader, chunk_size))
+            if not rows:
+                break
+            chunk = np.empty(len(rows), dtype=TELEMETRY_DTYPE)
+            chunk['speed'] = [float(r[i] or 'nan') for r in rows]
+            chunk['cadence'] = [float(r[j] or 'nan') for r in rows]
+            yield chunk
+
+def read_binary_chunks(path, chunk_size=1 << 20):
+    """
+    Memory map the binary file of ``TELEMETRY_DTYPE`` records at the
+    given path and generate views of at most ``chunk_size`` records each.
+    """
+    with open(path, 'rb') as f:
+        f.seek(0, 2)
+        if f.tell() < TELEMETRY_DTYPE.itemsize:
+            return
+    records = np.memmap(path, dtype=TELEMETRY_DTYPE, mode='r')
+    for start in range(0, records.size, chunk_size):
+        yield records[start:start + chunk_size]
+
+def infer_gears(bicycle, chunks):
+    """
+    Given a Bicycle object and an iterable of telemetry chunks, that is,
+    arrays with ``'speed'`` (kilometers per hour) and ``'cadence'``
+    (hertz) fields, generate arrays of ``ANNOTATION_DTYPE``, one per
+    chunk, labelling each sample with the gear whose gain ratio is
+    nearest the observed one.
+
+    Same assumptions as :func:`bicyclator.main.gain_ratios`.
+
+    EXAMPLES::
+
+        >>> from bicyclator.main import Bicycle, Wheel
+        >>> w = Wheel(diameter=600)
+        >>> b = Bicycle(front_cogs=[40], rear_cogs=[20, 30],
+        ...   crank_length=100, rear_wheel=w)
+        >>> chunk = np.array([(27.1, 2), (18, 2), (10, 0)],
+        ...   dtype=TELEMETRY_DTYPE)
+        >>> a = next(infer_gears(b, [chunk]))
+        >>> a['rear_cog'].tolist()
+        [20, 30, -1]
+
+    """
+    table = gain_ratio_table(bicycle)
+    k = 2*pi*bicycle.crank_length*(3600/1e6)
+    for chunk in chunks:
+        speed = np.asarray(chunk['speed'], dtype=float)
+        cadence = np.asarray(chunk['cadence'], dtype=float)
+        valid = (speed > 0) & (cadence > 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            gain = np.where(valid, speed/(k*cadence), np.nan)
+        i = table.nearest_positions(np.where(valid, gain, 0))
+
+        result = np.empty(speed.size, dtype=ANNOTATION_DTYPE)
+        result['speed'] = speed
+        result['cadence'] = cadence
+        result['front_cog'] = np.where(valid, table.front_cogs[i], -1)
+        result['rear_cog'] = np.where(valid, table.rear_cogs[i], -1)
+        result['gain_ratio_error'] = gain/table.values[i] - 1
+        yield result
+
+def write_csv(annotations, path):
+    """
+    Write the given iterable of arrays of ``ANNOTATION_DTYPE`` to a CSV
+    file at the given path one array at a time, and return the number of
+    samples written.
+    """
+    n = 0
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(ANNOTATION_DTYPE.names)
+        for a in annotations:
+            writer.writerows(a.tolist())
+            n += a.size
+    return n
+
+def write_binary(annotations, path):
+    """
+    Write the given iterable of arrays of ``ANNOTATION_DTYPE`` to a
+    binary file of ``ANNOTATION_DTYPE`` records at the given path one
+    array at a time, and return the number of samples written.
+    """
+    n = 0
+    with open(path, 'wb') as f:
+        for a in annotations:
+            f.write(np.ascontiguousarray(a, dtype=ANNOTATION_DTYPE).tobytes())
+            n += a.size
+    return n
+
+def annotate_file(bicycle, in_path, out_path, chunk_size=65536, **kwargs):
+    """
+    Infer the gears of the given Bicycle object for the telemetry file at
+    ``in_path`` and write the annotations to ``out_path``, streaming
+    chunks of ``chunk_size`` samples.
+    Files ending in ``.csv`` are read with :func:`read_csv_chunks`
+    (passing on the keyword arguments) and written with
+    :func:`write_csv`; other files are read with
+    :func:`read_binary_chunks` and written with :func:`write_binary`.
+    Return the number of samples written.
+    """
+    if str(in_path).endswith('.csv'):
+        chunks = read_csv_chunks(in_path, chunk_size=chunk_size, **kwargs)
+    else:
+        chunks = read_binary_chunks(in_path, chunk_size=chunk_size)
+    annotations = infer_gears(bicycle, chunks)
+    if str(out_path).endswith('.csv'):
+        return write_csv(annotations, out_path)
+    else:
+        return write_binary(annotations, out_path)
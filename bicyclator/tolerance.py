@@ -0,0 +1,235 @@
+"""
+Monte Carlo tolerance analysis of :func:`bicyclator.main.spoke_length`
+and :func:`bicyclator.main.trail`.
+
+Each measured input is drawn from a normal distribution centered on its
+nominal value, with the given standard deviation, using a NumPy random
+generator, and the vectorized formulas of :mod:`bicyclator.batch` are
+evaluated on fixed-size chunks of samples.
+Only running statistics are kept between chunks, so memory stays bounded
+however many samples are drawn:
+
+- a fixed-bin histogram of each output, from which quantiles are
+  interpolated, with bins spanning ten standard deviations either side
+  of the mean of the first chunk plus one overflow bin each side
+- running sums of each input, each output, and their squares and
+  products, from which means, standard deviations and correlations
+  are computed
+
+Inputs are ranked by the absolute value of their correlation with each
+output; for nearly linear responses such as these, the squared
+correlations are the shares of the output variance due to each input.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from .table import BicycleTable, WheelTable
+from .batch import spoke_length_array, trail_array
+
+
+#: The simulated distribution of one output:
+#:
+#: - mean, std: mean and standard deviation
+#: - quantiles: dictionary of the form probability -> quantile
+#: - sensitivity: list of pairs (input attribute, correlation with the
+#:   output), in decreasing order of absolute correlation
+Distribution = namedtuple('Distribution', ['mean', 'std', 'quantiles',
+  'sensitivity'])
+
+
+class _Accumulator(object):
+    """
+    Running histogram and sums of one output and its correlations with
+    the varied inputs, centered on a pilot chunk of samples for accuracy.
+    """
+    def __init__(self, pilot, inputs, bins):
+        self.center = pilot.mean()
+        spread = 10*pilot.std() or 1e-9*(abs(self.center) + 1)
+        self.low = self.center - spread
+        self.width = 2*spread/bins
+        self.bins = bins
+        self.counts = np.zeros(bins + 2, dtype=np.int64)
+        self.min = np.inf
+        self.max = -np.inf
+        self.n = 0
+        self.sy = 0.0
+        self.syy = 0.0
+        self.sx = dict.fromkeys(inputs, 0.0)
+        self.sxx = dict.fromkeys(inputs, 0.0)
+        self.sxy = dict.fromkeys(inputs, 0.0)
+
+    def add(self, y, deviations):
+        i = np.floor((y - self.low)/self.width)
+        i = np.clip(i, -1, self.bins).astype(np.int64) + 1
+        self.counts += np.bincount(i, minlength=self.bins + 2)
+        self.min = min(self.min, y.min())
+        self.max = max(self.max, y.max())
+        d = y - self.center
+        self.n += y.size
+        self.sy += d.sum()
+        self.syy += d @ d
+        for (k, x) in deviations.items():
+            self.sx[k] += x.sum()
+            self.sxx[k] += x @ x
+            self.sxy[k] += x @ d
+
+    def quantile(self, q):
+        if q <= 0:
+            return float(self.min)
+        cum = np.cumsum(self.counts)
+        t = q*self.n
+        j = int(np.searchsorted(cum, t, 'left'))
+        before = cum[j - 1] if j else 0
+        lo = self.min if j == 0 else self.low + self.width*(j - 1)
+        hi = self.max if j > self.bins else self.low + self.width*j
+        value = lo + (t - before)/self.counts[j]*(hi - lo)
+        return float(min(max(value, self.min), self.max))
+
+    def distribution(self, quantiles):
+        n = self.n
+        my = self.sy/n
+        var_y = max(self.syy/n - my**2, 0.0)
+        sensitivity = []
+        for k in self.sx:
+            mx = self.sx[k]/n
+            var_x = self.sxx[k]/n - mx**2
+            cov = self.sxy[k]/n - mx*my
+            corr = cov/np.sqrt(var_x*var_y) if var_x > 0 and var_y > 0\
+              else 0.0
+            sensitivity.append((k, float(corr)))
+        sensitivity.sort(key=lambda p: -abs(p[1]))
+        return Distribution(float(self.center + my), float(np.sqrt(var_y)),
+          {q: self.quantile(q) for q in quantiles}, sensitivity)
+
+def simulate(kernel, nominal, tolerances, num_samples=10**6,
+  quantiles=(0.025, 0.5, 0.975), chunk_size=2**18, bins=2**14, seed=None):
+    """
+    Simulate the outputs of the given vectorized kernel, a function of
+    keyword arguments returning a dictionary of the form
+    output name -> array, with the inputs drawn from normal distributions
+    centered on the values of the dictionary ``nominal`` with the
+    standard deviations of the dictionary ``tolerances``.
+    Draw ``num_samples`` samples of each input in chunks of
+    ``chunk_size`` from ``np.random.default_rng(seed)``, and return
+    a dictionary of the form output name -> Distribution.
+
+    Raise a ``ValueError`` if a tolerance is given for an attribute
+    that is not an input.
+
+    EXAMPLES::
+
+        >>> d = simulate(lambda x, y: {'sum': x + y}, {'x': 1, 'y': 2},
+        ...   {'x': 0.3, 'y': 0.4}, num_samples=10**5, seed=0)['sum']
+        >>> round(d.mean, 2), round(d.std, 2)
+        (3.0, 0.5)
+        >>> [k for k, corr in d.sensitivity]
+        ['y', 'x']
+
+    """
+    for k in tolerances:
+        if k not in nominal:
+            raise ValueError("Can't vary attribute '{!s}'".format(k))
+    varied = [k for k, sd in tolerances.items() if sd]
+    rng = np.random.default_rng(seed)
+    accumulators = None
+    done = 0
+    while done < num_samples:
+        m = min(chunk_size, num_samples - done)
+        deviations = {k: tolerances[k]*rng.standard_normal(m)
+          for k in varied}
+        args = dict(nominal)
+        for (k, x) in deviations.items():
+            args[k] = nominal[k] + x
+        outputs = {name: np.broadcast_to(y, (m,))
+          for name, y in kernel(**args).items()}
+        if accumulators is None:
+            accumulators = {name: _Accumulator(y, varied, bins)
+              for name, y in outputs.items()}
+        for (name, y) in outputs.items():
+            accumulators[name].add(y, deviations)
+        done += m
+    return {name: a.distribution(quantiles)
+      for name, a in accumulators.items()}
+
+def spoke_length_tolerance(wheel, tolerances, **kwargs):
+    """
+    Simulate the left and right spoke lengths of the given Wheel object
+    under the given measurement tolerances, a dictionary of the form
+    attribute -> standard deviation, and return a dictionary of the form
+    side -> Distribution.
+    The attributes that can vary are ``erd``, ``spoke_hole_diameter``,
+    ``offset`` and the sides of ``center_to_flange`` and
+    ``flange_diameter``, e.g. ``'center_to_flange_left'``.
+    The keyword arguments are those of :func:`simulate`.
+
+    Assume the wheel attributes needed by
+    :func:`bicyclator.main.spoke_length` are non-null.
+
+    Raise a ``ValueError``, if that is not the case, or if a tolerance
+    is given for another attribute, such as the integer ``num_spokes``
+    or ``num_crosses``.
+
+    EXAMPLES::
+
+        >>> from bicyclator.main import Wheel
+        >>> w = Wheel(center_to_flange={'left': 37.1, 'right': 20.9},
+        ...   flange_diameter={'left': 45, 'right': 45}, erd=560,
+        ...   offset=3, num_spokes=36)
+        >>> d = spoke_length_tolerance(w, {'erd': 1,
+        ...   'center_to_flange_right': 0.5}, num_samples=10**5, seed=0)
+        >>> round(d['right'].mean, 1), round(d['right'].std, 2)
+        (269.2, 0.5)
+        >>> [k for k, corr in d['right'].sensitivity]
+        ['erd', 'center_to_flange_right']
+        >>> spoke_length_tolerance(w, {'num_spokes': 1})
+        Traceback (most recent call last):
+        ...
+        ValueError: Can't vary attribute 'num_spokes'
+
+    """
+    varying = ['center_to_flange_left', 'center_to_flange_right',
+      'flange_diameter_left', 'flange_diameter_right', 'erd',
+      'spoke_hole_diameter', 'offset']
+    for k in tolerances:
+        if k not in varying:
+            raise ValueError("Can't vary attribute '{!s}'".format(k))
+    attrs = varying + ['num_spokes', 'num_crosses']
+    t = WheelTable.from_wheels([wheel])
+    nominal = {k: float(v[0]) for k, v in t.arrays(attrs).items()}
+    return simulate(spoke_length_array, nominal, tolerances, **kwargs)
+
+def trail_tolerance(bicycle, tolerances, **kwargs):
+    """
+    Simulate the trail, mechanical trail and wheel flop of the given
+    Bicycle object under the given measurement tolerances, a dictionary
+    of the form attribute -> standard deviation, and return a dictionary
+    with the keys ``'trail'``, ``'mechanical_trail'`` and
+    ``'wheel_flop'`` and Distribution values.
+    The attributes that can vary are ``head_tube_angle``, ``fork_rake``
+    and ``front_wheel_diameter``.
+    The keyword arguments are those of :func:`simulate`.
+
+    Assume the bicycle attributes needed by
+    :func:`bicyclator.main.trail` are non-null.
+
+    Raise a ``ValueError``, if that is not the case.
+
+    EXAMPLES::
+
+        >>> from bicyclator.main import Bicycle, Wheel
+        >>> b = Bicycle(head_tube_angle=73, fork_rake=64,
+        ...   front_wheel=Wheel(diameter=700))
+        >>> d = trail_tolerance(b, {'head_tube_angle': 0.5,
+        ...   'fork_rake': 1}, num_samples=10**5, seed=0)['trail']
+        >>> round(d.mean, 1), [k for k, corr in d.sensitivity]
+        (40.1, ['head_tube_angle', 'fork_rake'])
+
+    """
+    attrs = ['head_tube_angle', 'fork_rake', 'front_wheel_diameter']
+    t = BicycleTable.from_bicycles([bicycle])
+    nominal = {k: float(v[0]) for k, v in t.arrays(attrs).items()}
+    def kernel(head_tube_angle, fork_rake, front_wheel_diameter):
+        return dict(zip(['trail', 'mechanical_trail', 'wheel_flop'],
+          trail_array(head_tube_angle, fork_rake, front_wheel_diameter)))
+    return simulate(kernel, nominal, tolerances, **kwargs)
@@ -2,25 +2,27 @@ from setuptools import setup, find_packages
 
 
 # Import ``__version__`` variable
-exec(open('mustaching/_version.py').read())
+exec(open('bicyclator/_version.py').read())
 
 with open('README.rst') as f:
     readme = f.read()
 
-with open('LICENSE.txt') as f:
+with open('LICENSE') as f:
     license = f.read()
 
 setup(
     name='bicyclator',
-    version='3.0.0',
+    version=__version__,
     author='Alex Raichev',
     author_email='alex@raichev.net',
-    packages=['bicyclator', 'tests'],
     url='https://github.com/araichev/bicyclator',
     license=license,
-    description='A Python 3.4 bicycle calculator',
+    description='A Python 3.8+ bicycle calculator',
     long_description=readme,
     packages=find_packages(exclude=('tests', 'docs')),
-    install_requires=[],
+    python_requires='>=3.8',
+    install_requires=[
+        'numpy',
+    ],
 )
 